@@ -0,0 +1,7 @@
+"""
+Бенчмарки горячих путей сервиса.
+
+Запускаются из каталога backend, например:
+
+    python -m benchmarks.lemmatizers
+"""
@@ -0,0 +1,143 @@
+"""
+Сравнение загрузки автомата из pickle-модели и из артефакта с mmap.
+
+Справочник генерируется случайными наименованиями заданного размера,
+автомат сохраняется в обоих форматах во временный каталог. Затем
+запускаются `--workers` процессов, как воркеры gunicorn: каждый загружает
+автомат, выполняет поиск лекарств в тексте из наименований справочника
+так же, как запрос `find_medications` (разбор, леммы, `LayeredAutomaton`,
+разрешение пересечений), и, дождавшись остальных, сообщает время
+загрузки, RSS и PSS (доля общих страниц делится между процессами, только
+Linux). Лемматизатор выбирается `NLP_LEMMATIZER`.
+"""
+
+import argparse
+import multiprocessing
+import os
+import pickle
+import random
+import tempfile
+import time
+import uuid
+from collections import namedtuple
+
+import ahocorasick
+
+from src.application.services.automaton import load_artifact, save_artifact
+
+ALPHABET = "абвгдеёжзийклмнопрстуфхцчшщъыьэюя"
+CatalogRow = namedtuple("CatalogRow", "id trade_name inn")
+
+
+def make_catalog(size: int, rng: random.Random) -> list[CatalogRow]:
+    def word() -> str:
+        return "".join(
+            rng.choice(ALPHABET) for _ in range(rng.randint(5, 12))
+        )
+
+    return [
+        CatalogRow(
+            uuid.UUID(int=i),
+            " ".join(word() for _ in range(rng.randint(1, 3))),
+            word(),
+        )
+        for i in range(size)
+    ]
+
+
+def build_automaton(catalog: list[CatalogRow]) -> ahocorasick.Automaton:
+    # Ключи лемматизируются, как в сервисе, иначе запрос их не найдет.
+    from src.application.services.aho import AhoCorasickService
+
+    return AhoCorasickService.build_automaton(catalog)
+
+
+def memory_kb() -> tuple[int, int]:
+    values = {}
+    with open("/proc/self/smaps_rollup") as file:
+        for line in file:
+            name, _, rest = line.partition(":")
+            if name in ("Rss", "Pss"):
+                values[name] = int(rest.split()[0])
+    return values["Rss"], values["Pss"]
+
+
+def worker(fmt, path, text, barrier, results) -> None:
+    from src.application.services.layered import LayeredAutomaton
+    from src.application.services.text_processing import (
+        TextProcessingService,
+    )
+
+    started = time.perf_counter()
+    if fmt == "pickle":
+        automaton = ahocorasick.load(path, pickle.loads)
+    else:
+        automaton = load_artifact(path)
+    load_time = time.perf_counter() - started
+    _, matches = TextProcessingService.find_matches(
+        LayeredAutomaton(automaton), None, text
+    )
+    found = len(matches)
+    barrier.wait()
+    rss, pss = memory_kb()
+    results.put((load_time, rss, pss, found))
+    barrier.wait()
+
+
+def bench(fmt, path, text, workers) -> list[tuple]:
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(workers)
+    results = context.Queue()
+    processes = [
+        context.Process(
+            target=worker, args=(fmt, path, text, barrier, results)
+        )
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    collected = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return collected
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[10_000, 100_000]
+    )
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(
+        f"{'size':>8} {'format':<7} {'file, MB':>9} {'load, s':>8} "
+        f"{'RSS, MB':>8} {'PSS, MB':>8} {'found':>7}"
+    )
+    for size in args.sizes:
+        catalog = make_catalog(size, random.Random(args.seed))
+        automaton = build_automaton(catalog)
+        text = ". ".join(drug.trade_name for drug in catalog[:1000])
+        with tempfile.TemporaryDirectory() as directory:
+            paths = {
+                "pickle": os.path.join(directory, "automaton.model"),
+                "mapped": os.path.join(directory, "automaton.artifact"),
+            }
+            automaton.save(paths["pickle"], pickle.dumps)
+            save_artifact(automaton, paths["mapped"])
+            for fmt, path in paths.items():
+                results = bench(fmt, path, text, args.workers)
+                count = len(results)
+                load_time = sum(r[0] for r in results) / count
+                rss = sum(r[1] for r in results) / count / 1024
+                pss = sum(r[2] for r in results) / count / 1024
+                file_size = os.path.getsize(path) / 1024 / 1024
+                print(
+                    f"{size:>8} {fmt:<7} {file_size:>9.1f} {load_time:>8.3f} "
+                    f"{rss:>8.1f} {pss:>8.1f} {results[0][3]:>7}"
+                )
+
+
+if __name__ == "__main__":
+    main()
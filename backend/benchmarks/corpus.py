@@ -0,0 +1,69 @@
+"""Фиксированный корпус и справочник лекарств для бенчмарков."""
+
+import uuid
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class CatalogDrug:
+    id: uuid.UUID
+    trade_name: str
+    inn: str | None
+
+
+CATALOG = [
+    CatalogDrug(
+        uuid.UUID(int=1), "Аспирин Кардио", "ацетилсалициловая кислота"
+    ),
+    CatalogDrug(uuid.UUID(int=2), "Нурофен", "ибупрофен"),
+    CatalogDrug(uuid.UUID(int=3), "Парацетамол", "парацетамол"),
+    CatalogDrug(uuid.UUID(int=4), "Амоксиклав", "амоксициллин"),
+    CatalogDrug(uuid.UUID(int=5), "Варфарин", "варфарин"),
+    CatalogDrug(uuid.UUID(int=6), "Метформин", "метформин"),
+    CatalogDrug(uuid.UUID(int=7), "Омепразол", "омепразол"),
+    CatalogDrug(uuid.UUID(int=8), "Аторвастатин", "аторвастатин"),
+]
+
+# Тексты и ожидаемые в них препараты (по `id.int` из CATALOG).
+CORPUS = [
+    (
+        "Пациентка принимала аспирин кардио по одной таблетке в сутки.",
+        {1},
+    ),
+    (
+        "На фоне приема нурофена появилась сыпь на коже рук.",
+        {2},
+    ),
+    (
+        "После отмены ибупрофена и парацетамола симптомы исчезли.",
+        {2, 3},
+    ),
+    (
+        "Назначен амоксиклав, через два дня развилась диарея.",
+        {4},
+    ),
+    (
+        "Кровотечение на фоне терапии варфарином потребовало госпитализации.",
+        {5},
+    ),
+    (
+        "Пациент получал метформин и омепразол в течение года.",
+        {6, 7},
+    ),
+    (
+        "Миалгия отмечена после увеличения дозы аторвастатина.",
+        {8},
+    ),
+    (
+        "Ацетилсалициловую кислоту пациент принимал самостоятельно.",
+        {1},
+    ),
+    (
+        "Жалоб на переносимость амоксициллина не было.",
+        {4},
+    ),
+    (
+        "Нежелательных реакций за период наблюдения не выявлено.",
+        set(),
+    ),
+]
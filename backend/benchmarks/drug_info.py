@@ -0,0 +1,317 @@
+"""
+Планы и время запроса `DrugsRepo.get_drug_info` на справочниках разного
+размера.
+
+Нужен доступный Postgres (`--dsn`, по умолчанию строка подключения из
+настроек). Таблицы создаются в отдельной схеме `--schema`, которая
+пересоздается для каждого размера и удаляется в конце. Справочник
+заполняется синтетическими лекарствами (`generate_series`), каждое лекарство
+связано с одним правилом подачи, часть правил бессрочные, часть уже истекли.
+Для каждого размера сравниваются исходный запрос с `OR` без индексов и с
+индексами миграции `drug_info_indexes`, запрос с `UNION` и чтение модели
+`drug_rules` (строка на лекарство, а не на правило); выводятся планы
+(`EXPLAIN ANALYZE`) и среднее и 95-й перцентиль времени запроса.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import random
+import statistics
+import time
+import uuid
+from datetime import datetime
+
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncConnection, create_async_engine
+
+from src.infrastructure.models.public import (
+    Base,
+    Drug,
+    SubmissionRule,
+    SubmissionRuleDrug,
+    TypeOfEvent,
+)
+from src.infrastructure.repositories.drugs import drug_rules_statement
+from src.settings import settings
+
+INDEXES = (
+    "ix_drugs_trade_name",
+    "ix_drugs_inn",
+    "ix_submission_rule_drug_drug_id",
+    "ix_submission_rules_validity",
+    "ix_drug_rules_trade_name",
+    "ix_drug_rules_inn",
+)
+
+FILL = (
+    """
+    INSERT INTO type_of_event (id, name)
+    SELECT md5('event' || i)::uuid, 'event ' || i
+    FROM generate_series(1, 10) AS i
+    """,
+    """
+    INSERT INTO drugs (id, trade_name, inn, obligation)
+    SELECT md5('drug' || i)::uuid, 'drug ' || i, 'inn ' || (i % :inns),
+        'obligation ' || (i % 3)
+    FROM generate_series(1, :size) AS i
+    """,
+    """
+    INSERT INTO submission_rules (
+        id, receiver, type_of_event, valid_start_date, valid_end_date
+    )
+    SELECT md5('rule' || i)::uuid, 'receiver ' || i,
+        md5('event' || (i % 10 + 1))::uuid,
+        CASE WHEN i % 4 > 0 THEN now() - (i % 365) * interval '1 day' END,
+        CASE WHEN i % 4 > 0
+            THEN now() + (i % 730 - 180) * interval '1 day' END
+    FROM generate_series(1, :rules) AS i
+    """,
+    """
+    INSERT INTO submission_rule_drug (submission_rule_id, drug_id)
+    SELECT md5('rule' || (i % :rules + 1))::uuid, md5('drug' || i)::uuid
+    FROM generate_series(1, :size) AS i
+    """,
+    # В БД модель чтения заполняют триггеры миграции `drug_rules`.
+    """
+    INSERT INTO drug_rules (drug_id, trade_name, inn, obligation, rules)
+    SELECT d.id, d.trade_name, d.inn, d.obligation,
+        COALESCE(
+            jsonb_agg(
+                jsonb_build_object(
+                    'source_countries', r.source_countries,
+                    'receiver', r.receiver,
+                    'deadline_to_submit', r.deadline_to_submit,
+                    'format', r.format,
+                    'other_procedures', r.other_procedures,
+                    'valid_start_date', r.valid_start_date,
+                    'valid_end_date', r.valid_end_date,
+                    'type_of_event', t.name
+                )
+            ) FILTER (WHERE r.id IS NOT NULL),
+            '[]'::jsonb
+        )
+    FROM drugs d
+    LEFT JOIN submission_rule_drug srd ON srd.drug_id = d.id
+    LEFT JOIN submission_rules r ON r.id = srd.submission_rule_id
+    LEFT JOIN type_of_event t ON t.id = r.type_of_event
+    GROUP BY d.id
+    """,
+)
+
+
+def _drug_info_select() -> sa.Select:
+    return sa.select(
+        Drug.id.label("drug_id"),
+        Drug.trade_name,
+        Drug.inn,
+        Drug.obligation,
+        SubmissionRule.source_countries,
+        SubmissionRule.receiver,
+        SubmissionRule.deadline_to_submit,
+        SubmissionRule.format,
+        SubmissionRule.other_procedures,
+        SubmissionRule.valid_start_date,
+        SubmissionRule.valid_end_date,
+        TypeOfEvent.name.label("type_of_event"),
+    )
+
+
+def _join_rules(statement: sa.Select, now: datetime) -> sa.Select:
+    return (
+        statement.join(
+            SubmissionRuleDrug,
+            SubmissionRuleDrug.drug_id == Drug.id,
+            isouter=True,
+        )
+        .join(
+            SubmissionRule,
+            SubmissionRule.id == SubmissionRuleDrug.submission_rule_id,
+            isouter=True,
+        )
+        .join(
+            TypeOfEvent,
+            TypeOfEvent.id == SubmissionRule.type_of_event,
+            isouter=True,
+        )
+        .where(
+            sa.or_(
+                sa.and_(
+                    SubmissionRule.valid_start_date <= now,
+                    SubmissionRule.valid_end_date >= now,
+                ),
+                sa.and_(
+                    SubmissionRule.valid_start_date.is_(None),
+                    SubmissionRule.valid_end_date.is_(None),
+                ),
+            )
+        )
+    )
+
+
+def legacy_statement(drug_ids: list, words: list, now: datetime):
+    """Исходный запрос: соединение таблиц и одно условие с `OR`."""
+    return _join_rules(_drug_info_select(), now).where(
+        sa.or_(
+            Drug.id.in_(drug_ids),
+            Drug.trade_name.in_(words),
+            Drug.inn.in_(words),
+        )
+    )
+
+
+def union_statement(drug_ids: list, words: list, now: datetime):
+    """Лекарства отбираются `UNION` выборок по индексам, затем соединение."""
+    matched = sa.union(
+        sa.select(Drug.id).where(Drug.id.in_(drug_ids)),
+        sa.select(Drug.id).where(Drug.trade_name.in_(words)),
+        sa.select(Drug.id).where(Drug.inn.in_(words)),
+    ).subquery("matched")
+    statement = (
+        _drug_info_select()
+        .select_from(matched)
+        .join(Drug, Drug.id == matched.c.id)
+    )
+    return _join_rules(statement, now)
+
+
+def read_model_statement(drug_ids: list, words: list, now: datetime):
+    """Текущий запрос `get_drug_info` к модели чтения `drug_rules`."""
+    return drug_rules_statement(drug_ids, words)
+
+
+def drug_uuid(i: int) -> uuid.UUID:
+    return uuid.UUID(hashlib.md5(f"drug{i}".encode()).hexdigest())
+
+
+def make_lookups(
+    size: int, count: int, rng: random.Random
+) -> list[tuple[list, list]]:
+    """
+    Аргументы запросов как у поиска: найденные `id` и слова текста, среди
+    которых есть наименования, МНН и слова не из справочника.
+    """
+    lookups = []
+    for _ in range(count):
+        numbers = [rng.randint(1, size) for _ in range(10)]
+        words = [f"drug {rng.randint(1, size)}" for _ in range(5)]
+        words += [f"inn {rng.randint(0, size // 2)}" for _ in range(5)]
+        words += [f"word {rng.randint(1, size)}" for _ in range(20)]
+        lookups.append(([drug_uuid(i) for i in numbers], words))
+    return lookups
+
+
+async def fill(connection: AsyncConnection, schema: str, size: int) -> None:
+    await connection.execute(
+        sa.text(f"DROP SCHEMA IF EXISTS {schema} CASCADE")
+    )
+    await connection.execute(sa.text(f"CREATE SCHEMA {schema}"))
+    await connection.run_sync(Base.metadata.create_all)
+    params = {"size": size, "inns": max(size // 2, 1), "rules": size // 10}
+    for statement in FILL:
+        await connection.execute(sa.text(statement), params)
+    await connection.execute(sa.text("ANALYZE"))
+
+
+async def set_indexes(connection: AsyncConnection, enabled: bool) -> None:
+    indexes = {
+        index.name: index
+        for table in Base.metadata.tables.values()
+        for index in table.indexes
+    }
+    for name in INDEXES:
+        if enabled:
+            await connection.run_sync(indexes[name].create, checkfirst=True)
+        else:
+            await connection.execute(sa.text(f"DROP INDEX IF EXISTS {name}"))
+    await connection.execute(sa.text("ANALYZE"))
+
+
+async def explain(connection: AsyncConnection, statement) -> str:
+    sql = statement.compile(
+        dialect=postgresql.dialect(),
+        compile_kwargs={"literal_binds": True},
+    )
+    result = await connection.execute(
+        sa.text(f"EXPLAIN (ANALYZE, BUFFERS) {sql}")
+    )
+    return "\n".join(row[0] for row in result)
+
+
+async def measure(
+    connection: AsyncConnection, build, lookups: list
+) -> tuple[float, float, float]:
+    now = datetime.now()
+    timings, rows = [], 0
+    for drug_ids, words in lookups:
+        started = time.perf_counter()
+        result = await connection.execute(build(drug_ids, words, now))
+        rows += len(result.fetchall())
+        timings.append((time.perf_counter() - started) * 1000)
+    p95 = statistics.quantiles(timings, n=20)[-1]
+    return statistics.mean(timings), p95, rows / len(lookups)
+
+
+async def run(args: argparse.Namespace) -> None:
+    engine = create_async_engine(
+        args.dsn,
+        connect_args={"server_settings": {"search_path": args.schema}},
+    )
+    variants = (
+        ("no", "or", False, legacy_statement),
+        ("yes", "or", True, legacy_statement),
+        ("yes", "union", True, union_statement),
+        ("yes", "model", True, read_model_statement),
+    )
+    results = []
+    try:
+        for size in args.sizes:
+            rng = random.Random(args.seed)
+            lookups = make_lookups(size, args.queries, rng)
+            async with engine.begin() as connection:
+                await fill(connection, args.schema, size)
+            for indexes, query, enabled, build in variants:
+                async with engine.begin() as connection:
+                    await set_indexes(connection, enabled)
+                    plan = await explain(
+                        connection, build(*lookups[0], datetime.now())
+                    )
+                    mean, p95, rows = await measure(
+                        connection, build, lookups
+                    )
+                print(f"\n=== {size} drugs, indexes: {indexes}, {query}")
+                print(plan)
+                results.append((size, indexes, query, mean, p95, rows))
+    finally:
+        async with engine.begin() as connection:
+            await connection.execute(
+                sa.text(f"DROP SCHEMA IF EXISTS {args.schema} CASCADE")
+            )
+        await engine.dispose()
+
+    print(
+        f"\n{'size':>8} {'indexes':<7} {'query':<6} "
+        f"{'mean, ms':>9} {'p95, ms':>8} {'rows':>6}"
+    )
+    for size, indexes, query, mean, p95, rows in results:
+        print(
+            f"{size:>8} {indexes:<7} {query:<6} "
+            f"{mean:>9.2f} {p95:>8.2f} {rows:>6.1f}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--dsn", default=settings.db.connection_string)
+    parser.add_argument("--schema", default="bench_drug_info")
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000]
+    )
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Сравнение индексов нечеткого поиска: BK-дерево, SymSpell и rapidfuzz.
+
+Справочник генерируется случайными словами заданного размера, запросы
+получаются из слов справочника одной-двумя случайными правками. Для каждого
+размера выводится время построения, среднее время запроса и число
+найденных кандидатов.
+"""
+
+import argparse
+import random
+import time
+from collections import namedtuple
+
+from src.application.services.fuzzy import (
+    build_bk_tree,
+    build_bucketed_index,
+    build_symspell_index,
+)
+
+ALPHABET = "абвгдеёжзийклмнопрстуфхцчшщъыьэюя"
+CatalogRow = namedtuple("CatalogRow", "id trade_name inn")
+
+
+def make_catalog(size: int, rng: random.Random) -> list[CatalogRow]:
+    return [
+        CatalogRow(
+            i,
+            "".join(
+                rng.choice(ALPHABET) for _ in range(rng.randint(5, 14))
+            ),
+            None,
+        )
+        for i in range(size)
+    ]
+
+
+def mutate(word: str, edits: int, rng: random.Random) -> str:
+    chars = list(word)
+    for _ in range(edits):
+        position = rng.randrange(1, len(chars))
+        operation = rng.choice(("insert", "delete", "replace"))
+        if operation == "insert":
+            chars.insert(position, rng.choice(ALPHABET))
+        elif operation == "delete" and len(chars) > 4:
+            del chars[position]
+        else:
+            chars[position] = rng.choice(ALPHABET)
+    return "".join(chars)
+
+
+def bench(
+    build, catalog, queries, max_dist: int
+) -> tuple[float, float, float]:
+    started = time.perf_counter()
+    index = build(catalog)
+    build_time = time.perf_counter() - started
+
+    found = 0
+    started = time.perf_counter()
+    for query in queries:
+        found += len(index.search(query, max_dist))
+    query_time = (time.perf_counter() - started) / len(queries)
+    return build_time, query_time, found / len(queries)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[10_000, 100_000, 500_000]
+    )
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--max-dist", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(
+        f"{'size':>8} {'index':<9} {'build, s':>9} "
+        f"{'query, us':>10} {'found':>6}"
+    )
+    for size in args.sizes:
+        rng = random.Random(args.seed)
+        catalog = make_catalog(size, rng)
+        queries = [
+            mutate(rng.choice(catalog).trade_name, rng.randint(0, 2), rng)
+            for _ in range(args.queries)
+        ]
+        for name, build in (
+            ("bktree", build_bk_tree),
+            ("symspell", build_symspell_index),
+            ("rapidfuzz", build_bucketed_index),
+        ):
+            build_time, query_time, found = bench(
+                build, catalog, queries, args.max_dist
+            )
+            print(
+                f"{size:>8} {name:<9} {build_time:>9.2f} "
+                f"{query_time * 1e6:>10.1f} {found:>6.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Сравнение бэкендов лемматизации.
+
+Для каждого бэкенда строится автомат по фиксированному справочнику, после
+чего корпус прогоняется через разбор, лемматизацию и поиск точных
+совпадений. Выводится пропускная способность и полнота найденных
+препаратов относительно разметки корпуса.
+"""
+
+import argparse
+import asyncio
+import time
+
+import ahocorasick
+
+from benchmarks.corpus import CATALOG, CORPUS
+from src.application.services.aho import AhoCorasickService
+from src.application.services.nlp import create_lemmatizer
+from src.application.services.text_processing import TextProcessingService
+
+BACKENDS = ("spacy", "pymorphy3")
+
+
+async def build_automaton(lemmatizer) -> ahocorasick.Automaton:
+    automaton = ahocorasick.Automaton()
+    for drug in CATALOG:
+        await AhoCorasickService.add_drug_to_automation(
+            automaton, drug, lemmatizer.lemmatize
+        )
+    automaton.make_automaton()
+    return automaton
+
+
+def run(backend: str, repeat: int) -> dict:
+    lemmatizer = create_lemmatizer(backend)
+    automaton = asyncio.run(build_automaton(lemmatizer))
+
+    expected = sum(len(ids) for _, ids in CORPUS)
+    found = 0
+    tokens = 0
+    started = time.perf_counter()
+    for iteration in range(repeat):
+        for text, ids in CORPUS:
+            doc = lemmatizer.nlp(text)
+            lemmas = lemmatizer.lemmatize_doc(doc)
+            candidates = TextProcessingService._find_exact_candidates(
+                automaton, doc, lemmas
+            )
+            tokens += len(doc)
+            if iteration == 0:
+                found += len(
+                    ids & {match.drug_id.int for match in candidates}
+                )
+    elapsed = time.perf_counter() - started
+
+    return {
+        "backend": backend,
+        "docs_per_sec": len(CORPUS) * repeat / elapsed,
+        "tokens_per_sec": tokens / elapsed,
+        "recall": found / expected if expected else 1.0,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--backend", choices=BACKENDS, action="append")
+    parser.add_argument("--repeat", type=int, default=100)
+    args = parser.parse_args()
+
+    print(f"{'backend':<10} {'docs/s':>10} {'tokens/s':>12} {'recall':>8}")
+    for backend in args.backend or BACKENDS:
+        try:
+            result = run(backend, args.repeat)
+        except OSError as e:
+            print(f"{backend:<10} skipped: {e}")
+            continue
+        print(
+            f"{result['backend']:<10} {result['docs_per_sec']:>10.1f} "
+            f"{result['tokens_per_sec']:>12.1f} {result['recall']:>8.2%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
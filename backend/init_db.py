@@ -1,118 +1,289 @@
+"""
+Загрузка справочника лекарств из CSV в БД.
+
+CSV читается частями по `--chunk-size` строк, повторы лекарств, правил
+подачи и связей между ними отбрасываются в памяти (остается первое
+вхождение). Части копируются (`COPY`) во временные таблицы, после чего
+каждая таблица справочника заполняется одной вставкой
+`INSERT ... ON CONFLICT DO NOTHING`: записи, уже существующие в БД,
+пропускаются. Загрузка выполняется в одной транзакции.
+
+На время загрузки пользовательские триггеры таблиц справочника отключены
+(внутри транзакции, так что другие сессии этого не видят): журнал
+изменений не получает записи на каждое лекарство, а `drug_rules`
+пересчитывается один раз для загруженных лекарств. Вместо них в той же
+транзакции пишется одна запись `catalog`: воркер, чей базовый автомат
+собран раньше нее, перечитывает справочник и собирает автомат заново.
+После загрузки собирается и публикуется общий артефакт, а в журнал
+пишется запись `artifact`, по которой воркеры загружают его вместо
+собственной сборки. Если публикация не удалась, воркеры все равно видят
+загруженные лекарства по записи `catalog`, а публикацию можно повторить
+(`--publish-only`).
+"""
+
+import argparse
+import asyncio
+import time
 import uuid
-from datetime import datetime
 
+import asyncpg
 import numpy as np
 import pandas as pd
-from sqlalchemy import Boolean, Column, Date, ForeignKey, String, create_engine
-from sqlalchemy.dialects.postgresql import UUID
-from sqlalchemy.exc import IntegrityError
-from sqlalchemy.orm import declarative_base, relationship, sessionmaker
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
 
-from src.infrastructure.models.public import Drug, SubmissionRule, SubmissionRuleDrug, User
+from src.application.services.aho import AhoCorasickService
+from src.application.services.catalog import load_catalog
+from src.application.services.rebuild import save_and_load
+from src.infrastructure.repositories.catalog_changes import CatalogChangesRepo
 from src.settings import settings
 
+CSV_PATH = "./assets/df_for_psql.csv"
 
-def convert_date(date_str):
-    try:
-        if pd.isna(date_str):
-            return None
-        return datetime.strptime(date_str, "%Y-%m-%d").date()
-    except (ValueError, TypeError):
-        return None
+ADMIN_EMAIL = "admin@admin.com"
+ADMIN_PASSWORD = (
+    "$2b$12$V1VeVWlbbb4EesFuaSH.aOj/6u/N4NveGxQFZPWd.5AREevYNIkwq"
+)
 
+# Таблица справочника: (колонки таблицы, колонки CSV, ограничение ключа).
+# Порядок важен: связи ссылаются на лекарства и правила.
+TABLES = {
+    "drugs": (
+        ("id", "trade_name", "inn", "obligation", "release_forms"),
+        (
+            "drugs.id",
+            "drugs.trade_name",
+            "drugs.inn",
+            "drugs.obligation",
+            "drugs.release_forms",
+        ),
+        "(id)",
+    ),
+    "submission_rules": (
+        (
+            "id",
+            "source_countries",
+            "receiver",
+            "format",
+            "other_procedures",
+            "type_of_event",
+        ),
+        (
+            "submission_rules.id",
+            "submission_rules.source_countries",
+            "submission_rules.receiver",
+            "submission_rules.format",
+            "submission_rules.other_procedures",
+            "submission_rules.type_of_event",
+        ),
+        "(id)",
+    ),
+    "submission_rule_drug": (
+        ("submission_rule_id", "drug_id"),
+        ("submission_rules.id", "drugs.id"),
+        "(submission_rule_id, drug_id)",
+    ),
+}
 
-def load_csv_to_db(csv_path, db_url):
-    engine = create_engine(db_url)
-    Session = sessionmaker(bind=engine)
-    session = Session()
 
-    # Словари для отслеживания уже добавленных записей
-    added_drugs = {}
-    added_submission_rules = {}
+def _uuid(value: str | None) -> uuid.UUID | None:
+    return uuid.UUID(value) if value is not None else None
 
-    try:
-        # Создаем админ пользователя
-        user = User(
-            id=str(uuid.uuid4()),
-            email="admin@admin.com",
-            password="$2b$12$V1VeVWlbbb4EesFuaSH.aOj/6u/N4NveGxQFZPWd.5AREevYNIkwq",
-            is_admin=True,
+
+class Deduplicator:
+    """Новые записи справочника из частей CSV, без повторов."""
+
+    def __init__(self) -> None:
+        self.seen = {table: set() for table in TABLES}
+
+    def split(self, chunk: pd.DataFrame) -> dict[str, list[tuple]]:
+        """
+        Записи таблиц, еще не встречавшиеся в предыдущих частях.
+
+        Args:
+            chunk: Часть CSV.
+        """
+        chunk = chunk.replace(np.nan, None)
+        records = {table: [] for table in TABLES}
+        rows = chunk[list(TABLES["drugs"][1])].itertuples(
+            index=False, name=None
+        )
+        for drug_id, trade_name, inn, obligation, release_forms in rows:
+            drug_id = uuid.UUID(drug_id)
+            record = (
+                drug_id,
+                trade_name or "",
+                inn or "",
+                obligation,
+                release_forms,
+            )
+            self._add(records, "drugs", drug_id, record)
+        rows = chunk[list(TABLES["submission_rules"][1])].itertuples(
+            index=False, name=None
         )
-        session.add(user)
-        session.commit()
-    except IntegrityError:
-        session.rollback()
+        for rule_id, *fields, type_of_event in rows:
+            rule_id = uuid.UUID(rule_id)
+            record = (rule_id, *fields, _uuid(type_of_event))
+            self._add(records, "submission_rules", rule_id, record)
+        rows = chunk[list(TABLES["submission_rule_drug"][1])].itertuples(
+            index=False, name=None
+        )
+        for rule_id, drug_id in rows:
+            link = (uuid.UUID(rule_id), uuid.UUID(drug_id))
+            self._add(records, "submission_rule_drug", link, link)
+        return records
+
+    def _add(self, records: dict, table: str, key, record: tuple) -> None:
+        if key not in self.seen[table]:
+            self.seen[table].add(key)
+            records[table].append(record)
+
+
+async def create_admin(connection: asyncpg.Connection) -> None:
+    await connection.execute(
+        """
+        INSERT INTO "user" (id, email, password, is_admin)
+        VALUES ($1, $2, $3, true)
+        ON CONFLICT (email) DO NOTHING
+        """,
+        uuid.uuid4(),
+        ADMIN_EMAIL,
+        ADMIN_PASSWORD,
+    )
+
+
+async def load_csv_to_db(csv_path: str, dsn: str, chunk_size: int) -> None:
+    """
+    Загружает лекарства, правила подачи и связи между ними из CSV.
 
+    Args:
+        csv_path: Путь к CSV (разделитель `;`).
+        dsn: Строка подключения к Postgres.
+        chunk_size: Число строк CSV в одной части.
+    """
+    connection = await asyncpg.connect(dsn)
     try:
-        df = pd.read_csv(csv_path, sep=";")
-        df = df.replace(np.nan, None)
-
-        for _, row in df.iterrows():
-            drug_id = uuid.UUID(row["drugs.id"])
-            submission_rule_id = uuid.UUID(row["submission_rules.id"])
-
-            if drug_id not in added_drugs:
-                drug = Drug(
-                    id=drug_id,
-                    trade_name=row["drugs.trade_name"] or "",
-                    inn=row["drugs.inn"] or "",
-                    obligation=row["drugs.obligation"],
-                    release_forms=row["drugs.release_forms"],
+        await create_admin(connection)
+
+        started = time.perf_counter()
+        deduplicator = Deduplicator()
+        csv_rows = 0
+        async with connection.transaction():
+            for table in TABLES:
+                await connection.execute(
+                    f"CREATE TEMP TABLE stage_{table} "
+                    f"(LIKE {table} INCLUDING DEFAULTS) ON COMMIT DROP"
+                )
+            chunks = pd.read_csv(csv_path, sep=";", chunksize=chunk_size)
+            for chunk in chunks:
+                csv_rows += len(chunk)
+                records = deduplicator.split(chunk)
+                for table, (columns, _, _) in TABLES.items():
+                    if records[table]:
+                        await connection.copy_records_to_table(
+                            f"stage_{table}",
+                            records=records[table],
+                            columns=columns,
+                        )
+                print(f"Прочитано строк CSV: {csv_rows}")
+
+            for table in TABLES:
+                await connection.execute(
+                    f"ALTER TABLE {table} DISABLE TRIGGER USER"
+                )
+            inserted = {}
+            for table, (columns, _, key) in TABLES.items():
+                names = ", ".join(columns)
+                status = await connection.execute(
+                    f"INSERT INTO {table} ({names}) "
+                    f"SELECT {names} FROM stage_{table} "
+                    f"ON CONFLICT {key} DO NOTHING"
                 )
-                session.add(drug)
-                added_drugs[drug_id] = drug
-
-            if submission_rule_id not in added_submission_rules:
-                submission_rule = SubmissionRule(
-                    id=submission_rule_id,
-                    # Убираем routename, так как его больше нет в модели
-                    source_countries=row["submission_rules.source_countries"],
-                    receiver=row["submission_rules.receiver"],
-                    deadline_to_submit=None,
-                    format=row["submission_rules.format"],
-                    other_procedures=row["submission_rules.other_procedures"],
-                    type_of_event=row["submission_rules.type_of_event"] if pd.notna(
-                        row["submission_rules.type_of_event"]) else None,
+                inserted[table] = int(status.split()[-1])
+            await connection.execute(
+                "SELECT refresh_drug_rules(ARRAY("
+                "SELECT id FROM stage_drugs "
+                "UNION SELECT drug_id FROM stage_submission_rule_drug))"
+            )
+            for table in TABLES:
+                await connection.execute(
+                    f"ALTER TABLE {table} ENABLE TRIGGER USER"
                 )
-                session.add(submission_rule)
-                added_submission_rules[submission_rule_id] = submission_rule
-
-            # Создаем связь в промежуточной таблице
-            try:
-                # Проверяем, не существует ли уже такая связь
-                existing_link = session.query(SubmissionRuleDrug).filter_by(
-                    submission_rule_id=submission_rule_id,
-                    drug_id=drug_id
-                ).first()
-
-                if not existing_link:
-                    submission_rule_drug = SubmissionRuleDrug(
-                        submission_rule_id=submission_rule_id,
-                        drug_id=drug_id
-                    )
-                    session.add(submission_rule_drug)
-            except Exception as e:
-                print(f"Ошибка при создании связи между {drug_id} и {submission_rule_id}: {e}")
-                continue
-
-            # Периодически коммитим для избежания проблем с памятью
-            if len(session.new) > 100:
-                session.commit()
-
-        session.commit()
-        print("Данные успешно загружены в базу данных")
-        print(f"Добавлено лекарств: {len(added_drugs)}")
-        print(f"Добавлено правил подачи: {len(added_submission_rules)}")
-
-    except Exception as e:
-        print(f"Произошла ошибка: {str(e)}")
-        session.rollback()
+            # Одна запись вместо записей по каждому лекарству и правилу:
+            # воркеры перечитывают справочник и правила целиком, а версия
+            # журнала растет, так что артефакт, собранный по ней, новее
+            # артефактов воркеров.
+            await connection.execute(
+                "INSERT INTO catalog_changes (kind) VALUES ('catalog')"
+            )
+        elapsed = time.perf_counter() - started
+    finally:
+        await connection.close()
+
+    print("Данные успешно загружены в базу данных")
+    print(f"Добавлено лекарств: {inserted['drugs']}")
+    print(f"Добавлено правил подачи: {inserted['submission_rules']}")
+    print(f"Добавлено связей: {inserted['submission_rule_drug']}")
+    print(
+        f"Строк CSV: {csv_rows} за {elapsed:.1f} с "
+        f"({csv_rows / max(elapsed, 1e-9):.0f} строк/с)"
+    )
+
+
+async def publish_catalog_artifact(dsn: str) -> None:
+    """
+    Собирает автомат по справочнику и сообщает о нем воркерам.
 
+    Как `/aho/rebuild`: артефакт сохраняется с версией журнала, по которую
+    прочитан справочник, затем в журнал пишется запись `artifact`.
+
+    Args:
+        dsn: Строка подключения к Postgres.
+    """
+    engine = create_async_engine(
+        dsn.replace("postgresql://", "postgresql+asyncpg://", 1)
+    )
+    session_factory = sessionmaker(bind=engine, class_=AsyncSession)
+    try:
+        async with session_factory() as session:
+            snapshot = await load_catalog(session)
+        drugs = list(snapshot.catalog.drugs.values())
+        journal_version = snapshot.catalog.journal_version
+        automaton = await asyncio.to_thread(
+            AhoCorasickService.build_automaton, drugs
+        )
+        await asyncio.to_thread(save_and_load, automaton, journal_version)
+        async with session_factory() as session:
+            await CatalogChangesRepo(session).record_artifact(journal_version)
     finally:
-        session.close()
+        await engine.dispose()
+    print(f"Автомат собран: {len(drugs)} лекарств")
+
+
+async def run(
+    csv_path: str, dsn: str, chunk_size: int, publish_only: bool = False
+) -> None:
+    if not publish_only:
+        await load_csv_to_db(csv_path, dsn, chunk_size)
+    await publish_catalog_artifact(dsn)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--csv", default=CSV_PATH)
+    parser.add_argument("--chunk-size", type=int, default=50_000)
+    parser.add_argument(
+        "--publish-only",
+        action="store_true",
+        help="только собрать и опубликовать артефакт автомата",
+    )
+    parser.add_argument(
+        "--dsn",
+        default=settings.db.connection_string.replace("+asyncpg", ""),
+    )
+    args = parser.parse_args()
+    asyncio.run(run(args.csv, args.dsn, args.chunk_size, args.publish_only))
 
 
 if __name__ == "__main__":
-    CSV_PATH = "./assets/df_for_psql.csv"
-    db = settings.db.connection_string.replace("+asyncpg", "")
-    load_csv_to_db(CSV_PATH, db)
\ No newline at end of file
+    main()
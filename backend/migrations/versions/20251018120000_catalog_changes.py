@@ -0,0 +1,165 @@
+"""catalog_changes
+
+Revision ID: c41f0a7d2e93
+Revises: 9dc035d8be01
+Create Date: 2025-10-18 12:00:00.000000
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "c41f0a7d2e93"
+down_revision = "9dc035d8be01"
+branch_labels = None
+depends_on = None
+
+RULE_TABLES = ("submission_rules", "submission_rule_drug", "type_of_event")
+
+# Триггеры уровня оператора: журнал пополняется одной вставкой на оператор.
+# Таблицы переходов нельзя объявить у триггера на несколько событий,
+# поэтому у каждого события свой триггер.
+DRUG_TRIGGERS = (
+    ("insert", "INSERT", "NEW TABLE AS changed_rows"),
+    ("update", "UPDATE", "NEW TABLE AS changed_rows"),
+    ("delete", "DELETE", "OLD TABLE AS changed_rows"),
+)
+
+# У изменения связи старые и новые строки могут относиться к разным
+# лекарствам, поэтому UPDATE записывает обе стороны.
+RULE_TRIGGERS = DRUG_TRIGGERS + (
+    ("update_old", "UPDATE", "OLD TABLE AS changed_rows"),
+)
+
+# Лекарства, чьи правила затронуты измененными строками таблицы.
+# Правила и виды событий, на которые ссылаются, удалить нельзя (внешние
+# ключи без каскада), поэтому удаление строки без связей ничего не пишет.
+RULE_DRUGS = {
+    "submission_rule_drug": "SELECT drug_id FROM changed_rows",
+    "submission_rules": """
+        SELECT link.drug_id
+        FROM changed_rows
+        JOIN submission_rule_drug AS link
+            ON link.submission_rule_id = changed_rows.id
+    """,
+    "type_of_event": """
+        SELECT link.drug_id
+        FROM changed_rows
+        JOIN submission_rules AS rule ON rule.type_of_event = changed_rows.id
+        JOIN submission_rule_drug AS link ON link.submission_rule_id = rule.id
+    """,
+}
+
+
+def upgrade():
+    op.create_table(
+        "catalog_changes",
+        sa.Column("version", sa.BigInteger(), sa.Identity(), nullable=False),
+        sa.Column("kind", sa.String(), nullable=False),
+        sa.Column("drug_id", sa.UUID(), nullable=True),
+        sa.Column("base_version", sa.BigInteger(), nullable=True),
+        sa.Column(
+            "changed_at",
+            sa.DateTime(),
+            server_default=sa.func.now(),
+            nullable=False,
+        ),
+        sa.PrimaryKeyConstraint("version"),
+    )
+    op.execute(
+        """
+        CREATE FUNCTION notify_catalog_change() RETURNS trigger AS $$
+        DECLARE
+            latest bigint := (SELECT max(version) FROM inserted_rows);
+        BEGIN
+            -- Оператор на `drugs`, не изменивший строк, ничего не пишет.
+            IF latest IS NOT NULL THEN
+                PERFORM pg_notify('catalog_changes', latest::text);
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE TRIGGER catalog_changes_notify
+        AFTER INSERT ON catalog_changes
+        REFERENCING NEW TABLE AS inserted_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION notify_catalog_change();
+
+        CREATE FUNCTION record_drug_change() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO catalog_changes (kind, drug_id)
+            SELECT 'drug', id FROM changed_rows;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        -- TRUNCATE не дает таблицы переходов: запись без лекарства
+        -- означает, что правила изменились у всего справочника.
+        CREATE FUNCTION record_rules_truncate() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO catalog_changes (kind) VALUES ('rules');
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+    for table, drugs in RULE_DRUGS.items():
+        op.execute(
+            f"""
+            CREATE FUNCTION {table}_record_change() RETURNS trigger AS $$
+            BEGIN
+                INSERT INTO catalog_changes (kind, drug_id)
+                SELECT DISTINCT 'rules', drug_id FROM ({drugs}) AS drugs;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql;
+            """
+        )
+    for suffix, event, transition in DRUG_TRIGGERS:
+        op.execute(
+            f"""
+            CREATE TRIGGER drugs_record_change_{suffix}
+            AFTER {event} ON drugs
+            REFERENCING {transition}
+            FOR EACH STATEMENT EXECUTE FUNCTION record_drug_change();
+            """
+        )
+    for table in RULE_TABLES:
+        for suffix, event, transition in RULE_TRIGGERS:
+            op.execute(
+                f"""
+                CREATE TRIGGER {table}_record_change_{suffix}
+                AFTER {event} ON {table}
+                REFERENCING {transition}
+                FOR EACH STATEMENT EXECUTE FUNCTION {table}_record_change();
+                """
+            )
+        op.execute(
+            f"""
+            CREATE TRIGGER {table}_record_truncate
+            AFTER TRUNCATE ON {table}
+            FOR EACH STATEMENT EXECUTE FUNCTION record_rules_truncate();
+            """
+        )
+
+
+def downgrade():
+    for table in RULE_TABLES:
+        op.execute(f"DROP TRIGGER {table}_record_truncate ON {table}")
+        for suffix, _, _ in RULE_TRIGGERS:
+            op.execute(
+                f"DROP TRIGGER {table}_record_change_{suffix} ON {table}"
+            )
+        op.execute(f"DROP FUNCTION {table}_record_change()")
+    for suffix, _, _ in DRUG_TRIGGERS:
+        op.execute(f"DROP TRIGGER drugs_record_change_{suffix} ON drugs")
+    op.execute(
+        """
+        DROP FUNCTION record_rules_truncate();
+        DROP FUNCTION record_drug_change();
+        DROP TRIGGER catalog_changes_notify ON catalog_changes;
+        DROP FUNCTION notify_catalog_change();
+        """
+    )
+    op.drop_table("catalog_changes")
@@ -0,0 +1,51 @@
+"""drug_info_indexes
+
+Revision ID: 5b8e2c1f7a40
+Revises: c41f0a7d2e93
+Create Date: 2025-10-18 14:00:00.000000
+
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "5b8e2c1f7a40"
+down_revision = "c41f0a7d2e93"
+branch_labels = None
+depends_on = None
+
+INDEXES = (
+    ("ix_drugs_trade_name", "drugs", ["trade_name"]),
+    ("ix_drugs_inn", "drugs", ["inn"]),
+    ("ix_submission_rule_drug_drug_id", "submission_rule_drug", ["drug_id"]),
+    (
+        "ix_submission_rules_validity",
+        "submission_rules",
+        ["valid_start_date", "valid_end_date"],
+    ),
+)
+
+
+def upgrade():
+    # CONCURRENTLY не блокирует запись в таблицы, но не работает внутри
+    # транзакции.
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(
+                name,
+                table,
+                columns,
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(
+                name,
+                table_name=table,
+                postgresql_concurrently=True,
+                if_exists=True,
+            )
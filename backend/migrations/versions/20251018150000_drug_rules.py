@@ -0,0 +1,225 @@
+"""drug_rules
+
+Revision ID: 8f3a6d2b9c15
+Revises: 5b8e2c1f7a40
+Create Date: 2025-10-18 15:00:00.000000
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = "8f3a6d2b9c15"
+down_revision = "5b8e2c1f7a40"
+branch_labels = None
+depends_on = None
+
+# Триггеры с таблицами переходов допускают только одно событие, поэтому на
+# каждое событие свой триггер: (таблица, событие, таблицы переходов).
+#
+# DELETE на `submission_rules` и `type_of_event` триггеров не требует:
+# внешние ключи без каскада не дают удалить правило со связями или вид
+# события, на который ссылается правило, а удаление строк без ссылок не
+# меняет `drug_rules`. Строка удаленного лекарства удаляется каскадом по
+# внешнему ключу `drug_rules.drug_id`. TRUNCATE правил или видов событий
+# невозможен без TRUNCATE связей (внешние ключи), поэтому он обрабатывается
+# одним триггером на `submission_rule_drug`.
+TRIGGERS = (
+    ("drugs", "INSERT", "NEW TABLE AS new_rows"),
+    ("drugs", "UPDATE", "NEW TABLE AS new_rows"),
+    ("submission_rule_drug", "INSERT", "NEW TABLE AS new_rows"),
+    (
+        "submission_rule_drug",
+        "UPDATE",
+        "OLD TABLE AS old_rows NEW TABLE AS new_rows",
+    ),
+    ("submission_rule_drug", "DELETE", "OLD TABLE AS old_rows"),
+    ("submission_rules", "UPDATE", "NEW TABLE AS new_rows"),
+    ("type_of_event", "UPDATE", "NEW TABLE AS new_rows"),
+)
+
+
+def upgrade():
+    op.create_table(
+        "drug_rules",
+        sa.Column("drug_id", sa.UUID(), nullable=False),
+        sa.Column("trade_name", sa.String(), nullable=False),
+        sa.Column("inn", sa.String(), nullable=True),
+        sa.Column("obligation", sa.String(), nullable=True),
+        sa.Column(
+            "rules",
+            postgresql.JSONB(astext_type=sa.Text()),
+            server_default=sa.text("'[]'::jsonb"),
+            nullable=False,
+        ),
+        sa.ForeignKeyConstraint(
+            ["drug_id"], ["drugs.id"], ondelete="CASCADE"
+        ),
+        sa.PrimaryKeyConstraint("drug_id"),
+    )
+    op.create_index("ix_drug_rules_trade_name", "drug_rules", ["trade_name"])
+    op.create_index("ix_drug_rules_inn", "drug_rules", ["inn"])
+    op.execute(
+        """
+        -- Транзакции, меняющие правила одного лекарства, сериализуются
+        -- блокировкой на `id` (в порядке `id`, чтобы не было взаимных
+        -- блокировок). В READ COMMITTED вставка после блокировки читает
+        -- новый снимок и видит правила, зафиксированные предыдущим
+        -- владельцем блокировки, поэтому ни одна правка не теряется.
+        CREATE FUNCTION refresh_drug_rules(ids uuid[]) RETURNS void AS $$
+        BEGIN
+            PERFORM pg_advisory_xact_lock(hashtext(id::text))
+            FROM (SELECT DISTINCT unnest(ids) AS id ORDER BY id) AS locked;
+            INSERT INTO drug_rules (
+                drug_id, trade_name, inn, obligation, rules
+            )
+            SELECT
+                d.id,
+                d.trade_name,
+                d.inn,
+                d.obligation,
+                COALESCE(
+                    jsonb_agg(
+                        jsonb_build_object(
+                            'source_countries', r.source_countries,
+                            'receiver', r.receiver,
+                            'deadline_to_submit', r.deadline_to_submit,
+                            'format', r.format,
+                            'other_procedures', r.other_procedures,
+                            'valid_start_date', r.valid_start_date,
+                            'valid_end_date', r.valid_end_date,
+                            'type_of_event', t.name
+                        )
+                        ORDER BY r.id
+                    ) FILTER (WHERE r.id IS NOT NULL),
+                    '[]'::jsonb
+                )
+            FROM drugs d
+            LEFT JOIN submission_rule_drug srd ON srd.drug_id = d.id
+            LEFT JOIN submission_rules r ON r.id = srd.submission_rule_id
+            LEFT JOIN type_of_event t ON t.id = r.type_of_event
+            WHERE d.id = ANY(ids)
+            GROUP BY d.id
+            ON CONFLICT (drug_id) DO UPDATE SET
+                trade_name = EXCLUDED.trade_name,
+                inn = EXCLUDED.inn,
+                obligation = EXCLUDED.obligation,
+                rules = EXCLUDED.rules
+            WHERE (
+                drug_rules.trade_name,
+                drug_rules.inn,
+                drug_rules.obligation,
+                drug_rules.rules
+            ) IS DISTINCT FROM (
+                EXCLUDED.trade_name,
+                EXCLUDED.inn,
+                EXCLUDED.obligation,
+                EXCLUDED.rules
+            );
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE FUNCTION drug_rules_from_drugs() RETURNS trigger AS $$
+        BEGIN
+            PERFORM refresh_drug_rules(ARRAY(SELECT id FROM new_rows));
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE FUNCTION drug_rules_from_links() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                PERFORM refresh_drug_rules(
+                    ARRAY(SELECT drug_id FROM new_rows)
+                );
+            END IF;
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                PERFORM refresh_drug_rules(
+                    ARRAY(SELECT drug_id FROM old_rows)
+                );
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE FUNCTION drug_rules_from_rules() RETURNS trigger AS $$
+        BEGIN
+            PERFORM refresh_drug_rules(ARRAY(
+                SELECT srd.drug_id
+                FROM submission_rule_drug srd
+                JOIN new_rows r ON r.id = srd.submission_rule_id
+            ));
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        -- Без связей у лекарств не остается правил.
+        CREATE FUNCTION drug_rules_clear() RETURNS trigger AS $$
+        BEGIN
+            UPDATE drug_rules SET rules = '[]'::jsonb
+            WHERE rules <> '[]'::jsonb;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE FUNCTION drug_rules_from_event_types() RETURNS trigger AS $$
+        BEGIN
+            PERFORM refresh_drug_rules(ARRAY(
+                SELECT srd.drug_id
+                FROM submission_rule_drug srd
+                JOIN submission_rules r ON r.id = srd.submission_rule_id
+                JOIN new_rows t ON t.id = r.type_of_event
+            ));
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+    functions = {
+        "drugs": "drug_rules_from_drugs",
+        "submission_rule_drug": "drug_rules_from_links",
+        "submission_rules": "drug_rules_from_rules",
+        "type_of_event": "drug_rules_from_event_types",
+    }
+    for table, event, transitions in TRIGGERS:
+        op.execute(
+            f"""
+            CREATE TRIGGER {table}_drug_rules_{event.lower()}
+            AFTER {event} ON {table}
+            REFERENCING {transitions}
+            FOR EACH STATEMENT EXECUTE FUNCTION {functions[table]}();
+            """
+        )
+    op.execute(
+        """
+        CREATE TRIGGER submission_rule_drug_drug_rules_truncate
+        AFTER TRUNCATE ON submission_rule_drug
+        FOR EACH STATEMENT EXECUTE FUNCTION drug_rules_clear();
+        """
+    )
+    op.execute("SELECT refresh_drug_rules(ARRAY(SELECT id FROM drugs))")
+
+
+def downgrade():
+    op.execute(
+        "DROP TRIGGER submission_rule_drug_drug_rules_truncate "
+        "ON submission_rule_drug"
+    )
+    for table, event, _ in TRIGGERS:
+        name = f"{table}_drug_rules_{event.lower()}"
+        op.execute(f"DROP TRIGGER {name} ON {table}")
+    op.execute(
+        """
+        DROP FUNCTION drug_rules_from_event_types();
+        DROP FUNCTION drug_rules_clear();
+        DROP FUNCTION drug_rules_from_rules();
+        DROP FUNCTION drug_rules_from_links();
+        DROP FUNCTION drug_rules_from_drugs();
+        DROP FUNCTION refresh_drug_rules(uuid[]);
+        """
+    )
+    op.drop_index("ix_drug_rules_inn", table_name="drug_rules")
+    op.drop_index("ix_drug_rules_trade_name", table_name="drug_rules")
+    op.drop_table("drug_rules")
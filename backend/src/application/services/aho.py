@@ -1,4 +1,6 @@
+import asyncio
 import re
+from collections.abc import Callable, Sequence
 
 import ahocorasick
 from fastapi import Depends
@@ -8,6 +10,30 @@ from src.infrastructure.models import Drug
 from src.infrastructure.repositories.drugs import DrugsRepo
 
 
+def max_phrase_tokens(automaton: ahocorasick.Automaton) -> int:
+    """
+    Возвращает длину самого длинного наименования в словаре автомата в токенах.
+
+    Используется как размер окна при сопоставлении фраз. `MappedAutomaton`
+    хранит ее в заголовке артефакта, `LayeredAutomaton` считает при
+    создании (`phrase_tokens`). Для обычного автомата результат считается
+    по всем значениям при каждом вызове.
+
+    Args:
+        automaton: Автомат Ахо-Корасик.
+
+    Returns:
+        Максимальное количество токенов в наименовании (не меньше 1).
+    """
+    tokens = getattr(automaton, "phrase_tokens", None)
+    if tokens is not None:
+        return tokens
+    return max(
+        (len(value[0].split(" ")) for value in automaton.values()),
+        default=1,
+    )
+
+
 class AhoCorasickService:
 
     def __init__(self, repo: DrugsRepo = Depends()):
@@ -31,17 +57,57 @@ class AhoCorasickService:
         return result
 
     async def build_aho_corasick(self) -> ahocorasick.Automaton:
-        drugs = await self._repo.get_all_drugs()
+        drugs = await self._repo.get_catalog()
+        return await asyncio.to_thread(self.build_automaton, drugs)
+
+    @staticmethod
+    def build_automaton(
+        drugs: Sequence[Drug],
+        progress: Callable[[int], None] | None = None,
+    ) -> ahocorasick.Automaton:
+        """
+        Строит автомат по справочнику. Выполняется вне цикла событий.
+
+        Args:
+            drugs: Лекарства с `id`, `trade_name` и `inn`.
+            progress: Вызывается с числом обработанных лекарств.
+
+        Returns:
+            Готовый автомат.
+        """
         automaton = ahocorasick.Automaton()
-        for drug in drugs:
-            await self.add_drug_to_automation(automaton, drug)
+        for processed, drug in enumerate(drugs, start=1):
+            AhoCorasickService.add_drug(automaton, drug)
+            if progress is not None:
+                progress(processed)
         automaton.make_automaton()
         return automaton
 
     @staticmethod
     async def add_drug_to_automation(
-        automation: ahocorasick.Automaton, drug: Drug
+        automation: ahocorasick.Automaton,
+        drug: Drug,
+        lemmatize_word: Callable[[str], str] = lemmatize,
+    ):
+        return AhoCorasickService.add_drug(automation, drug, lemmatize_word)
+
+    @staticmethod
+    def add_drug(
+        automation: ahocorasick.Automaton,
+        drug: Drug,
+        lemmatize_word: Callable[[str], str] = lemmatize,
     ):
+        for key, value in AhoCorasickService.drug_keys(drug, lemmatize_word):
+            automation.add_word(key, value)
+        return automation
+
+    @staticmethod
+    def drug_keys(
+        drug: Drug,
+        lemmatize_word: Callable[[str], str] = lemmatize,
+    ) -> list[tuple[str, tuple]]:
+        """Ключи автомата для наименований лекарства и их значения."""
+        keys = []
         for word in (drug.trade_name, drug.inn):
             if not word:
                 continue
@@ -51,14 +117,14 @@ class AhoCorasickService:
                 ).lower()
             )
             normalized_splited = [
-                lemmatize(word_) for word_ in normalized.split(" ")
+                lemmatize_word(word_) for word_ in normalized.split(" ")
             ]
             for i in range(len(normalized.split(" "))):
                 sentence_word = " ".join(normalized_splited[: i + 1])
-                automation.add_word(
-                    sentence_word.lower(), (normalized, drug.id, word)
+                keys.append(
+                    (sentence_word.lower(), (normalized, drug.id, word))
                 )
 
                 if normalized != sentence_word.lower():
-                    automation.add_word(normalized, (normalized, drug.id, word))
-        return automation
+                    keys.append((normalized, (normalized, drug.id, word)))
+        return keys
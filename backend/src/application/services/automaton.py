@@ -0,0 +1,367 @@
+import fcntl
+import glob
+import mmap
+import os
+import pickle
+import struct
+import uuid
+from collections.abc import Iterator
+from typing import Any, NamedTuple
+
+import ahocorasick
+
+from src.settings import settings
+
+_MAGIC = b"AHOMAP3\n"
+_HEADER = struct.Struct("<8sQIIQ")
+# Артефакты прежних версий: без версии журнала изменений (2) и без длины
+# самого длинного наименования (1).
+_MAGIC_V2 = b"AHOMAP2\n"
+_HEADER_V2 = struct.Struct("<8sQII")
+_MAGIC_V1 = b"AHOMAP1\n"
+_HEADER_V1 = struct.Struct("<8sQI")
+_HEADERS = {_MAGIC: _HEADER, _MAGIC_V2: _HEADER_V2, _MAGIC_V1: _HEADER_V1}
+_OFFSET = struct.Struct("<I")
+_SEPARATOR = b"\x1f"
+# Сколько версий общего артефакта хранится на диске вместе с текущей.
+_KEPT_VERSIONS = 1
+
+Entry = tuple[str, uuid.UUID, str]
+
+
+def _encode_entry(entry: Entry) -> bytes:
+    normalized, drug_id, word = entry
+    return drug_id.bytes + normalized.encode() + _SEPARATOR + word.encode()
+
+
+def _decode_entry(record: bytes) -> Entry:
+    normalized, word = record[16:].split(_SEPARATOR, 1)
+    return normalized.decode(), uuid.UUID(bytes=record[:16]), word.decode()
+
+
+def _phrase_tokens(normalized: str) -> int:
+    return len(normalized.split(" "))
+
+
+class ArtifactHeader(NamedTuple):
+    """
+    Заголовок артефакта.
+
+    Attributes:
+        automaton_size: Размер pickle автомата в байтах.
+        count: Число записей в таблице.
+        tokens: Длина самого длинного наименования в токенах (None для
+            артефактов первой версии).
+        journal_version: Версия журнала изменений, по которую собран
+            артефакт (None для артефактов до третьей версии).
+        size: Размер заголовка в байтах.
+    """
+
+    automaton_size: int
+    count: int
+    tokens: int | None
+    journal_version: int | None
+    size: int
+
+
+def _read_header(data: bytes) -> ArtifactHeader:
+    """Разбирает заголовок артефакта любой версии."""
+    header = _HEADERS.get(bytes(data[: len(_MAGIC)]))
+    if header is None:
+        raise ValueError("not an automaton artifact")
+    _, automaton_size, count, *fields = header.unpack_from(data)
+    fields += [None] * (2 - len(fields))
+    return ArtifactHeader(automaton_size, count, *fields, header.size)
+
+
+class MappedAutomaton:
+    """
+    Автомат Ахо-Корасик с целочисленными значениями и таблицей записей в mmap.
+
+    В самом автомате (`STORE_INTS`) ключам сопоставлены номера записей
+    `(normalized, drug_id, word)`, а записи лежат в файле артефакта и
+    отображаются в память только для чтения, поэтому страницы таблицы
+    общие для всех воркеров хоста. Записи декодируются при каждом
+    обращении и не копируются в память процесса; длина самого длинного
+    наименования (`phrase_tokens`) хранится в заголовке. Записи,
+    добавленные после загрузки (`add_word`), хранятся в памяти процесса.
+
+    При pickle передаются автомат, путь к файлу и его заголовок; при
+    распаковке файл открывается заново, и если его заголовок не совпадает
+    (файл подменили), распаковка падает с `ValueError`, а не читает чужую
+    таблицу.
+
+    Повторяет методы `ahocorasick.Automaton`, которыми пользуется сервис:
+    `iter`, `values`, `add_word`, `pop`, `get`, `make_automaton`.
+    """
+
+    def __init__(
+        self,
+        automaton: ahocorasick.Automaton,
+        path: str | None = None,
+        extra: list[Entry] | None = None,
+        header: ArtifactHeader | None = None,
+    ) -> None:
+        self._automaton = automaton
+        self._path = path
+        self._extra = extra or []
+        self._extra_index = {entry: i for i, entry in enumerate(self._extra)}
+        self._map: mmap.mmap | None = None
+        self._header: ArtifactHeader | None = None
+        self._table_start = 0
+        self._count = 0
+        self.phrase_tokens = max(
+            (_phrase_tokens(entry[0]) for entry in self._extra), default=1
+        )
+        if path is not None:
+            self._open(path, header)
+
+    def _open(self, path: str, expected: ArtifactHeader | None) -> None:
+        with open(path, "rb") as file:
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            header = _read_header(self._map)
+        except ValueError:
+            raise ValueError(f"{path} is not an automaton artifact") from None
+        if expected is not None and header != expected:
+            raise ValueError(
+                f"{path} was replaced: expected {expected}, found {header}"
+            )
+        self._header = header
+        self._table_start = header.size + header.automaton_size
+        self._count = count = header.count
+        tokens = header.tokens
+        if tokens is None:
+            tokens = max(
+                (_phrase_tokens(self.entry(i)[0]) for i in range(count)),
+                default=1,
+            )
+        self.phrase_tokens = max(self.phrase_tokens, tokens)
+
+    def __getstate__(self) -> dict:
+        # Процессы пула заново отображают тот же файл, а не копируют таблицу.
+        return {
+            "automaton": self._automaton,
+            "path": self._path,
+            "extra": self._extra,
+            "header": self._header,
+        }
+
+    def __setstate__(self, state: dict) -> None:
+        self.__init__(
+            state["automaton"],
+            state["path"],
+            state["extra"],
+            state.get("header"),
+        )
+
+    def entry(self, index: int) -> Entry:
+        """Возвращает запись по номеру."""
+        if index >= self._count:
+            return self._extra[index - self._count]
+        position = self._table_start + index * _OFFSET.size
+        (start,) = _OFFSET.unpack_from(self._map, position)
+        (end,) = _OFFSET.unpack_from(self._map, position + _OFFSET.size)
+        blob_start = self._table_start + (self._count + 1) * _OFFSET.size
+        return _decode_entry(self._map[blob_start + start:blob_start + end])
+
+    def iter(self, text: str) -> Iterator[tuple[int, Entry]]:
+        for end_position, index in self._automaton.iter(text):
+            yield end_position, self.entry(index)
+
+    def items(self) -> Iterator[tuple[str, Entry]]:
+        for key, index in self._automaton.items():
+            yield key, self.entry(index)
+
+    def values(self) -> Iterator[Entry]:
+        for index in set(self._automaton.values()):
+            yield self.entry(index)
+
+    def get(self, key: str, *default: Any) -> Any:
+        index = self._automaton.get(key, -1)
+        if index == -1:
+            if default:
+                return default[0]
+            raise KeyError(key)
+        return self.entry(index)
+
+    def add_word(self, key: str, value: Entry) -> bool:
+        index = self._extra_index.get(value)
+        if index is None:
+            index = len(self._extra)
+            self._extra.append(value)
+            self._extra_index[value] = index
+            self.phrase_tokens = max(
+                self.phrase_tokens, _phrase_tokens(value[0])
+            )
+        return self._automaton.add_word(key, self._count + index)
+
+    def pop(self, key: str) -> Entry:
+        # `Automaton.pop` падает на STORE_INTS, поэтому get + remove_word.
+        entry = self.get(key)
+        self._automaton.remove_word(key)
+        return entry
+
+    def make_automaton(self) -> None:
+        self._automaton.make_automaton()
+
+
+def save_artifact(
+    automaton: ahocorasick.Automaton, path: str, journal_version: int = 0
+) -> None:
+    """
+    Сохраняет автомат с кортежами в значениях в формате артефакта.
+
+    Одинаковые записи (ключи-префиксы одного наименования) хранятся один
+    раз, длина самого длинного наименования пишется в заголовок. Файл
+    пишется рядом и атомарно подменяет предыдущий.
+
+    Args:
+        automaton: Автомат или `MappedAutomaton`.
+        path: Путь к артефакту.
+        journal_version: Версия журнала изменений, по которую собран
+            автомат.
+    """
+    entries: dict[Entry, int] = {}
+    compiled = ahocorasick.Automaton(ahocorasick.STORE_INTS)
+    for key, value in automaton.items():
+        index = entries.setdefault(tuple(value), len(entries))
+        compiled.add_word(key, index)
+    compiled.make_automaton()
+
+    automaton_data = pickle.dumps(compiled)
+    records = [_encode_entry(entry) for entry in entries]
+    offsets = [0]
+    for record in records:
+        offsets.append(offsets[-1] + len(record))
+    tokens = max((_phrase_tokens(entry[0]) for entry in entries), default=1)
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as file:
+        file.write(
+            _HEADER.pack(
+                _MAGIC,
+                len(automaton_data),
+                len(records),
+                tokens,
+                journal_version,
+            )
+        )
+        file.write(automaton_data)
+        file.write(struct.pack(f"<{len(offsets)}I", *offsets))
+        file.writelines(records)
+    os.replace(tmp_path, path)
+
+
+def load_artifact(path: str) -> MappedAutomaton:
+    """
+    Загружает автомат из артефакта; таблица записей остается в mmap.
+
+    Символическая ссылка (см. `publish_artifact`) разрешается сразу, и
+    автомат ссылается на неизменяемый файл своей версии.
+    """
+    path = os.path.realpath(path)
+    with open(path, "rb") as file:
+        header = _read_header(file.read(_HEADER.size))
+        file.seek(header.size)
+        compiled = pickle.loads(file.read(header.automaton_size))
+    return MappedAutomaton(compiled, path, header=header)
+
+
+def artifact_version(path: str) -> int:
+    """
+    Версия журнала изменений, по которую собран артефакт.
+
+    Returns:
+        -1, если артефакта нет; 0 для артефактов без версии в заголовке.
+    """
+    try:
+        with open(path, "rb") as file:
+            header = _read_header(file.read(_HEADER.size))
+    except FileNotFoundError:
+        return -1
+    return header.journal_version or 0
+
+
+def publish_artifact(
+    automaton: ahocorasick.Automaton, journal_version: int
+) -> MappedAutomaton:
+    """
+    Записывает общий артефакт (`MATCHER_AUTOMATON_ARTIFACT`) и загружает его.
+
+    Запись идет под блокировкой файла `<artifact>.lock` и только если
+    артефакт на диске собран по более раннюю версию журнала: перестроение,
+    прочитавшее справочник раньше, не затирает более новый артефакт и
+    загружает его.
+
+    Артефакт каждой версии пишется в свой файл `<artifact>.v<version>`,
+    который потом не меняется, а `<artifact>` - символическая ссылка на
+    текущий, подменяемая атомарно. Процесс, открывающий файл позже
+    (воркер пула), видит ту же таблицу, что и автомат, с которым его
+    запустили. Кроме текущего хранится `_KEPT_VERSIONS` предыдущих файлов;
+    уже отображенные в память файлы удаление не затрагивает.
+
+    Args:
+        automaton: Новый автомат.
+        journal_version: Версия журнала изменений, по которую он собран.
+    """
+    path = settings.matcher.automaton_artifact
+    with open(f"{path}.lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if artifact_version(path) <= journal_version:
+            target = f"{path}.v{journal_version}"
+            # Тот же снимок справочника: готовый файл не переписывается.
+            if not os.path.exists(target):
+                save_artifact(automaton, target, journal_version)
+            _link(target, path)
+            _remove_old_versions(path)
+    return load_artifact(path)
+
+
+def _link(target: str, path: str) -> None:
+    """Атомарно направляет `path` на `target` (в том же каталоге)."""
+    tmp_path = f"{path}.{os.getpid()}.link"
+    if os.path.lexists(tmp_path):
+        os.remove(tmp_path)
+    os.symlink(os.path.basename(target), tmp_path)
+    os.replace(tmp_path, path)
+
+
+def _remove_old_versions(path: str) -> None:
+    current = os.path.realpath(path)
+    versions = []
+    for versioned in glob.glob(f"{glob.escape(path)}.v*"):
+        suffix = versioned[len(path) + 2 :]
+        if suffix.isdigit():
+            versions.append((int(suffix), versioned))
+    versions.sort()
+    stale = [versioned for _, versioned in versions if versioned != current]
+    for versioned in stale[: max(len(stale) - _KEPT_VERSIONS, 0)]:
+        os.remove(versioned)
+
+
+def load_automaton() -> ahocorasick.Automaton | MappedAutomaton:
+    """
+    Загружает автомат в формате из настроек (`MATCHER_AUTOMATON_FORMAT`).
+
+    Для формата `mapped` при отсутствии артефакта он один раз собирается из
+    pickle-модели.
+    """
+    config = settings.matcher
+    if config.automaton_format == "mapped":
+        if not os.path.exists(config.automaton_artifact):
+            save_artifact(
+                ahocorasick.load(config.automaton_path, pickle.loads),
+                config.automaton_artifact,
+            )
+        return load_artifact(config.automaton_artifact)
+    return ahocorasick.load(config.automaton_path, pickle.loads)
+
+
+def save_automaton(automaton: ahocorasick.Automaton | MappedAutomaton) -> None:
+    """Сохраняет автомат в формате из настроек."""
+    config = settings.matcher
+    if config.automaton_format == "mapped":
+        save_artifact(automaton, config.automaton_artifact)
+    else:
+        automaton.save(config.automaton_path, pickle.dumps)
@@ -0,0 +1,330 @@
+import asyncio
+import hashlib
+import uuid
+from collections.abc import Iterable
+from dataclasses import dataclass
+from typing import Any, NamedTuple
+
+import ahocorasick
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.datastructures import State
+
+from src.application.services.aho import AhoCorasickService
+from src.application.services.fuzzy import build_fuzzy_index
+from src.application.services.layered import (
+    LayeredAutomaton,
+    LayeredFuzzyIndex,
+)
+from src.infrastructure.repositories.catalog_changes import CatalogChangesRepo
+from src.infrastructure.repositories.drugs import DrugsRepo
+from src.infrastructure.session import async_session_factory
+
+
+class CatalogEntry(NamedTuple):
+    """Лекарство в снимке справочника."""
+
+    id: uuid.UUID
+    trade_name: str
+    inn: str | None
+
+
+def catalog_entry(drug: Any) -> CatalogEntry:
+    """Приводит строку лекарства (из БД или журнала) к `CatalogEntry`."""
+    return CatalogEntry(drug.id, drug.trade_name, drug.inn)
+
+
+@dataclass(frozen=True)
+class DrugCatalog:
+    """
+    Снимок справочника лекарств в памяти процесса.
+
+    Attributes:
+        version: Номер версии снимка, увеличивается при каждом обновлении
+            справочника.
+        drugs: Лекарства (`CatalogEntry`) по `id`.
+        fingerprint: Хэш содержимого справочника. В отличие от `version`,
+            совпадает у всех процессов с одинаковым справочником.
+        journal_version: Последняя версия журнала изменений, учтенная в
+            снимке.
+    """
+
+    version: int
+    drugs: dict[Any, CatalogEntry]
+    fingerprint: str = ""
+    journal_version: int = 0
+
+    def with_changes(
+        self, changes: dict[Any, CatalogEntry | None], journal_version: int
+    ) -> "DrugCatalog":
+        """
+        Следующая версия снимка с измененными лекарствами.
+
+        Отпечаток пересчитывается только по измененным строкам. Копирование
+        словаря линейно по размеру справочника, поэтому вызывается вне
+        цикла событий.
+
+        Args:
+            changes: Новая строка лекарства по `id` или None для удаленных.
+            journal_version: Версия журнала, по которую учтены изменения.
+        """
+        drugs = dict(self.drugs)
+        removed = [drugs[drug_id] for drug_id in changes if drug_id in drugs]
+        for drug_id, drug in changes.items():
+            if drug is None:
+                drugs.pop(drug_id, None)
+            else:
+                drugs[drug_id] = drug
+        added = [drug for drug in changes.values() if drug is not None]
+        return DrugCatalog(
+            version=self.version + 1,
+            drugs=drugs,
+            fingerprint=update_fingerprint(self.fingerprint, removed, added),
+            journal_version=journal_version,
+        )
+
+
+class CatalogSnapshot(NamedTuple):
+    """
+    Снимок справочника и изменения, которых нет в базовом автомате.
+
+    Attributes:
+        catalog: Снимок справочника.
+        base_version: Версия журнала, по которую собран базовый автомат.
+        changed_ids: `id` лекарств, измененных после `base_version`; None,
+            если после нее справочник загружался целиком (запись `catalog`
+            в журнале) и базовый автомат его не покрывает.
+    """
+
+    catalog: DrugCatalog
+    base_version: int
+    changed_ids: list | None
+
+
+_FINGERPRINT_MODULUS = 1 << 128
+
+
+def _row_hash(drug: CatalogEntry) -> int:
+    row = f"{drug.id}\x1f{drug.trade_name}\x1f{drug.inn}\n"
+    digest = hashlib.blake2b(row.encode(), digest_size=16).digest()
+    return int.from_bytes(digest, "big")
+
+
+def catalog_fingerprint(drugs: Iterable[CatalogEntry]) -> str:
+    """
+    Хэш содержимого справочника, не зависящий от порядка строк.
+
+    Это сумма хэшей строк по модулю 2**128, поэтому после изменения
+    отдельных лекарств она пересчитывается по ним (`update_fingerprint`).
+    """
+    total = sum(map(_row_hash, drugs)) % _FINGERPRINT_MODULUS
+    return f"{total:032x}"
+
+
+def update_fingerprint(
+    fingerprint: str,
+    removed: Iterable[CatalogEntry],
+    added: Iterable[CatalogEntry],
+) -> str:
+    """
+    Отпечаток справочника после замены строк `removed` на `added`.
+
+    Args:
+        fingerprint: Отпечаток до изменения (`catalog_fingerprint`).
+        removed: Прежние строки измененных и удаленных лекарств.
+        added: Новые строки добавленных и измененных лекарств.
+    """
+    total = (
+        int(fingerprint, 16)
+        + sum(map(_row_hash, added))
+        - sum(map(_row_hash, removed))
+    )
+    return f"{total % _FINGERPRINT_MODULUS:032x}"
+
+
+async def load_catalog(
+    session: AsyncSession, version: int = 1, base_version: int | None = None
+) -> CatalogSnapshot:
+    """
+    Загружает снимок справочника из БД вместе с позицией журнала изменений.
+
+    Версия журнала, справочник и лекарства, измененные после
+    `base_version`, читаются в одной транзакции REPEATABLE READ, то есть из
+    одного снимка БД: каждое изменение либо уже есть в справочнике, либо
+    придет из журнала после `journal_version`.
+
+    Args:
+        session: Сессия БД.
+        version: Номер версии нового снимка.
+        base_version: Версия журнала, по которую собран базовый автомат;
+            по умолчанию - версия последнего артефакта в журнале.
+
+    Returns:
+        Снимок справочника с изменениями после `base_version`.
+    """
+    async with session.begin():
+        await session.connection(
+            execution_options={"isolation_level": "REPEATABLE READ"}
+        )
+        changes = CatalogChangesRepo(session)
+        journal_version = await changes.latest_version()
+        if base_version is None:
+            base_version = await changes.artifact_version()
+        changed_ids = await changes.changed_drugs(base_version)
+        rows = await DrugsRepo(session).get_catalog()
+    drugs = {row.id: catalog_entry(row) for row in rows}
+    catalog = DrugCatalog(
+        version=version,
+        drugs=drugs,
+        fingerprint=catalog_fingerprint(drugs.values()),
+        journal_version=journal_version,
+    )
+    return CatalogSnapshot(catalog, base_version, changed_ids)
+
+
+async def refresh_catalog(
+    state: State,
+    automaton: ahocorasick.Automaton | None = None,
+    base_version: int | None = None,
+) -> DrugCatalog:
+    """
+    Перечитывает справочник и публикует новую версию в состоянии приложения.
+
+    Вместе со снимком строится индекс нечеткого поиска (`state.fuzzy_index`),
+    так что он собирается один раз на версию справочника, а не на запрос.
+    Автомат, индекс и снимок передаются исполнителю поиска (`state.matcher`),
+    кэш результатов процесса (`state.result_cache`) и фрагменты JSON
+    (`state.drug_fragments`) сбрасываются, а кэш правил подачи
+    (`state.rule_cache`) перечитывается в фоне. Общий кэш не трогается: его
+    ключи содержат отпечаток справочника.
+    Лекарства, измененные в журнале после `base_version`, применяются к
+    базовому автомату малым уровнем `LayeredAutomaton`, поэтому автомат,
+    собранный раньше справочника, не теряет изменений. Если после
+    `base_version` справочник загружался целиком (запись `catalog`, см.
+    `init_db.py`), базовый автомат собирается заново по снимку.
+    Вызывается при запуске и после перестроения автомата (см.
+    `CatalogUpdateQueue.reload`). Новые автомат, снимок и индекс публикуются
+    вместе, без переключения цикла событий между присваиваниями; пул
+    процессов исполнителя переключается на них, когда запустится (см.
+    `MatcherExecutor.reload`). Запросы, уже получившие предыдущий снимок,
+    дорабатывают на нем.
+
+    Args:
+        state: Состояние приложения FastAPI.
+        automaton: Новый базовый автомат; по умолчанию базовый уровень
+            `state.automaton`.
+        base_version: Версия журнала, по которую собран `automaton`; по
+            умолчанию для текущего автомата - его `base_version`, для
+            нового - версия последнего артефакта в журнале.
+
+    Returns:
+        Новый снимок справочника.
+    """
+    current: DrugCatalog | None = getattr(state, "catalog", None)
+    version = current.version + 1 if current else 1
+    if automaton is None:
+        automaton = state.automaton.base
+        base_version = state.automaton.base_version
+    async with async_session_factory() as session:
+        snapshot = await load_catalog(session, version, base_version)
+    drugs = snapshot.catalog.drugs
+    if snapshot.changed_ids is None:
+        automaton = await asyncio.to_thread(
+            AhoCorasickService.build_automaton, list(drugs.values())
+        )
+        layered = LayeredAutomaton(
+            automaton, base_version=snapshot.catalog.journal_version
+        )
+        return await publish_catalog(state, snapshot.catalog, layered)
+    changes = {drug_id: drugs.get(drug_id) for drug_id in snapshot.changed_ids}
+    layered = LayeredAutomaton(automaton, base_version=snapshot.base_version)
+    if changes:
+        layered = await asyncio.to_thread(layered.with_changes, changes)
+    return await publish_catalog(state, snapshot.catalog, layered)
+
+
+async def publish_catalog(
+    state: State,
+    catalog: DrugCatalog,
+    automaton: ahocorasick.Automaton | None = None,
+) -> DrugCatalog:
+    """
+    Публикует готовый снимок справочника (см. `refresh_catalog`).
+
+    Новый автомат оборачивается в `LayeredAutomaton` базовым уровнем, чтобы
+    последующие изменения лекарств применялись к нему без пересборки.
+
+    Args:
+        state: Состояние приложения FastAPI.
+        catalog: Новый снимок справочника.
+        automaton: Новый автомат; по умолчанию остается `state.automaton`.
+
+    Returns:
+        Опубликованный снимок.
+    """
+    fuzzy_index = await asyncio.to_thread(
+        build_fuzzy_index, catalog.drugs.values()
+    )
+    if automaton is not None:
+        state.automaton = automaton
+    if not isinstance(state.automaton, LayeredAutomaton):
+        state.automaton = LayeredAutomaton(state.automaton)
+    state.catalog = catalog
+    state.fuzzy_index = fuzzy_index
+    matcher = getattr(state, "matcher", None)
+    if matcher is not None:
+        await matcher.reload(state.automaton, fuzzy_index, catalog)
+    result_cache = getattr(state, "result_cache", None)
+    if result_cache is not None:
+        result_cache.clear()
+    fragments = getattr(state, "drug_fragments", None)
+    if fragments is not None:
+        fragments.clear()
+    rule_cache = getattr(state, "rule_cache", None)
+    if rule_cache is not None:
+        rule_cache.reload()
+    return catalog
+
+
+async def publish_changes(
+    state: State,
+    catalog: DrugCatalog,
+    automaton: LayeredAutomaton,
+    changes: dict[Any, CatalogEntry | None],
+) -> DrugCatalog:
+    """
+    Публикует снимок справочника после изменения отдельных лекарств.
+
+    В отличие от `publish_catalog`, ничего не пересобирается по всему
+    справочнику: изменения ложатся в малый уровень индекса нечеткого
+    поиска (`LayeredFuzzyIndex`), а кэш правил подачи и фрагменты ответа
+    обновляются только для измененных лекарств.
+
+    Args:
+        state: Состояние приложения FastAPI.
+        catalog: Новый снимок справочника (`DrugCatalog.with_changes`).
+        automaton: Автомат с примененными изменениями.
+        changes: Новая строка лекарства по `id` или None для удаленных.
+
+    Returns:
+        Опубликованный снимок.
+    """
+    fuzzy_index = state.fuzzy_index
+    if not isinstance(fuzzy_index, LayeredFuzzyIndex):
+        fuzzy_index = LayeredFuzzyIndex(fuzzy_index)
+    fuzzy_index = await asyncio.to_thread(fuzzy_index.with_changes, changes)
+    state.automaton = automaton
+    state.catalog = catalog
+    state.fuzzy_index = fuzzy_index
+    matcher = getattr(state, "matcher", None)
+    if matcher is not None:
+        await matcher.reload(automaton, fuzzy_index, catalog)
+    result_cache = getattr(state, "result_cache", None)
+    if result_cache is not None:
+        result_cache.clear()
+    fragments = getattr(state, "drug_fragments", None)
+    if fragments is not None:
+        fragments.discard(changes)
+    rule_cache = getattr(state, "rule_cache", None)
+    if rule_cache is not None:
+        await rule_cache.refresh(changes)
+    return catalog
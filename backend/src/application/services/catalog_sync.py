@@ -0,0 +1,479 @@
+import asyncio
+import glob
+import itertools
+import logging
+import os
+from collections.abc import Iterable
+from dataclasses import replace
+from typing import Any
+
+import asyncpg
+from starlette.datastructures import State
+
+from src.application.services.aho import AhoCorasickService
+from src.application.services.automaton import (
+    load_artifact,
+    load_automaton,
+    save_artifact,
+)
+from src.application.services.catalog import (
+    CatalogEntry,
+    DrugCatalog,
+    catalog_entry,
+    publish_changes,
+    refresh_catalog,
+)
+from src.application.services.fuzzy import FuzzyIndex, build_fuzzy_index
+from src.application.services.layered import (
+    LayeredAutomaton,
+    LayeredFuzzyIndex,
+)
+from src.infrastructure.repositories.catalog_changes import CatalogChangesRepo
+from src.infrastructure.session import async_session_factory
+from src.settings import settings
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "catalog_changes"
+
+
+class CatalogUpdateQueue:
+    """
+    Очередь изменений лекарств, применяемых к автомату пакетами.
+
+    Изменения копятся в течение `CATALOG_DEBOUNCE_SECONDS` и схлопываются по
+    `id` лекарства (последнее изменение побеждает), после чего применяются
+    одним `LayeredAutomaton.with_changes` и одной публикацией снимка
+    справочника (`publish_changes`): пересобираются только малые уровни
+    автомата и индекса нечеткого поиска, таблица `drugs` не перечитывается,
+    а работа, линейная по размеру справочника, идет вне цикла событий.
+    Строки приводятся к `CatalogEntry`, и изменения, совпадающие со снимком
+    (например, правка из админки, позже пришедшая из журнала), не
+    публикуются повторно. Когда малый уровень достигает
+    `CATALOG_COMPACT_THRESHOLD`, в фоне собирается новый базовый автомат по
+    снимку справочника. Все изменения автомата в воркере (админка, журнал
+    изменений, перестроение) идут через эту очередь и поэтому не перетирают
+    друг друга. Если пакет не удалось применить, он возвращается в очередь
+    (более поздние изменения того же лекарства побеждают) и повторяется с
+    растущей задержкой; после `CATALOG_APPLY_RETRIES` неудач задача
+    завершается ошибкой, а изменения ждут следующего `submit`.
+    """
+
+    def __init__(self, state: State) -> None:
+        self._state = state
+        self._pending: dict[Any, CatalogEntry | None] = {}
+        self._journal_version = 0
+        self._task: asyncio.Task | None = None
+        self._compaction: asyncio.Task | None = None
+        self._lock = asyncio.Lock()
+
+    def submit(
+        self,
+        drugs: Iterable[Any] = (),
+        deleted_ids: Iterable[Any] = (),
+        journal_version: int = 0,
+    ) -> None:
+        """
+        Ставит изменения в очередь.
+
+        Args:
+            drugs: Новые или измененные лекарства (`id`, `trade_name`,
+                `inn`).
+            deleted_ids: Идентификаторы удаленных лекарств.
+            journal_version: Версия журнала изменений, по которую учтены
+                изменения (0, если они пришли не из журнала).
+        """
+        for drug in drugs:
+            self._pending[drug.id] = catalog_entry(drug)
+        for drug_id in deleted_ids:
+            self._pending[drug_id] = None
+        self._journal_version = max(self._journal_version, journal_version)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._flush_later())
+
+    async def flush(self) -> None:
+        """
+        Дожидается применения изменений, поставленных в очередь.
+
+        Изменения, оставшиеся в очереди после неудачи, применяются заново.
+
+        Raises:
+            Exception: Изменения не удалось применить; они остаются в
+                очереди.
+        """
+        if self._pending and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._flush_later())
+        if self._task is not None:
+            await self._task
+
+    async def reload(
+        self, automaton: Any, base_version: int | None = None
+    ) -> DrugCatalog:
+        """
+        Заменяет базовый автомат и перечитывает справочник целиком.
+
+        Изменения в очереди отбрасываются: они уже есть в новом снимке.
+
+        Args:
+            automaton: Новый базовый автомат.
+            base_version: Версия журнала, по которую он собран (см.
+                `refresh_catalog`).
+
+        Returns:
+            Новый снимок справочника.
+        """
+        async with self._lock:
+            self._pending.clear()
+            self._journal_version = 0
+            return await refresh_catalog(self._state, automaton, base_version)
+
+    async def stop(self) -> None:
+        """Применяет оставшиеся изменения и прерывает сведение уровней."""
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.exception(e)
+        if self._compaction is not None:
+            self._compaction.cancel()
+            await asyncio.gather(self._compaction, return_exceptions=True)
+        _remove_compaction_artifacts()
+
+    async def _flush_later(self) -> None:
+        config = settings.catalog
+        await asyncio.sleep(config.debounce_seconds)
+        failures = 0
+        while self._pending:
+            async with self._lock:
+                pending, self._pending = self._pending, {}
+                journal_version, self._journal_version = (
+                    self._journal_version,
+                    0,
+                )
+                try:
+                    await self._apply(pending, journal_version)
+                    failures = 0
+                except Exception as e:
+                    logger.exception(e)
+                    self._pending = pending | self._pending
+                    self._journal_version = max(
+                        self._journal_version, journal_version
+                    )
+                    failures += 1
+                    if failures > config.apply_retries:
+                        raise
+            if failures:
+                await asyncio.sleep(
+                    config.retry_seconds * 2 ** (failures - 1)
+                )
+        automaton: LayeredAutomaton = self._state.automaton
+        if automaton.delta_size >= settings.catalog.compact_threshold and (
+            self._compaction is None or self._compaction.done()
+        ):
+            self._compaction = asyncio.create_task(self._compact())
+
+    async def _apply(
+        self, pending: dict[Any, CatalogEntry | None], journal_version: int
+    ) -> None:
+        catalog: DrugCatalog = self._state.catalog
+        journal_version = max(catalog.journal_version, journal_version)
+        changes = {
+            drug_id: drug
+            for drug_id, drug in pending.items()
+            if catalog.drugs.get(drug_id) != drug
+        }
+        if not changes:
+            self._state.catalog = replace(
+                catalog, journal_version=journal_version
+            )
+            return
+
+        catalog, automaton = await asyncio.to_thread(
+            _with_changes,
+            catalog,
+            self._state.automaton,
+            changes,
+            journal_version,
+        )
+        await publish_changes(self._state, catalog, automaton, changes)
+
+    async def _compact(self) -> None:
+        """
+        Сводит уровни автомата в новый базовый.
+
+        Базовые автомат и индекс нечеткого поиска собираются вне цикла
+        событий по снимку справочника на момент запуска. Изменения,
+        примененные за время сборки, переносятся в их малые уровни. Если за
+        это время базовый автомат заменило перестроение, результат
+        отбрасывается.
+        """
+        catalog: DrugCatalog = self._state.catalog
+        started: LayeredAutomaton = self._state.automaton
+        try:
+            base, fuzzy_base = await asyncio.to_thread(
+                build_base, catalog.drugs.values()
+            )
+            async with self._lock:
+                if self._state.automaton.base is not started.base:
+                    return
+                current: DrugCatalog = self._state.catalog
+                changes = await asyncio.to_thread(
+                    _diff, catalog.drugs, current.drugs
+                )
+                automaton = LayeredAutomaton(
+                    base, base_version=catalog.journal_version
+                )
+                fuzzy_index = LayeredFuzzyIndex(fuzzy_base)
+                if changes:
+                    automaton = await asyncio.to_thread(
+                        automaton.with_changes, changes
+                    )
+                    fuzzy_index = await asyncio.to_thread(
+                        fuzzy_index.with_changes, changes
+                    )
+                self._state.automaton = automaton
+                self._state.fuzzy_index = fuzzy_index
+                await self._state.matcher.reload(
+                    automaton, fuzzy_index, current
+                )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.exception(e)
+
+
+def _with_changes(
+    catalog: DrugCatalog,
+    automaton: LayeredAutomaton,
+    changes: dict[Any, CatalogEntry | None],
+    journal_version: int,
+) -> tuple[DrugCatalog, LayeredAutomaton]:
+    return (
+        catalog.with_changes(changes, journal_version),
+        automaton.with_changes(changes),
+    )
+
+
+def _diff(
+    built: dict[Any, CatalogEntry], current: dict[Any, CatalogEntry]
+) -> dict[Any, CatalogEntry | None]:
+    """Изменения справочника `current` относительно `built`."""
+    changes: dict[Any, CatalogEntry | None] = {
+        drug_id: drug
+        for drug_id, drug in current.items()
+        if built.get(drug_id) != drug
+    }
+    changes.update(dict.fromkeys(built.keys() - current.keys()))
+    return changes
+
+
+_compactions = itertools.count()
+
+
+def _compaction_prefix() -> str:
+    return f"{settings.matcher.automaton_artifact}.{os.getpid()}-"
+
+
+def _remove_compaction_artifacts(keep: str | None = None) -> None:
+    """Удаляет артефакты сведения уровней этого процесса, кроме `keep`."""
+    for path in glob.glob(f"{glob.escape(_compaction_prefix())}*"):
+        if path != keep:
+            os.remove(path)
+
+
+def build_base(drugs: Iterable[CatalogEntry]) -> tuple[Any, FuzzyIndex]:
+    """
+    Собирает базовые автомат и индекс нечеткого поиска по справочнику.
+
+    Для формата `mapped` автомат сохраняется в собственный артефакт
+    процесса (`<artifact>.<pid>-<n>`) и загружается из него, чтобы таблица
+    записей лежала в файле, а не в памяти процесса. Каждое сведение пишет
+    новый файл, поэтому файл, с которым запущен пул, не меняется; прежние
+    файлы удаляются, когда пул с ними уже запущен. Общий артефакт меняет
+    только перестроение (см. `publish_artifact`).
+    """
+    drugs = list(drugs)
+    automaton = AhoCorasickService.build_automaton(drugs)
+    fuzzy_index = build_fuzzy_index(drugs)
+    if settings.matcher.automaton_format != "mapped":
+        return automaton, fuzzy_index
+    path = f"{_compaction_prefix()}{next(_compactions)}"
+    save_artifact(automaton, path)
+    _remove_compaction_artifacts(keep=path)
+    return load_artifact(path), fuzzy_index
+
+
+class CatalogListener:
+    """
+    Синхронизация справочника воркера с изменениями в БД.
+
+    Слушает канал NOTIFY `catalog_changes` на отдельном соединении asyncpg
+    и при уведомлении читает из журнала только записи после последней
+    обработанной версии. Начальная версия - `journal_version` снимка
+    справочника, прочитанная вместе с ним (см. `load_catalog`), поэтому
+    изменения между загрузкой и подпиской не теряются. Записи, уже
+    учтенные в снимке, пропускаются. Изменения лекарств передаются в
+    `CatalogUpdateQueue` (`state.catalog_updates`); артефакт, собранный
+    другим воркером по более позднюю версию журнала, чем базовый автомат
+    воркера, загружается заново; после массовой загрузки справочника
+    (запись `catalog`) он перечитывается целиком с новым базовым автоматом;
+    изменения правил подачи сбрасывают кэши результатов и правил.
+    Обработанная версия сдвигается только после того, как изменения
+    применены, поэтому после ошибки те же записи журнала читаются снова.
+    """
+
+    def __init__(self, state: State) -> None:
+        self._state = state
+        self._version = 0
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    async def start(self, version: int) -> None:
+        """
+        Начинает слушать журнал.
+
+        Args:
+            version: Версия журнала, учтенная в текущем снимке справочника.
+        """
+        self._version = version
+        self._task = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    def _notify(self, connection, pid, channel, payload) -> None:
+        self._wakeup.set()
+
+    async def _listen(self) -> None:
+        config = settings.catalog
+        dsn = settings.db.connection_string.replace("+asyncpg", "")
+        while True:
+            connection = None
+            try:
+                connection = await asyncpg.connect(dsn)
+                await connection.add_listener(CHANNEL, self._notify)
+                # Догоняем изменения, пропущенные до (пере)подключения.
+                self._wakeup.set()
+                while not connection.is_closed():
+                    try:
+                        await asyncio.wait_for(
+                            self._wakeup.wait(), config.reconnect_seconds
+                        )
+                    except TimeoutError:
+                        continue
+                    await asyncio.sleep(config.debounce_seconds)
+                    self._wakeup.clear()
+                    await self.sync()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.exception(e)
+            finally:
+                if connection is not None and not connection.is_closed():
+                    await connection.close()
+            await asyncio.sleep(config.reconnect_seconds)
+
+    async def sync(self) -> None:
+        """
+        Применяет записи журнала после последней обработанной версии.
+
+        Raises:
+            Exception: Изменения не применены; версия не сдвигается.
+        """
+        async with async_session_factory() as session:
+            changes = await CatalogChangesRepo(session).get_since(
+                self._version
+            )
+        if not changes:
+            return
+
+        updates: CatalogUpdateQueue = self._state.catalog_updates
+        artifact_version = max(
+            (
+                change.base_version
+                for change in changes
+                if change.kind == "artifact"
+            ),
+            default=-1,
+        )
+        # Артефакт, собранный этим воркером или по более раннюю версию
+        # журнала, чем базовый автомат, перечитывать незачем.
+        if artifact_version > self._state.automaton.base_version:
+            automaton = await asyncio.to_thread(load_automaton)
+            catalog = await updates.reload(automaton, artifact_version)
+            self._version = max(changes[-1].version, catalog.journal_version)
+            return
+
+        applied = self._state.catalog.journal_version
+        if any(
+            change.kind == "catalog" and change.version > applied
+            for change in changes
+        ):
+            # `refresh_catalog` увидит запись и соберет базовый автомат по
+            # снимку; правила при загрузке тоже менялись.
+            automaton: LayeredAutomaton = self._state.automaton
+            catalog = await updates.reload(
+                automaton.base, automaton.base_version
+            )
+            await self._refresh_rules(None)
+            self._version = max(changes[-1].version, catalog.journal_version)
+            return
+
+        rules_changed = False
+        rule_drug_ids = set()
+        for change in changes:
+            if change.version <= applied:
+                continue
+            if change.kind == "drug":
+                if change.id is None:
+                    updates.submit(
+                        deleted_ids=[change.drug_id],
+                        journal_version=change.version,
+                    )
+                else:
+                    updates.submit(
+                        drugs=[catalog_entry(change)],
+                        journal_version=change.version,
+                    )
+            elif change.kind == "rules":
+                rules_changed = True
+                # Запись без лекарства (TRUNCATE таблицы правил) означает,
+                # что затронут весь справочник правил.
+                if rule_drug_ids is not None and change.drug_id is not None:
+                    rule_drug_ids.add(change.drug_id)
+                else:
+                    rule_drug_ids = None
+        await updates.flush()
+        if rules_changed:
+            await self._refresh_rules(rule_drug_ids)
+        self._version = changes[-1].version
+
+    async def _refresh_rules(self, drug_ids: set | None) -> None:
+        """
+        Обновляет кэши после изменения правил подачи.
+
+        Кэш результатов сбрасывается вместе с общим уровнем, как в админке
+        (`ResultCache.invalidate`): иначе воркеры продолжали бы отдавать из
+        общего кэша результаты со старыми правилами. Сброс идет после
+        обновления кэша правил.
+
+        Args:
+            drug_ids: Лекарства с измененными правилами; None, если
+                изменился весь справочник правил.
+        """
+        fragments = getattr(self._state, "drug_fragments", None)
+        if fragments is not None:
+            if drug_ids is None:
+                fragments.clear()
+            else:
+                fragments.discard(drug_ids)
+        rule_cache = getattr(self._state, "rule_cache", None)
+        if rule_cache is not None:
+            if drug_ids is None:
+                rule_cache.reload()
+            else:
+                await rule_cache.refresh(drug_ids)
+        result_cache = getattr(self._state, "result_cache", None)
+        if result_cache is not None:
+            result_cache.invalidate()
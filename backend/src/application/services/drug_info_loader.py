@@ -0,0 +1,89 @@
+import asyncio
+from collections.abc import Iterable
+
+import sqlalchemy as sa
+
+from src.application.services.rule_cache import DrugInfoIndex
+from src.infrastructure.repositories.drugs import DrugsRepo
+from src.infrastructure.session import async_session_factory
+from src.settings import settings
+
+
+class DrugInfoLoader:
+    """
+    Объединение запросов сведений о лекарствах от параллельных запросов.
+
+    Запросы, пришедшие в течение `window_seconds` после первого, собираются
+    в один пакет: объединения их `id` и слов выбираются одним
+    `DrugsRepo.get_drug_info` на отдельной сессии, и каждый запрос получает
+    свои строки, как если бы выполнял запрос сам. Пакет отправляется раньше,
+    если в нем набралось `max_keys` ключей. Так на много одновременных
+    поисков приходится одно соединение из пула, а не по одному на запрос.
+    """
+
+    def __init__(self, window_seconds: float, max_keys: int) -> None:
+        self.window_seconds = window_seconds
+        self.max_keys = max_keys
+        self._batch: list[tuple[set, set, asyncio.Future]] = []
+        self._keys = 0
+        self._timer: asyncio.TimerHandle | None = None
+        self._tasks: set[asyncio.Task] = set()
+        self._labels = {"service": settings.app.name}
+
+    async def load(
+        self, drug_ids: Iterable, words: Iterable[str]
+    ) -> list[sa.Row]:
+        """
+        Строки лекарств с действующими правилами, как у `get_drug_info`.
+
+        Args:
+            drug_ids: Идентификаторы лекарств.
+            words: Наименования лекарств (`trade_name` или `inn`).
+        """
+        drug_ids, words = set(drug_ids), set(words)
+        if not drug_ids and not words:
+            return []
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._batch.append((drug_ids, words, future))
+        self._keys += len(drug_ids) + len(words)
+        if self._keys >= self.max_keys:
+            self._dispatch()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window_seconds, self._dispatch)
+        return await future
+
+    def _dispatch(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._batch, self._keys = self._batch, [], 0
+        if batch:
+            task = asyncio.create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(
+        self, batch: list[tuple[set, set, asyncio.Future]]
+    ) -> None:
+        settings.metrics.drug_info_batches.inc(self._labels)
+        settings.metrics.drug_info_batch_size.observe(
+            self._labels, len(batch)
+        )
+        all_ids = set().union(*(drug_ids for drug_ids, _, _ in batch))
+        all_words = set().union(*(words for _, words, _ in batch))
+        try:
+            async with async_session_factory() as session:
+                rows = await DrugsRepo(session).get_drug_info(
+                    list(all_ids), list(all_words)
+                )
+        except Exception as e:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        index = DrugInfoIndex(rows)
+        for drug_ids, words, future in batch:
+            if not future.done():
+                future.set_result(index.select(drug_ids, words))
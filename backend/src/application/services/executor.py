@@ -0,0 +1,218 @@
+import asyncio
+import multiprocessing
+import threading
+from collections.abc import Callable
+from concurrent import futures
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any
+
+import ahocorasick
+
+from src.application.services.aho import max_phrase_tokens
+from src.application.services.catalog import DrugCatalog
+from src.application.services.fuzzy import FuzzyIndex
+from src.application.services.layered import (
+    LayeredAutomaton,
+    LayeredFuzzyIndex,
+)
+from src.settings import settings
+
+_worker_state: dict[str, Any] = {}
+
+# Сколько процесс пула ждет остальные при запуске, секунд.
+_START_TIMEOUT = 300
+
+
+def _split_layers(index: Any) -> tuple[Any, dict, frozenset]:
+    """Базовый уровень, `delta_drugs` и `tombstones` индекса."""
+    if isinstance(index, (LayeredAutomaton, LayeredFuzzyIndex)):
+        return index.base, index.delta_drugs, index.tombstones
+    return index, {}, frozenset()
+
+
+def _init_worker(
+    automaton: Any,
+    fuzzy_index: FuzzyIndex,
+    started: threading.Barrier | None = None,
+) -> None:
+    """
+    Загружает базовые автомат и индекс в процессе пула один раз.
+
+    Процесс, запустившийся первым, ждет на `started` остальные, чтобы не
+    освободиться раньше них: иначе пул не запустил бы процесс на каждую
+    задачу из `_spawn_pool`.
+    """
+    # Импорт загружает модель spaCy до первой задачи.
+    import src.application.services.nlp  # noqa: F401
+
+    _worker_state["base"] = automaton
+    _worker_state["base_tokens"] = max_phrase_tokens(automaton)
+    _worker_state["fuzzy_base"] = fuzzy_index
+    _worker_state["version"] = None
+    if started is not None:
+        try:
+            started.wait(_START_TIMEOUT)
+        except threading.BrokenBarrierError:
+            pass
+
+
+def _ready() -> None:
+    """Пустая задача: выполняется, когда процесс пула запущен."""
+
+
+def _spawn_pool(
+    workers: int, automaton: Any, fuzzy_index: FuzzyIndex
+) -> ProcessPoolExecutor:
+    """
+    Создает пул процессов и дожидается запуска всех процессов.
+
+    Пул процессов `spawn` запускает процессы по мере поступления задач, а
+    артефакт `MappedAutomaton` передается процессу путем к файлу. Процесс,
+    запущенный позже, мог бы открыть уже перезаписанный артефакт, поэтому
+    все процессы запускаются сразу: на каждый - пустая задача.
+
+    Args:
+        workers: Число процессов.
+        automaton: Базовый автомат.
+        fuzzy_index: Базовый индекс нечеткого поиска.
+    """
+    context = multiprocessing.get_context("spawn")
+    pool = ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=context,
+        initializer=_init_worker,
+        initargs=(automaton, fuzzy_index, context.Barrier(workers)),
+    )
+    futures.wait([pool.submit(_ready) for _ in range(workers)])
+    return pool
+
+
+def _run_in_worker(delta: tuple, func: Callable, *args: Any) -> Any:
+    version, automaton_delta, fuzzy_delta = delta
+    if _worker_state["version"] != version:
+        _worker_state["automaton"] = LayeredAutomaton(
+            _worker_state["base"],
+            *automaton_delta,
+            base_tokens=_worker_state["base_tokens"],
+        )
+        _worker_state["fuzzy_index"] = LayeredFuzzyIndex(
+            _worker_state["fuzzy_base"], *fuzzy_delta
+        )
+        _worker_state["version"] = version
+    return func(
+        _worker_state["automaton"], _worker_state["fuzzy_index"], *args
+    )
+
+
+class MatcherExecutor:
+    """
+    Исполнитель CPU-нагрузки поиска лекарств вне цикла событий.
+
+    Хранит текущие автомат и индекс нечеткого поиска и передает их первыми
+    аргументами в функцию задачи. В режиме `process` процессы пула получают
+    базовые уровни автомата и индекса один раз при старте, а с каждой
+    задачей - версию справочника и малые уровни (`delta_drugs`,
+    `tombstones`), по которым процесс пересобирает свои `LayeredAutomaton` и
+    `LayeredFuzzyIndex` при смене версии. Пул пересоздается только при смене
+    базового уровня (перестроение, сведение уровней): новый пул запускается
+    в потоке, до его готовности задачи идут в старый пул с прежним снимком,
+    уже запущенные задачи дорабатывают в старом пуле.
+    """
+
+    def __init__(self, kind: str, workers: int) -> None:
+        self.kind = kind
+        self.workers = workers
+        self.version = 0
+        self.fingerprint = ""
+        self.phrase_tokens = 0
+        self._automaton: ahocorasick.Automaton | None = None
+        self._fuzzy_index: FuzzyIndex | None = None
+        self._pool: Executor | None = None
+        self._bases: tuple = (None, None)
+        self._delta: tuple | None = None
+        self._reload_lock = asyncio.Lock()
+        self._pending = 0
+        if kind == "thread":
+            self._pool = ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix="matcher"
+            )
+
+    async def reload(
+        self,
+        automaton: ahocorasick.Automaton,
+        fuzzy_index: FuzzyIndex,
+        catalog: DrugCatalog,
+    ) -> None:
+        """
+        Публикует новый снимок словаря для последующих задач.
+
+        Снимки публикуются в порядке вызовов.
+
+        Args:
+            automaton: Автомат Ахо-Корасик.
+            fuzzy_index: Индекс нечеткого поиска.
+            catalog: Снимок справочника, по которому построен индекс.
+        """
+        async with self._reload_lock:
+            if self.kind == "process":
+                base, *automaton_delta = _split_layers(automaton)
+                fuzzy_base, *fuzzy_delta = _split_layers(fuzzy_index)
+                if (
+                    self._bases[0] is not base
+                    or self._bases[1] is not fuzzy_base
+                ):
+                    await self._respawn(base, fuzzy_base)
+                self._delta = (
+                    catalog.version,
+                    tuple(automaton_delta),
+                    tuple(fuzzy_delta),
+                )
+            self._automaton = automaton
+            self._fuzzy_index = fuzzy_index
+            self.phrase_tokens = max_phrase_tokens(automaton)
+            self.version = catalog.version
+            self.fingerprint = catalog.fingerprint
+
+    async def _respawn(self, base: Any, fuzzy_base: FuzzyIndex) -> None:
+        pool = await asyncio.to_thread(
+            _spawn_pool, self.workers, base, fuzzy_base
+        )
+        previous, self._pool = self._pool, pool
+        self._bases = (base, fuzzy_base)
+        if previous is not None:
+            previous.shutdown(wait=False)
+
+    async def run(self, func: Callable, *args: Any) -> Any:
+        """
+        Выполняет `func(automaton, fuzzy_index, *args)` в пуле исполнителя.
+
+        Функция должна быть доступна по имени модуля, чтобы ее можно было
+        передать в процесс пула.
+        """
+        if self._pool is None:
+            return func(self._automaton, self._fuzzy_index, *args)
+
+        if self.kind == "process":
+            future = asyncio.get_running_loop().run_in_executor(
+                self._pool, _run_in_worker, self._delta, func, *args
+            )
+        else:
+            future = asyncio.get_running_loop().run_in_executor(
+                self._pool, func, self._automaton, self._fuzzy_index, *args
+            )
+        self._set_pending(1)
+        try:
+            return await future
+        finally:
+            self._set_pending(-1)
+
+    def _set_pending(self, delta: int) -> None:
+        self._pending += delta
+        settings.metrics.matcher_queue_depth.set(
+            {"executor": self.kind, "service": settings.app.name},
+            self._pending,
+        )
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,82 @@
+from collections import OrderedDict, defaultdict
+from collections.abc import Iterable
+from typing import Any
+
+import orjson
+from pydantic import BaseModel
+
+from src.infrastructure.repositories.drugs import DrugInfoRow
+from src.infrastructure.schemas.text_processing import DrugTable
+
+
+def to_jsonable(value: Any) -> Any:
+    """`default` для `orjson.dumps`: модели pydantic через `model_dump`."""
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    raise TypeError
+
+
+class DrugFragments:
+    """
+    Готовый JSON сведений о лекарствах (`DrugTable`) по строкам правил.
+
+    Строка сериализуется один раз и дальше подставляется в ответ как
+    `orjson.Fragment`, без валидации pydantic и повторного кодирования.
+    Ключ - сама строка, поэтому измененное лекарство или правило дает новый
+    фрагмент. Фрагменты лекарств, чьи данные или правила изменились,
+    удаляются (`discard`, `clear`), чтобы не занимать место. Хранится не
+    больше `max_entries` фрагментов, давно не использованные вытесняются.
+    """
+
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self._fragments: OrderedDict[DrugInfoRow, orjson.Fragment] = (
+            OrderedDict()
+        )
+        self._by_drug: defaultdict[Any, set[DrugInfoRow]] = defaultdict(set)
+
+    def __len__(self) -> int:
+        return len(self._fragments)
+
+    def discard(self, drug_ids: Iterable) -> None:
+        """Удаляет фрагменты строк указанных лекарств."""
+        for drug_id in drug_ids:
+            for row in self._by_drug.pop(drug_id, ()):
+                del self._fragments[row]
+
+    def clear(self) -> None:
+        """Удаляет все фрагменты."""
+        self._fragments.clear()
+        self._by_drug.clear()
+
+    def get(self, rows: Iterable[DrugInfoRow]) -> list[orjson.Fragment]:
+        """
+        Фрагменты JSON для строк сведений о лекарствах.
+
+        Args:
+            rows: Строки `get_drug_info`.
+        """
+        fragments = []
+        for row in rows:
+            fragment = self._fragments.get(row)
+            if fragment is not None:
+                self._fragments.move_to_end(row)
+            else:
+                fragment = orjson.Fragment(
+                    orjson.dumps(DrugTable.model_validate(row).model_dump())
+                )
+                self._put(row, fragment)
+            fragments.append(fragment)
+        return fragments
+
+    def _put(self, row: DrugInfoRow, fragment: orjson.Fragment) -> None:
+        if self.max_entries <= 0:
+            return
+        self._fragments[row] = fragment
+        self._by_drug[row.drug_id].add(row)
+        while len(self._fragments) > self.max_entries:
+            evicted, _ = self._fragments.popitem(last=False)
+            rows = self._by_drug[evicted.drug_id]
+            rows.discard(evicted)
+            if not rows:
+                del self._by_drug[evicted.drug_id]
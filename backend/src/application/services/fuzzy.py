@@ -0,0 +1,288 @@
+from collections.abc import Iterable
+from itertools import combinations
+
+import numpy as np
+from rapidfuzz import process
+from rapidfuzz.distance import DamerauLevenshtein
+
+from src.settings import settings
+
+
+class FuzzyIndex:
+    """Базовый класс индекса нечеткого поиска наименований лекарств."""
+
+    def add(self, word: str, drug_id: int):
+        raise NotImplementedError
+
+    def search(self, word: str, max_dist: int) -> list[tuple[str, int, int]]:
+        raise NotImplementedError
+
+    def search_many(
+        self, words: Iterable[str], max_dist: int
+    ) -> dict[str, list[tuple[str, int, int]]]:
+        """
+        Ищет несколько слов за один вызов.
+
+        Args:
+            words: Слова для поиска, повторы схлопываются.
+            max_dist: Максимальное расстояние Дамерау-Левенштейна.
+
+        Returns:
+            Словарь слово -> список (word, drug_id, distance).
+        """
+        return {word: self.search(word, max_dist) for word in set(words)}
+
+
+class BKTree(FuzzyIndex):
+
+    class Node:
+        def __init__(self, word: str, drug_id: int):
+            self.word = word
+            self.drug_id = drug_id
+            self.children = {}
+
+    def __init__(self, distance_func):
+        self.root = None
+        self.distance_func = distance_func
+
+    def add(self, word: str, drug_id: int):
+        """Add a word with its drug ID to the BK-tree."""
+        if not word:
+            return
+        if not self.root:
+            self.root = self.Node(word, drug_id)
+            return
+        current = self.root
+        while True:
+            dist = self.distance_func(word, current.word)
+            if dist in current.children:
+                current = current.children[dist]
+            else:
+                current.children[dist] = self.Node(word, drug_id)
+                break
+
+    def search(self, word: str, max_dist: int) -> list[tuple[str, int, int]]:
+        """Search for words within max_dist of the query word, returning (word, drug_id, distance)."""
+        if not self.root:
+            return []
+        results = []
+        self._search_recursive(self.root, word, max_dist, results)
+        return results
+
+    def _search_recursive(
+        self, node: Node, word: str, max_dist: int, results: list
+    ):
+        if not node:
+            return
+        dist = self.distance_func(word, node.word)
+        if dist <= max_dist:
+            results.append((node.word, node.drug_id, dist))
+        min_dist = max(0, dist - max_dist)
+        max_dist_bound = dist + max_dist
+        for child_dist in range(int(min_dist), int(max_dist_bound) + 1):
+            if child_dist in node.children:
+                self._search_recursive(
+                    node.children[child_dist], word, max_dist, results
+                )
+
+
+class SymSpellIndex(FuzzyIndex):
+    """
+    Индекс нечеткого поиска по окрестностям удалений (SymSpell).
+
+    Для каждого слова заранее сохраняются все варианты его префикса с
+    удалением до `max_distance` символов. Кандидаты на запрос находятся
+    пересечением вариантов запроса со словарем, а точное расстояние
+    Дамерау-Левенштейна считается только для них.
+    """
+
+    def __init__(self, max_distance: int = 2, prefix_length: int = 7):
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self._words: list[tuple[str, int]] = []
+        self._deletes: dict[str, list[int]] = {}
+
+    def _variants(self, word: str, max_dist: int) -> set[str]:
+        prefix = word[: self.prefix_length]
+        variants = {prefix}
+        for count in range(1, min(max_dist, len(prefix)) + 1):
+            for positions in combinations(range(len(prefix)), count):
+                variants.add(
+                    "".join(
+                        char
+                        for i, char in enumerate(prefix)
+                        if i not in positions
+                    )
+                )
+        return variants
+
+    def add(self, word: str, drug_id: int):
+        """Add a word with its drug ID to the index."""
+        if not word:
+            return
+        word = word.lower()
+        index = len(self._words)
+        self._words.append((word, drug_id))
+        for variant in self._variants(word, self.max_distance):
+            self._deletes.setdefault(variant, []).append(index)
+
+    def search(self, word: str, max_dist: int) -> list[tuple[str, int, int]]:
+        """Search for words within max_dist, returning (word, drug_id, dist)."""
+        if max_dist > self.max_distance:
+            raise ValueError(
+                f"max_dist {max_dist} exceeds index max_distance "
+                f"{self.max_distance}"
+            )
+        word = word.lower()
+        candidates = set()
+        for variant in self._variants(word, max_dist):
+            candidates.update(self._deletes.get(variant, ()))
+        results = []
+        for index in candidates:
+            candidate, drug_id = self._words[index]
+            dist = DamerauLevenshtein.distance(
+                word, candidate, score_cutoff=max_dist
+            )
+            if dist <= max_dist:
+                results.append((candidate, drug_id, dist))
+        return results
+
+
+class BucketedTermIndex(FuzzyIndex):
+    """
+    Индекс нечеткого поиска с пакетным подсчетом расстояний в rapidfuzz.
+
+    Наименования разложены по корзинам по первой букве. Запросы одной
+    корзины сравниваются со всеми ее наименованиями одним вызовом
+    `rapidfuzz.process.cdist` с отсечкой по расстоянию. Как и фильтр в
+    сервисе, индекс возвращает только наименования с той же первой буквой.
+    """
+
+    chunk_size = 256
+
+    def __init__(self):
+        self._buckets: dict[str, tuple[list[str], list[int]]] = {}
+
+    def add(self, word: str, drug_id: int):
+        """Add a word with its drug ID to the index."""
+        if not word:
+            return
+        word = word.lower()
+        terms, drug_ids = self._buckets.setdefault(word[0], ([], []))
+        terms.append(word)
+        drug_ids.append(drug_id)
+
+    def search(self, word: str, max_dist: int) -> list[tuple[str, int, int]]:
+        """Search for words within max_dist, returning (word, drug_id, dist)."""
+        return self.search_many([word], max_dist).get(word, [])
+
+    def search_many(
+        self, words: Iterable[str], max_dist: int
+    ) -> dict[str, list[tuple[str, int, int]]]:
+        results = {}
+        by_first_char: dict[str, list[str]] = {}
+        for word in set(words):
+            results[word] = []
+            if word:
+                by_first_char.setdefault(word[0].lower(), []).append(word)
+
+        for first_char, queries in by_first_char.items():
+            if first_char not in self._buckets:
+                continue
+            terms, drug_ids = self._buckets[first_char]
+            for offset in range(0, len(queries), self.chunk_size):
+                chunk = queries[offset : offset + self.chunk_size]
+                distances = process.cdist(
+                    [query.lower() for query in chunk],
+                    terms,
+                    scorer=DamerauLevenshtein.distance,
+                    score_cutoff=max_dist,
+                    dtype=np.uint8,
+                )
+                for query_i, term_i in zip(
+                    *np.nonzero(distances <= max_dist)
+                ):
+                    results[chunk[query_i]].append(
+                        (
+                            terms[term_i],
+                            drug_ids[term_i],
+                            int(distances[query_i, term_i]),
+                        )
+                    )
+        return results
+
+
+def _distance(s1: str, s2: str) -> int:
+    # Функция модуля, а не lambda: индекс передается в процессы пула.
+    return int(DamerauLevenshtein.distance(s1.lower(), s2.lower()))
+
+
+def _add_drugs(index: FuzzyIndex, drugs) -> FuzzyIndex:
+    for drug in drugs:
+        if drug.trade_name and len(drug.trade_name) > 3:
+            index.add(drug.trade_name.lower(), drug.id)
+        if drug.inn and len(drug.inn) > 3:
+            index.add(drug.inn.lower(), drug.id)
+    return index
+
+
+def build_bk_tree(drugs) -> BKTree:
+    """
+    Строит BK-дерево по наименованиям лекарств из справочника.
+
+    В дерево попадают торговые наименования и МНН длиннее трех символов.
+
+    Args:
+        drugs: Строки справочника с `id`, `trade_name` и `inn`.
+
+    Returns:
+        Заполненное BK-дерево.
+    """
+    bk_tree = BKTree(_distance)
+    return _add_drugs(bk_tree, drugs)
+
+
+def build_symspell_index(drugs) -> SymSpellIndex:
+    """
+    Строит индекс удалений по наименованиям лекарств из справочника.
+
+    Args:
+        drugs: Строки справочника с `id`, `trade_name` и `inn`.
+
+    Returns:
+        Заполненный индекс SymSpell.
+    """
+    index = SymSpellIndex(
+        settings.fuzzy.max_distance, settings.fuzzy.prefix_length
+    )
+    return _add_drugs(index, drugs)
+
+
+def build_bucketed_index(drugs) -> BucketedTermIndex:
+    """
+    Строит индекс с корзинами по первой букве для пакетного поиска.
+
+    Args:
+        drugs: Строки справочника с `id`, `trade_name` и `inn`.
+
+    Returns:
+        Заполненный индекс.
+    """
+    return _add_drugs(BucketedTermIndex(), drugs)
+
+
+def build_fuzzy_index(drugs) -> FuzzyIndex:
+    """
+    Строит индекс нечеткого поиска выбранного в настройках типа.
+
+    Args:
+        drugs: Строки справочника с `id`, `trade_name` и `inn`.
+
+    Returns:
+        Индекс rapidfuzz, BK-дерево или индекс SymSpell.
+    """
+    if settings.fuzzy.index == "symspell":
+        return build_symspell_index(drugs)
+    if settings.fuzzy.index == "bktree":
+        return build_bk_tree(drugs)
+    return build_bucketed_index(drugs)
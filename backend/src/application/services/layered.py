@@ -0,0 +1,184 @@
+import heapq
+from collections.abc import Iterable, Iterator
+from typing import Any
+
+import ahocorasick
+import sqlalchemy as sa
+
+from src.application.services.aho import (
+    AhoCorasickService,
+    max_phrase_tokens,
+)
+from src.application.services.fuzzy import FuzzyIndex, build_fuzzy_index
+
+
+class LayeredAutomaton:
+    """
+    Автомат из двух уровней: большой неизменяемый `base` и малый `delta`.
+
+    Изменения справочника не трогают базовый автомат: добавленные и
+    измененные лекарства попадают в `delta`, который пересобирается целиком
+    (он мал), а их `id` и `id` удаленных лекарств - в `tombstones`, по
+    которым отбрасываются совпадения базового уровня. При поиске совпадения
+    обоих уровней сливаются по позиции конца. Экземпляр неизменяем: каждое
+    изменение создает новый, поэтому запросы дорабатывают на своем снимке.
+    Когда `delta_size` растет, уровни сводятся в новый базовый автомат
+    (см. `CatalogUpdateQueue`).
+
+    Attributes:
+        base: Базовый автомат (`ahocorasick.Automaton` или
+            `MappedAutomaton`).
+        delta_drugs: Лекарства уровня `delta` по `id`.
+        tombstones: `id` лекарств, скрытых на базовом уровне.
+        base_version: Версия журнала изменений, по которую собран базовый
+            автомат; более поздние изменения лежат в `delta`.
+        base_tokens: Длина самого длинного наименования базового уровня в
+            токенах; считается один раз на базовый автомат и передается
+            следующим снимкам.
+        phrase_tokens: То же для обоих уровней (см. `max_phrase_tokens`).
+    """
+
+    def __init__(
+        self,
+        base: Any,
+        delta_drugs: dict[Any, sa.Row] | None = None,
+        tombstones: frozenset = frozenset(),
+        base_version: int = 0,
+        base_tokens: int | None = None,
+    ) -> None:
+        self.base = base
+        self.base_version = base_version
+        self.base_tokens = (
+            max_phrase_tokens(base) if base_tokens is None else base_tokens
+        )
+        self.delta_drugs = dict(delta_drugs or {})
+        self.tombstones = frozenset(tombstones)
+        self.delta = ahocorasick.Automaton()
+        for drug in self.delta_drugs.values():
+            AhoCorasickService.add_drug(self.delta, drug)
+        self.phrase_tokens = self.base_tokens
+        if self.delta_drugs:
+            self.delta.make_automaton()
+            self.phrase_tokens = max(
+                self.phrase_tokens, max_phrase_tokens(self.delta)
+            )
+
+    @property
+    def layers(self) -> tuple:
+        return (self.base, self.delta)
+
+    @property
+    def delta_size(self) -> int:
+        return len(self.delta_drugs) + len(self.tombstones)
+
+    def with_changes(
+        self, changes: dict[Any, sa.Row | None]
+    ) -> "LayeredAutomaton":
+        """
+        Возвращает новый снимок с примененными изменениями.
+
+        Args:
+            changes: Новая строка лекарства по `id` или None для удаленных.
+        """
+        delta_drugs = dict(self.delta_drugs)
+        for drug_id, drug in changes.items():
+            if drug is None:
+                delta_drugs.pop(drug_id, None)
+            else:
+                delta_drugs[drug_id] = drug
+        return LayeredAutomaton(
+            self.base,
+            delta_drugs,
+            self.tombstones | changes.keys(),
+            self.base_version,
+            self.base_tokens,
+        )
+
+    def iter(self, text: str) -> Iterator[tuple[int, tuple]]:
+        if not self.delta_drugs and not self.tombstones:
+            return self.base.iter(text)
+        base_hits = (
+            (end, value)
+            for end, value in self.base.iter(text)
+            if value[1] not in self.tombstones
+        )
+        if not self.delta_drugs:
+            return base_hits
+        return heapq.merge(
+            base_hits, self.delta.iter(text), key=lambda hit: hit[0]
+        )
+
+    def values(self) -> Iterator[tuple]:
+        for value in self.base.values():
+            if value[1] not in self.tombstones:
+                yield value
+        yield from self.delta.values()
+
+
+class LayeredFuzzyIndex(FuzzyIndex):
+    """
+    Индекс нечеткого поиска из двух уровней, как `LayeredAutomaton`.
+
+    Базовый индекс не меняется: наименования добавленных и измененных
+    лекарств попадают в малый индекс `delta`, а кандидаты базового уровня с
+    `id` из `tombstones` отбрасываются. Экземпляр неизменяем.
+
+    Attributes:
+        base: Индекс по справочнику на момент сборки базового автомата.
+        delta_drugs: Лекарства уровня `delta` по `id`.
+        tombstones: `id` лекарств, скрытых на базовом уровне.
+    """
+
+    def __init__(
+        self,
+        base: FuzzyIndex,
+        delta_drugs: dict[Any, sa.Row] | None = None,
+        tombstones: frozenset = frozenset(),
+    ) -> None:
+        self.base = base
+        self.delta_drugs = dict(delta_drugs or {})
+        self.tombstones = frozenset(tombstones)
+        self.delta = build_fuzzy_index(self.delta_drugs.values())
+
+    def with_changes(
+        self, changes: dict[Any, sa.Row | None]
+    ) -> "LayeredFuzzyIndex":
+        """
+        Возвращает новый индекс с примененными изменениями.
+
+        Args:
+            changes: Новая строка лекарства по `id` или None для удаленных.
+        """
+        delta_drugs = dict(self.delta_drugs)
+        for drug_id, drug in changes.items():
+            if drug is None:
+                delta_drugs.pop(drug_id, None)
+            else:
+                delta_drugs[drug_id] = drug
+        return LayeredFuzzyIndex(
+            self.base, delta_drugs, self.tombstones | changes.keys()
+        )
+
+    def search(self, word: str, max_dist: int) -> list[tuple[str, int, int]]:
+        return self.search_many([word], max_dist)[word]
+
+    def search_many(
+        self, words: Iterable[str], max_dist: int
+    ) -> dict[str, list[tuple[str, int, int]]]:
+        words = set(words)
+        results = self.base.search_many(words, max_dist)
+        if self.tombstones:
+            results = {
+                word: [
+                    candidate
+                    for candidate in candidates
+                    if candidate[1] not in self.tombstones
+                ]
+                for word, candidates in results.items()
+            }
+        if self.delta_drugs:
+            for word, candidates in self.delta.search_many(
+                words, max_dist
+            ).items():
+                results[word].extend(candidates)
+        return results
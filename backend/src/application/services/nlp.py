@@ -1,14 +1,114 @@
 from functools import lru_cache
 
+import pymorphy3
 import spacy
+from spacy.language import Language
+from spacy.tokens import Doc
 
-nlp = spacy.load("ru_core_news_sm")
+from src.settings import settings
 
 
-@lru_cache(maxsize=10000)
-def lemmatize(word):
-    try:
-        doc = nlp(word)
-        return doc[0].lemma_
-    except Exception:
-        return word
+class SpacyLemmatizer:
+    """
+    Лемматизатор на пайплайне spaCy.
+
+    Загружает модель без неиспользуемых компонентов (синтаксический парсер,
+    NER): для лемм нужны только токенизатор, морфология и лемматизатор.
+    """
+
+    name = "spacy"
+
+    def __init__(
+        self, model: str, exclude: list[str], cache_size: int
+    ) -> None:
+        self.nlp: Language = spacy.load(model, exclude=exclude)
+        self.lemmatize = lru_cache(maxsize=cache_size)(self._lemmatize)
+
+    def _lemmatize(self, word: str) -> str:
+        try:
+            doc = self.nlp(word)
+            return doc[0].lemma_
+        except Exception:
+            return word
+
+    def lemmatize_doc(self, doc: Doc) -> list[str]:
+        return [(token.lemma_ or token.text).lower() for token in doc]
+
+
+class Pymorphy3Lemmatizer:
+    """
+    Словарный лемматизатор на pymorphy3.
+
+    Текст разбивается только токенизатором spaCy, а лемма каждого слова
+    берется из словаря pymorphy3 без запуска нейросетевых компонентов.
+    """
+
+    name = "pymorphy3"
+
+    def __init__(self, cache_size: int) -> None:
+        self.nlp: Language = spacy.blank("ru")
+        self._morph = pymorphy3.MorphAnalyzer()
+        self.lemmatize = lru_cache(maxsize=cache_size)(self._lemmatize)
+
+    def _lemmatize(self, word: str) -> str:
+        if not word.isalpha():
+            return word
+        return self._morph.parse(word)[0].normal_form
+
+    def lemmatize_doc(self, doc: Doc) -> list[str]:
+        return [self.lemmatize(token.text.lower()) for token in doc]
+
+
+def create_lemmatizer(
+    backend: str | None = None,
+) -> SpacyLemmatizer | Pymorphy3Lemmatizer:
+    """
+    Создает лемматизатор по имени бэкенда.
+
+    Args:
+        backend: `spacy` или `pymorphy3`. По умолчанию берется из настроек.
+
+    Returns:
+        Экземпляр лемматизатора.
+    """
+    backend = backend or settings.nlp.lemmatizer
+    if backend == "pymorphy3":
+        return Pymorphy3Lemmatizer(settings.nlp.cache_size)
+    if backend == "spacy":
+        return SpacyLemmatizer(
+            settings.nlp.spacy_model,
+            settings.nlp.spacy_exclude,
+            settings.nlp.cache_size,
+        )
+    raise ValueError(f"Unknown lemmatizer backend: {backend}")
+
+
+lemmatizer = create_lemmatizer()
+nlp = lemmatizer.nlp
+
+
+def lemmatize(word: str) -> str:
+    """
+    Лемматизирует отдельное слово выбранным в настройках бэкендом.
+
+    Предназначена для наименований из справочника лекарств, у которых нет
+    разобранного документа. Для текста запроса используйте `lemmatize_doc`.
+    """
+    return lemmatizer.lemmatize(word)
+
+
+def lemmatize_doc(doc: Doc) -> list[str]:
+    """
+    Возвращает леммы всех токенов уже разобранного документа.
+
+    Для spaCy леммы берутся из `token.lemma_`, проставленного пайплайном при
+    разборе документа, без повторного запуска spaCy на каждое слово. Если
+    лемма не определена, используется текст токена.
+
+    Args:
+        doc: Разобранный spaCy документ.
+
+    Returns:
+        Список лемм в нижнем регистре, по одной на токен.
+    """
+    return lemmatizer.lemmatize_doc(doc)
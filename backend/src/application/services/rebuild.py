@@ -0,0 +1,145 @@
+import asyncio
+import logging
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Literal
+
+from starlette.datastructures import State
+
+from src.application.services.aho import AhoCorasickService
+from src.application.services.automaton import (
+    load_automaton,
+    publish_artifact,
+    save_automaton,
+)
+from src.application.services.catalog import load_catalog
+from src.infrastructure.repositories.catalog_changes import CatalogChangesRepo
+from src.infrastructure.session import async_session_factory
+from src.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class RebuildInProgressError(Exception):
+    """Перестроение автомата уже выполняется."""
+
+
+@dataclass
+class RebuildStatus:
+    """
+    Состояние фонового перестроения автомата.
+
+    Attributes:
+        state: `idle`, `running`, `succeeded` или `failed`.
+        stage: Текущий этап: `loading`, `building`, `saving`, `swapping`.
+        processed: Сколько лекарств уже добавлено в новый автомат.
+        total: Сколько лекарств в справочнике.
+        started_at: Время запуска (unix time).
+        finished_at: Время завершения (unix time).
+        error: Текст ошибки, если перестроение не удалось.
+    """
+
+    state: Literal["idle", "running", "succeeded", "failed"] = "idle"
+    stage: str | None = None
+    processed: int = 0
+    total: int = 0
+    started_at: float | None = None
+    finished_at: float | None = None
+    error: str | None = None
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+class AutomatonRebuilder:
+    """
+    Фоновое перестроение автомата Ахо-Корасик.
+
+    Справочник читается в собственной сессии вместе с версией журнала
+    изменений, автомат строится и сохраняется в потоке, после чего
+    подменяется через `CatalogUpdateQueue.reload`: изменения, сделанные за
+    время сборки, ложатся в малый уровень нового автомата. Запросы, начатые
+    до подмены, дорабатывают на старом автомате. Одновременно выполняется
+    не больше одного перестроения в процессе; запись `artifact` с версией
+    журнала сообщает о новом артефакте остальным воркерам.
+    """
+
+    def __init__(self, state: State) -> None:
+        self._state = state
+        self._task: asyncio.Task | None = None
+        self.status = RebuildStatus()
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> RebuildStatus:
+        """
+        Запускает перестроение в фоне.
+
+        Raises:
+            RebuildInProgressError: Перестроение уже выполняется.
+        """
+        if self.running:
+            raise RebuildInProgressError
+        self.status = RebuildStatus(state="running", started_at=time.time())
+        self._task = asyncio.create_task(self._run(self.status))
+        return self.status
+
+    async def _run(self, status: RebuildStatus) -> None:
+        try:
+            status.stage = "loading"
+            async with async_session_factory() as session:
+                snapshot = await load_catalog(session)
+            drugs = list(snapshot.catalog.drugs.values())
+            journal_version = snapshot.catalog.journal_version
+            status.total = len(drugs)
+
+            status.stage = "building"
+            automaton = await asyncio.to_thread(
+                AhoCorasickService.build_automaton,
+                drugs,
+                lambda processed: setattr(status, "processed", processed),
+            )
+
+            status.stage = "saving"
+            automaton = await asyncio.to_thread(
+                save_and_load, automaton, journal_version
+            )
+
+            status.stage = "swapping"
+            await self._state.catalog_updates.reload(
+                automaton, journal_version
+            )
+            # Остальные воркеры перезагрузят артефакт по уведомлению.
+            async with async_session_factory() as session:
+                await CatalogChangesRepo(session).record_artifact(
+                    journal_version
+                )
+            status.state = "succeeded"
+        except Exception as e:
+            logger.exception(e)
+            status.state = "failed"
+            status.error = str(e)
+        finally:
+            status.finished_at = time.time()
+
+    async def shutdown(self) -> None:
+        """Прерывает текущее перестроение при остановке приложения."""
+        if self.running:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+
+def save_and_load(automaton: Any, journal_version: int) -> Any:
+    """
+    Сохраняет автомат в формате из настроек и загружает его обратно.
+
+    Args:
+        automaton: Новый автомат.
+        journal_version: Версия журнала изменений, по которую он собран.
+    """
+    if settings.matcher.automaton_format == "mapped":
+        return publish_artifact(automaton, journal_version)
+    save_automaton(automaton)
+    return load_automaton()
@@ -0,0 +1,259 @@
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+
+import orjson
+
+from src.application.services.fragments import to_jsonable
+from src.settings import settings
+
+_SHARED_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    expires REAL NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed);
+CREATE TABLE IF NOT EXISTS usage (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    bytes INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO usage VALUES (1, 0);
+"""
+_EVICTION_BATCH = 256
+
+
+def result_key(text: str, fuzzy: bool, output: str, version: str) -> str:
+    """
+    Ключ результата поиска по содержимому текста.
+
+    Отпечаток справочника входит в ключ, поэтому после перестроения автомата
+    или изменения справочника старые записи больше не находятся, а воркеры с
+    одинаковым справочником получают одинаковые ключи.
+    """
+    digest = hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+    return f"{digest}:{int(fuzzy)}:{output}:{version}"
+
+
+class ResultCache:
+    """
+    LRU-кэш результатов поиска лекарств в памяти процесса.
+
+    Ограничен числом записей и суммарным размером результатов в
+    сериализованном виде. Записи живут не дольше `ttl_seconds`. Если задан
+    общий кэш `shared`, промахи проверяются в нем, а новые результаты
+    записываются в оба уровня (`fetch`/`store`).
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        max_bytes: int,
+        ttl_seconds: float,
+        shared: "SharedResultStore | None" = None,
+    ) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.shared = shared
+        self._entries: OrderedDict[str, tuple[float, int, Any]] = (
+            OrderedDict()
+        )
+        self._bytes = 0
+        self._labels = {"service": settings.app.name}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Any | None:
+        """Возвращает результат по ключу или None."""
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] <= time.monotonic():
+            self._remove(key)
+            entry = None
+        if entry is None:
+            settings.metrics.result_cache_misses.inc(self._labels)
+            return None
+        self._entries.move_to_end(key)
+        settings.metrics.result_cache_hits.inc(self._labels)
+        return entry[2]
+
+    def put(self, key: str, value: Any, size: int | None = None) -> None:
+        """
+        Сохраняет результат, вытесняя давно не использованные записи.
+
+        Args:
+            key: Ключ из `result_key`.
+            value: Результат поиска, не изменяется после сохранения.
+            size: Размер результата в байтах; по умолчанию - длина JSON.
+        """
+        if size is None:
+            size = len(orjson.dumps(value, default=to_jsonable))
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, size, value)
+        self._bytes += size
+        while (
+            len(self._entries) > self.max_entries
+            or self._bytes > self.max_bytes
+        ):
+            _, (_, evicted_size, _) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+            settings.metrics.result_cache_evictions.inc(self._labels)
+
+    async def fetch(self, key: str) -> Any | None:
+        """Ищет результат в памяти процесса, затем в общем кэше."""
+        value = self.get(key)
+        if value is None and self.shared is not None:
+            value = await asyncio.to_thread(self.shared.get, key)
+            if value is not None:
+                self.put(key, value)
+        return value
+
+    async def store(self, key: str, value: Any) -> None:
+        """Сохраняет результат в памяти процесса и в общем кэше."""
+        data = orjson.dumps(value, default=to_jsonable)
+        self.put(key, value, len(data))
+        if self.shared is not None:
+            await asyncio.to_thread(self.shared.put, key, data)
+
+    def clear(self) -> None:
+        """Очищает кэш процесса."""
+        self._entries.clear()
+        self._bytes = 0
+
+    def invalidate(self) -> None:
+        """
+        Очищает кэш процесса и общий кэш.
+
+        Нужен, когда меняются данные, не входящие в отпечаток справочника,
+        например правила подачи.
+        """
+        self.clear()
+        if self.shared is not None:
+            self.shared.clear()
+
+    def _remove(self, key: str) -> None:
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+
+class SharedResultStore:
+    """
+    Общий для процессов одного хоста кэш результатов в SQLite (режим WAL).
+
+    Все воркеры gunicorn открывают один файл и видят результаты друг друга,
+    внешний сервис не нужен. Суммарный размер записей ограничен
+    `max_bytes`: при превышении удаляются просроченные, затем давно не
+    читанные записи.
+    """
+
+    def __init__(self, path: str, max_bytes: int, ttl_seconds: float) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._local = threading.local()
+        self._labels = {"service": settings.app.name}
+        self._connection().executescript(_SHARED_SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        # Соединение SQLite нельзя разделять между потоками пула.
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=1.0)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def get(self, key: str) -> Any | None:
+        """Возвращает результат по ключу или None."""
+        now = time.time()
+        with self._connection() as connection:
+            row = connection.execute(
+                "SELECT value FROM results WHERE key = ? AND expires > ?",
+                (key, now),
+            ).fetchone()
+            if row is not None:
+                connection.execute(
+                    "UPDATE results SET accessed = ? WHERE key = ?",
+                    (now, key),
+                )
+        if row is None:
+            settings.metrics.shared_cache_misses.inc(self._labels)
+            return None
+        settings.metrics.shared_cache_hits.inc(self._labels)
+        return orjson.loads(row[0])
+
+    def put(self, key: str, data: bytes) -> None:
+        """
+        Сохраняет результат, уже сериализованный в JSON.
+
+        Занятый объем хранится в отдельной строке `usage` и меняется в той же
+        транзакции, что и запись, чтобы не считать сумму по всей таблице.
+        """
+        if len(data) > self.max_bytes:
+            return
+        now = time.time()
+        with self._connection() as connection:
+            row = connection.execute(
+                "SELECT size FROM results WHERE key = ?", (key,)
+            ).fetchone()
+            connection.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)",
+                (key, data, len(data), now + self.ttl_seconds, now),
+            )
+            connection.execute(
+                "UPDATE usage SET bytes = bytes + ? WHERE id = 1",
+                (len(data) - (row[0] if row else 0),),
+            )
+            self._evict(connection, now)
+
+    def _evict(self, connection: sqlite3.Connection, now: float) -> None:
+        (total,) = connection.execute(
+            "SELECT bytes FROM usage WHERE id = 1"
+        ).fetchone()
+        if total <= self.max_bytes:
+            return
+        (expired,) = connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM results WHERE expires <= ?",
+            (now,),
+        ).fetchone()
+        connection.execute("DELETE FROM results WHERE expires <= ?", (now,))
+        total -= expired
+        evicted = 0
+        while total > self.max_bytes:
+            rows = connection.execute(
+                "SELECT key, size FROM results ORDER BY accessed LIMIT ?",
+                (_EVICTION_BATCH,),
+            ).fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                if total <= self.max_bytes:
+                    break
+                connection.execute(
+                    "DELETE FROM results WHERE key = ?", (key,)
+                )
+                total -= size
+                evicted += 1
+        connection.execute(
+            "UPDATE usage SET bytes = ? WHERE id = 1", (total,)
+        )
+        if evicted:
+            settings.metrics.shared_cache_evictions.add(
+                self._labels, evicted
+            )
+
+    def clear(self) -> None:
+        with self._connection() as connection:
+            connection.execute("DELETE FROM results")
+            connection.execute("UPDATE usage SET bytes = 0 WHERE id = 1")
@@ -0,0 +1,181 @@
+import asyncio
+import logging
+from collections import defaultdict
+from collections.abc import Iterable
+from datetime import datetime, timedelta
+
+import sqlalchemy as sa
+
+from src.infrastructure.repositories.drugs import DrugsRepo, is_valid
+from src.infrastructure.session import async_session_factory
+
+logger = logging.getLogger(__name__)
+
+_RESOLUTION = timedelta(microseconds=1)
+
+
+def next_boundary(rows: Iterable[sa.Row], now: datetime) -> datetime | None:
+    """
+    Ближайший после `now` момент, когда меняется набор действующих правил.
+
+    Правило начинает действовать в `valid_start_date` и перестает сразу
+    после `valid_end_date`.
+    """
+    boundaries = []
+    for row in rows:
+        start, end = row.valid_start_date, row.valid_end_date
+        if start is not None and start > now:
+            boundaries.append(start)
+        if end is not None and end >= now:
+            boundaries.append(end + _RESOLUTION)
+    return min(boundaries, default=None)
+
+
+class DrugInfoIndex:
+    """Строки сведений о лекарствах по `id` и по наименованиям."""
+
+    def __init__(self, rows: Iterable[sa.Row] = ()) -> None:
+        by_id = defaultdict(list)
+        by_name = defaultdict(list)
+        for row in rows:
+            by_id[row.drug_id].append(row)
+            for name in {row.trade_name, row.inn}:
+                if name is not None:
+                    by_name[name].append(row)
+        self._by_id = dict(by_id)
+        self._by_name = dict(by_name)
+
+    def select(self, drug_ids: Iterable, words: Iterable[str]) -> list:
+        """Строки с `id` из `drug_ids` или `trade_name`/`inn` из `words`."""
+        selected = {}
+        for drug_id in drug_ids:
+            for row in self._by_id.get(drug_id, ()):
+                selected[id(row)] = row
+        for word in words:
+            for row in self._by_name.get(word, ()):
+                selected[id(row)] = row
+        return list(selected.values())
+
+
+class RuleCache:
+    """
+    Сведения о лекарствах и правилах подачи в памяти процесса.
+
+    Заменяет `DrugsRepo.get_drug_info`: все строки лекарств с правилами
+    читаются из БД один раз, срок действия правил проверяется в памяти.
+    Действующие строки индексируются по `id`, `trade_name` и `inn` и
+    пересчитываются без обращения к БД при наступлении ближайшей границы
+    срока действия какого-либо правила. После изменения лекарств или их
+    правил перечитываются только строки этих лекарств (`refresh`). Когда
+    затронутые лекарства неизвестны, все строки перечитываются в фоне
+    (`reload`), а до подмены запросы обслуживаются прежними. Чтения из БД
+    выполняются по одному, индекс строится вне цикла событий и подменяется
+    целиком.
+    """
+
+    def __init__(self) -> None:
+        self._rows: list[sa.Row] | None = None
+        self._index = DrugInfoIndex()
+        self._expires_at: datetime | None = None
+        self._generation = 0
+        self._lock = asyncio.Lock()
+        self._reload: asyncio.Task | None = None
+
+    def reload(self) -> None:
+        """Запускает фоновое перечитывание всех строк."""
+        self._generation += 1
+        if self._rows is None:
+            # Еще не загружен: первый запрос прочитает актуальные строки.
+            return
+        if self._reload is None or self._reload.done():
+            self._reload = asyncio.create_task(self._reload_all())
+
+    async def refresh(self, drug_ids: Iterable) -> None:
+        """
+        Перечитывает строки указанных лекарств, не трогая остальные.
+
+        Args:
+            drug_ids: Идентификаторы измененных или удаленных лекарств.
+        """
+        drug_ids = set(drug_ids)
+        if self._rows is None or not drug_ids:
+            return
+        async with self._lock:
+            async with async_session_factory() as session:
+                rows = await DrugsRepo(session).get_all_drug_info(
+                    list(drug_ids)
+                )
+            await asyncio.to_thread(self._patch, drug_ids, rows)
+
+    async def stop(self) -> None:
+        """Прерывает фоновое перечитывание при остановке приложения."""
+        if self._reload is not None:
+            self._reload.cancel()
+            await asyncio.gather(self._reload, return_exceptions=True)
+
+    async def get_drug_info(
+        self, drug_ids: Iterable, words: Iterable[str]
+    ) -> list[sa.Row]:
+        """
+        Строки лекарств с действующими правилами, как у `get_drug_info`.
+
+        Args:
+            drug_ids: Идентификаторы лекарств.
+            words: Наименования лекарств (`trade_name` или `inn`).
+        """
+        drug_ids, words = list(drug_ids), list(words)
+        if not drug_ids and not words:
+            return []
+        if self._rows is None:
+            await self._load()
+        now = datetime.now()
+        expired = self._expires_at is not None and now >= self._expires_at
+        if expired and self._rows is not None:
+            self._reindex(now)
+        return self._index.select(drug_ids, words)
+
+    async def _load(self) -> None:
+        async with self._lock:
+            if self._rows is not None:
+                return
+            generation = self._generation
+            rows = await self._read_all()
+            await asyncio.to_thread(self._replace, rows)
+        if generation != self._generation:
+            # Правила изменились во время чтения: перечитываем в фоне.
+            self.reload()
+
+    async def _reload_all(self) -> None:
+        generation = None
+        while generation != self._generation:
+            generation = self._generation
+            try:
+                async with self._lock:
+                    rows = await self._read_all()
+                    await asyncio.to_thread(self._replace, rows)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.exception(e)
+                return
+
+    async def _read_all(self) -> list[sa.Row]:
+        async with async_session_factory() as session:
+            return await DrugsRepo(session).get_all_drug_info()
+
+    def _replace(self, rows: list[sa.Row]) -> None:
+        now = datetime.now()
+        index = DrugInfoIndex(row for row in rows if is_valid(row, now))
+        self._rows, self._index = rows, index
+        self._expires_at = next_boundary(rows, now)
+
+    def _patch(self, drug_ids: set, rows: list[sa.Row]) -> None:
+        self._replace(
+            [row for row in self._rows if row.drug_id not in drug_ids] + rows
+        )
+
+    def _reindex(self, now: datetime) -> None:
+        self._index = DrugInfoIndex(
+            row for row in self._rows if is_valid(row, now)
+        )
+        self._expires_at = next_boundary(self._rows, now)
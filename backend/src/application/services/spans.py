@@ -0,0 +1,77 @@
+from bisect import bisect_right
+from collections.abc import Callable, Iterable, Iterator
+from typing import Generic, TypeVar
+
+T = TypeVar("T")
+
+
+class SpanIndex(Generic[T]):
+    """
+    Набор непересекающихся полуоткрытых отрезков текста `[start, end)`.
+
+    Отрезки хранятся отсортированными по началу, поэтому проверка
+    пересечения сводится к двоичному поиску и сравнению с двумя соседями.
+    """
+
+    def __init__(self) -> None:
+        self._starts: list[int] = []
+        self._ends: list[int] = []
+        self._items: list[T] = []
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __iter__(self) -> Iterator[T]:
+        """Элементы в порядке начала отрезков."""
+        return iter(self._items)
+
+    def overlaps(self, start: int, end: int) -> bool:
+        """Пересекается ли `[start, end)` с одним из принятых отрезков."""
+        i = bisect_right(self._starts, start) - 1
+        if i >= 0 and self._ends[i] > start:
+            return True
+        return i + 1 < len(self._starts) and self._starts[i + 1] < end
+
+    def add(self, start: int, end: int, item: T) -> bool:
+        """
+        Добавляет отрезок, если он не пересекается с уже принятыми.
+
+        Returns:
+            True, если отрезок принят.
+        """
+        if self.overlaps(start, end):
+            return False
+        i = bisect_right(self._starts, start)
+        self._starts.insert(i, start)
+        self._ends.insert(i, end)
+        self._items.insert(i, item)
+        return True
+
+
+def resolve_spans(
+    candidates: Iterable[T],
+    bounds: Callable[[T], tuple[int, int]],
+    priority: Callable[[T], tuple],
+    spans: SpanIndex[T] | None = None,
+) -> SpanIndex[T]:
+    """
+    Жадно выбирает непересекающиеся отрезки в порядке приоритета.
+
+    Кандидаты сортируются один раз, каждый проверяется двоичным поиском
+    по уже принятым отрезкам.
+
+    Args:
+        candidates: Кандидаты на совпадение.
+        bounds: Возвращает `(start, end)` кандидата.
+        priority: Ключ сортировки, меньшее значение важнее.
+        spans: Уже принятые отрезки, которые нельзя перекрывать.
+
+    Returns:
+        Принятые отрезки.
+    """
+    if spans is None:
+        spans = SpanIndex()
+    for candidate in sorted(candidates, key=priority):
+        start, end = bounds(candidate)
+        spans.add(start, end, candidate)
+    return spans
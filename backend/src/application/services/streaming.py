@@ -0,0 +1,88 @@
+import codecs
+import re
+from collections.abc import AsyncIterator
+
+_PARAGRAPH_END = re.compile(r"\n\s*\n")
+_LINE_END = re.compile(r"\n")
+_SENTENCE_END = re.compile(r"[.!?…]\s")
+_WHITESPACE = re.compile(r"\s")
+_WORD = re.compile(r"\S+")
+
+
+def _find_cut(buffer: str, min_position: int) -> tuple[int, bool] | None:
+    """
+    Находит позицию разреза буфера по самой крупной доступной границе.
+
+    Предпочтение отдается концу абзаца, затем концу строки, концу
+    предложения и, в крайнем случае, любому пробельному символу. Разрез не
+    делается раньше `min_position`, чтобы сегменты не дробились.
+
+    Returns:
+        Позиция разреза и признак того, что он сделан по пробелу внутри
+        предложения, или None, если границы нет.
+    """
+    for pattern in (_PARAGRAPH_END, _LINE_END, _SENTENCE_END, _WHITESPACE):
+        cut = None
+        for match in pattern.finditer(buffer, min_position):
+            cut = match.end()
+        if cut is not None:
+            return cut, pattern is _WHITESPACE
+    return None
+
+
+def _overlap_start(buffer: str, cut: int, words: int) -> int:
+    """Начало `words` последних слов перед `cut`, не раньше `cut // 2`."""
+    starts = [match.start() for match in _WORD.finditer(buffer, 0, cut)]
+    if not starts or words <= 0:
+        return cut
+    return max(starts[-min(words, len(starts))], cut // 2)
+
+
+async def iter_segments(
+    chunks: AsyncIterator[bytes],
+    max_chars: int,
+    encoding: str = "utf-8",
+    overlap_words: int = 0,
+) -> AsyncIterator[tuple[int, str, int]]:
+    """
+    Делит поток байтов на текстовые сегменты по границам абзацев и предложений.
+
+    В памяти держится не больше одного сегмента и непрочитанного хвоста.
+    Если в буфере длиной `max_chars` нет ни одной границы, сегмент
+    отрезается по длине. Если граница нашлась только между словами
+    предложения, следующий сегмент начинается на `overlap_words` слов
+    раньше разреза: наименование из нескольких слов, попавшее на разрез,
+    целиком находится в следующем сегменте.
+
+    Args:
+        chunks: Асинхронный поток байтов документа.
+        max_chars: Максимальная длина сегмента в символах.
+        encoding: Кодировка документа.
+        overlap_words: Длина перекрытия в словах, обычно
+            `max_phrase_tokens` автомата.
+
+    Yields:
+        Тройки (смещение сегмента в документе в символах, текст сегмента,
+        длина его собственной части). Собственная часть кончается там, где
+        начинается следующий сегмент; совпадения, начинающиеся дальше,
+        относятся к следующему сегменту.
+    """
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    buffer = ""
+    offset = 0
+    async for chunk in chunks:
+        buffer += decoder.decode(chunk)
+        while len(buffer) >= max_chars:
+            cut, inside = _find_cut(buffer[:max_chars], max_chars // 2) or (
+                max_chars,
+                False,
+            )
+            owned = cut
+            if inside:
+                owned = _overlap_start(buffer, cut, overlap_words)
+            yield offset, buffer[:cut], owned
+            offset += owned
+            buffer = buffer[owned:]
+    buffer += decoder.decode(b"", final=True)
+    if buffer:
+        yield offset, buffer, len(buffer)
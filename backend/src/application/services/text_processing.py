@@ -2,67 +2,56 @@ import asyncio
 import math
 import os
 import time
+import uuid
+from bisect import bisect_right
+from collections import defaultdict
+from collections.abc import AsyncIterator
+from typing import NamedTuple
 
 import ahocorasick
+import orjson
 from fastapi import Depends
 from rapidfuzz.distance import DamerauLevenshtein
-
-from src.application.services.nlp import lemmatize, nlp
+from spacy.tokens import Doc
+
+from src.application.services.aho import max_phrase_tokens
+from src.application.services.drug_info_loader import DrugInfoLoader
+from src.application.services.executor import MatcherExecutor
+from src.application.services.fragments import DrugFragments
+from src.application.services.fuzzy import FuzzyIndex
+from src.application.services.nlp import lemmatize_doc, nlp
+from src.application.services.result_cache import ResultCache, result_key
+from src.application.services.rule_cache import RuleCache
+from src.application.services.spans import SpanIndex, resolve_spans
+from src.application.services.streaming import iter_segments
 from src.infrastructure.repositories.drugs import DrugsRepo
 from src.infrastructure.schemas.text_processing import DrugTable
+from src.infrastructure.session import async_session_factory
+from src.settings import settings
 
+_SIMILARITY_THRESHOLD = 0.8
+_MATCH_KINDS = {"lightgreen": "exact", "yellow": "fuzzy"}
 
-class BKTree:
-
-    class Node:
-        def __init__(self, word: str, drug_id: int):
-            self.word = word
-            self.drug_id = drug_id
-            self.children = {}
-
-    def __init__(self, distance_func):
-        self.root = None
-        self.distance_func = distance_func
-
-    def add(self, word: str, drug_id: int):
-        """Add a word with its drug ID to the BK-tree."""
-        if not word:
-            return
-        if not self.root:
-            self.root = self.Node(word, drug_id)
-            return
-        current = self.root
-        while True:
-            dist = self.distance_func(word, current.word)
-            if dist in current.children:
-                current = current.children[dist]
-            else:
-                current.children[dist] = self.Node(word, drug_id)
-                break
-
-    def search(self, word: str, max_dist: int) -> list[tuple[str, int, int]]:
-        """Search for words within max_dist of the query word, returning (word, drug_id, distance)."""
-        if not self.root:
-            return []
-        results = []
-        self._search_recursive(self.root, word, max_dist, results)
-        return results
-
-    def _search_recursive(
-        self, node: Node, word: str, max_dist: int, results: list
-    ):
-        if not node:
-            return
-        dist = self.distance_func(word, node.word)
-        if dist <= max_dist:
-            results.append((node.word, node.drug_id, dist))
-        min_dist = max(0, dist - max_dist)
-        max_dist_bound = dist + max_dist
-        for child_dist in range(int(min_dist), int(max_dist_bound) + 1):
-            if child_dist in node.children:
-                self._search_recursive(
-                    node.children[child_dist], word, max_dist, results
-                )
+
+class Match(NamedTuple):
+    """
+    Совпадение наименования лекарства в тексте.
+
+    Attributes:
+        start: Начало фразы в тексте.
+        end: Конец фразы в тексте (не включительно).
+        phrase: Фраза из текста.
+        drug_id: Идентификатор лекарства.
+        color: Цвет подсветки: `lightgreen` - точное, `yellow` - нечеткое.
+        word: Наименование из справочника (для нечетких - слово текста).
+    """
+
+    start: int
+    end: int
+    phrase: str
+    drug_id: uuid.UUID
+    color: str
+    word: str
 
 
 class TextProcessingService:
@@ -88,193 +77,521 @@ class TextProcessingService:
         "но",
     }
 
-    def __init__(self, repo: DrugsRepo = Depends()):
+    def __init__(
+        self,
+        repo: DrugsRepo = Depends(),
+        rules: RuleCache | None = None,
+        loader: DrugInfoLoader | None = None,
+        fragments: DrugFragments | None = None,
+    ):
+        """
+        Args:
+            repo: Репозиторий лекарств сессии запроса.
+            rules: Кэш сведений о лекарствах и правилах подачи.
+            loader: Объединитель запросов сведений о лекарствах.
+            fragments: Кэш фрагментов JSON сведений о лекарствах.
+        """
         self._repo = repo
-        self._bk_tree = None
-
-    async def _initialize_bk_tree(self, drugs):
-        if self._bk_tree is None:
-            self._bk_tree = BKTree(
-                lambda s1, s2: int(
-                    DamerauLevenshtein.distance(s1.lower(), s2.lower())
-                )
-            )
-            for drug in drugs:
-                if drug.trade_name and len(drug.trade_name) > 3:
-                    self._bk_tree.add(drug.trade_name.lower(), drug.id)
-                if drug.inn and len(drug.inn) > 3:
-                    self._bk_tree.add(drug.inn.lower(), drug.id)
+        self._rules = rules
+        self._loader = loader
+        self._fragments = fragments
+
+    async def _get_drug_info(
+        self, drug_ids: list, words: list, own_session: bool = False
+    ) -> list:
+        """
+        Сведения о лекарствах из `RuleCache`, а без него - из БД, через
+        `DrugInfoLoader`, если объединение запросов включено.
+
+        Args:
+            drug_ids: Идентификаторы найденных лекарств.
+            words: Найденные наименования.
+            own_session: Открыть отдельную сессию вместо сессии запроса.
+        """
+        if self._rules is not None:
+            return await self._rules.get_drug_info(drug_ids, words)
+        if self._loader is not None:
+            return await self._loader.load(drug_ids, words)
+        if not own_session:
+            return await self._repo.get_drug_info(drug_ids, words)
+        async with async_session_factory() as session:
+            return await DrugsRepo(session).get_drug_info(drug_ids, words)
 
     async def find_medications(
-        self, automaton: ahocorasick.Automaton, text: str, fuzzy: bool
+        self,
+        executor: MatcherExecutor,
+        text: str,
+        fuzzy: bool,
+        output: str = "html",
+        cache: ResultCache | None = None,
     ):
-        text, ids, matches = await self.highlight_medications_in_text(
-            automaton, text, fuzzy=fuzzy
+        """
+        Ищет лекарства в тексте.
+
+        Результат кэшируется по хэшу текста, режимам поиска и отпечатку
+        справочника, с которым работает исполнитель. Сведения о лекарствах
+        возвращаются готовыми фрагментами JSON (`DrugFragments`), если они
+        включены; такой результат отдается через `FragmentJSONResponse`.
+
+        Args:
+            executor: Исполнитель поиска.
+            text: Текст для анализа.
+            fuzzy: Включить нечеткий поиск.
+            output: `html` - подсвеченный текст, `spans` - только отрезки
+                `(start, end, drug_id, kind)` для отрисовки на клиенте.
+            cache: Кэш результатов; без него поиск выполняется всегда.
+        """
+        if cache is None:
+            return await self._find_medications(executor, text, fuzzy, output)
+
+        key = result_key(text, fuzzy, output, executor.fingerprint)
+        result = await cache.fetch(key)
+        if result is None:
+            result = await self._find_medications(
+                executor, text, fuzzy, output
+            )
+            await cache.store(key, result)
+        return result
+
+    async def _find_medications(
+        self, executor: MatcherExecutor, text: str, fuzzy: bool, output: str
+    ) -> dict:
+        if output == "spans":
+            ids, matches = await executor.run(self.find_matches, text, fuzzy)
+            result = {
+                "spans": [
+                    (start, end, drug_id, _MATCH_KINDS[color])
+                    for start, end, _, drug_id, color, _ in matches
+                ]
+            }
+        else:
+            text, ids, matches = await self.highlight_medications_in_text(
+                executor, text, fuzzy=fuzzy
+            )
+            result = {"highlighted_text": text}
+        founded_words = [match.word for match in matches]
+        drugs_data = await self._get_drug_info(list(ids), founded_words)
+        if self._fragments is not None:
+            result["drugs"] = self._fragments.get(drugs_data)
+        else:
+            result["drugs"] = [
+                DrugTable.model_validate(drug) for drug in drugs_data
+            ]
+        return result
+
+    async def find_medications_batch(
+        self, executor: MatcherExecutor, texts: list[str], fuzzy: bool
+    ) -> list[dict]:
+        """
+        Ищет лекарства в нескольких текстах за один запрос.
+
+        Тексты разбираются одним `nlp.pipe` в пуле исполнителя, а сведения о
+        лекарствах для всех текстов загружаются одним запросом к БД и затем
+        раскладываются по текстам.
+
+        Args:
+            executor: Исполнитель поиска.
+            texts: Тексты для анализа.
+            fuzzy: Включить нечеткий поиск.
+
+        Returns:
+            Результаты в порядке входных текстов.
+        """
+        results = await executor.run(
+            self.match_medications_batch,
+            texts,
+            fuzzy,
+            settings.matcher.batch_size,
+            settings.matcher.batch_n_process,
+        )
+        all_ids = set()
+        all_words = set()
+        for _, ids, matches in results:
+            all_ids.update(ids)
+            all_words.update(match.word for match in matches)
+        drugs_data = await self._get_drug_info(
+            list(all_ids), list(all_words)
         )
-        founded_words = [match[-1] for match in matches]
-        drugs_data = await self._repo.get_drug_info(ids, founded_words)
-        drugs_data = [DrugTable.model_validate(drug) for drug in drugs_data]
-        return {"highlighted_text": text, "drugs": drugs_data}
 
-    @staticmethod
-    async def _process_token_chunk(
-        token_data: list[tuple[str, int, int]],
-        bk_tree_data: tuple,
-        existing_matches: list[tuple[int, int, str, int, str]],
-    ) -> tuple[list[tuple[int, int, str, int, str]], set[int]]:
-        """Синхронная обработка подмножества токенов для нечеткого поиска с BK-деревом."""
-        bk_tree = BKTree(
-            lambda s1, s2: int(
-                DamerauLevenshtein.distance(s1.lower(), s2.lower())
+        rows_by_key = defaultdict(list)
+        for row in drugs_data:
+            drug = DrugTable.model_validate(row)
+            for key in (row.drug_id, row.trade_name, row.inn):
+                if key is not None:
+                    rows_by_key[key].append((row, drug))
+
+        response = []
+        for highlighted_text, ids, matches in results:
+            keys = ids | {match.word for match in matches}
+            selected = {}
+            for key in keys:
+                for row, drug in rows_by_key.get(key, ()):
+                    selected[id(row)] = drug
+            response.append(
+                {
+                    "highlighted_text": highlighted_text,
+                    "drugs": list(selected.values()),
+                }
             )
-        )
-        for word, drug_id in bk_tree_data:
-            bk_tree.add(word, drug_id)
+        return response
+
+    async def stream_medications(
+        self,
+        executor: MatcherExecutor,
+        chunks: AsyncIterator[bytes],
+        fuzzy: bool,
+    ) -> AsyncIterator[bytes]:
+        """
+        Потоково ищет лекарства в большом документе и отдает NDJSON.
+
+        Документ делится на сегменты по границам абзацев и предложений,
+        каждый сегмент обрабатывается отдельно, а смещения совпадений
+        переводятся в координаты всего документа. Сегменты, разрезанные
+        внутри предложения, перекрываются на `executor.phrase_tokens` слов;
+        совпадение отдается тем сегментом, в чьей собственной части оно
+        начинается, и только один раз. Сведения о лекарстве
+        отдаются один раз, при первом его появлении. Подсвеченный HTML не
+        строится, поэтому память ограничена размером сегмента.
+
+        Args:
+            executor: Исполнитель поиска.
+            chunks: Асинхронный поток байтов документа.
+            fuzzy: Включить нечеткий поиск.
+
+        Yields:
+            Строки NDJSON: `match`, `drug` и завершающая `done`.
+        """
+        emitted_drugs = set()
+        emitted_end = 0
+        segments = 0
+        async for offset, segment, owned in iter_segments(
+            chunks,
+            settings.matcher.stream_chunk_chars,
+            overlap_words=executor.phrase_tokens,
+        ):
+            segments += 1
+            _, found = await executor.run(self.find_matches, segment, fuzzy)
+            matches = [
+                match
+                for match in found
+                if match.start < owned and match.start + offset >= emitted_end
+            ]
+            if matches:
+                emitted_end = matches[-1].end + offset
+            ids = {match.drug_id for match in matches}
+            for start, end, phrase, drug_id, color, _ in matches:
+                yield orjson.dumps(
+                    {
+                        "type": "match",
+                        "start": start + offset,
+                        "end": end + offset,
+                        "text": phrase,
+                        "drug_id": drug_id,
+                        "kind": _MATCH_KINDS[color],
+                    },
+                    option=orjson.OPT_APPEND_NEWLINE,
+                )
 
-        matches = []
-        founded_drugs_ids = set()
+            new_ids = ids - emitted_drugs
+            if not new_ids:
+                continue
+            words = [
+                match.word for match in matches if match.drug_id in new_ids
+            ]
+            drugs_data = await self._get_drug_info(
+                list(new_ids), words, own_session=True
+            )
+            emitted_drugs.update(new_ids)
+            for row in drugs_data:
+                emitted_drugs.add(row.drug_id)
+                yield orjson.dumps(
+                    {
+                        "type": "drug",
+                        "drug_id": row.drug_id,
+                        **DrugTable.model_validate(row).model_dump(),
+                    },
+                    option=orjson.OPT_APPEND_NEWLINE,
+                )
+
+        yield orjson.dumps(
+            {"type": "done", "segments": segments},
+            option=orjson.OPT_APPEND_NEWLINE,
+        )
 
-        for text, idx, length in token_data:
+    @staticmethod
+    def _process_token_chunk(
+        token_data: list[tuple[str, int, int, str]],
+        fuzzy_index: FuzzyIndex,
+        spans: SpanIndex[Match],
+    ) -> tuple[list[Match], set[uuid.UUID]]:
+        """
+        Нечеткий поиск по токенам документа пакетом уникальных лемм.
+
+        Сначала собираются подходящие токены, не пересекающиеся с уже
+        принятыми отрезками `spans`, затем каждая уникальная лемма ищется в
+        индексе один раз (`search_many`), и лучший кандидат раздается обратно
+        по позициям токенов.
+        """
+        eligible = []
+        for text, idx, length, lemma in token_data:
             if not text.isalpha() or len(text) < 3:
                 continue
-            lemmatized_word = lemmatize(text.lower()).strip()
+            lemmatized_word = lemma.strip()
             if not lemmatized_word:
                 continue
 
             start = idx
             end = idx + length
-            is_already_matched = any(
-                m[0] <= start < m[1] or m[0] < end <= m[1]
-                for m in existing_matches
-            )
-            if is_already_matched:
+            if spans.overlaps(start, end):
                 continue
+            eligible.append((start, end, text, lemmatized_word))
 
-            max_dist = 1
-            candidates = bk_tree.search(lemmatized_word, max_dist)
+        max_dist = 1
+        candidates_by_word = fuzzy_index.search_many(
+            {word for _, _, _, word in eligible}, max_dist
+        )
 
+        best_candidates = {}
+        for lemmatized_word, candidates in candidates_by_word.items():
             best_candidate = None
             min_dist = float("inf")
-            query_first_char = lemmatized_word[0] if lemmatized_word else ""
+            query_first_char = lemmatized_word[0]
             for word, drug_id, dist in candidates:
                 if word and word[0].lower() == query_first_char.lower():
                     if dist < min_dist:
                         min_dist = dist
                         best_candidate = (drug_id, dist)
+            if best_candidate:
+                best_candidates[lemmatized_word] = best_candidate
 
+        matches = []
+        founded_drugs_ids = set()
+        for start, end, text, lemmatized_word in eligible:
+            best_candidate = best_candidates.get(lemmatized_word)
             if best_candidate and best_candidate[0] not in founded_drugs_ids:
                 drug_id, _ = best_candidate
-                matches.append((start, end, text, drug_id, "yellow", text))
+                matches.append(
+                    Match(start, end, text, drug_id, "yellow", text)
+                )
                 founded_drugs_ids.add(drug_id)
 
         return matches, founded_drugs_ids
 
-    async def highlight_medications_in_text(
-        self, automaton: ahocorasick.Automaton, text: str, fuzzy=False
-    ) -> tuple:
-        all_drugs = await self._repo.get_all_drugs()
-        matches = []
-        founded_drugs_ids = set()
-
-        doc = nlp(text)
+    @staticmethod
+    def _find_exact_candidates(
+        automaton: ahocorasick.Automaton, doc: Doc, lemmas: list[str]
+    ) -> list[Match]:
+        """
+        Ищет кандидатов на точное совпадение за один проход автомата.
+
+        Леммы документа склеиваются через пробел в общий поток, и автомат
+        прогоняется по нему целиком. Для каждого срабатывания по индексу
+        границ токенов находится токен, на котором закончился ключ, и
+        перебираются только окна, содержащие этот токен. Размер окна
+        ограничен длиной самого длинного наименования в словаре.
+
+        Окно, прошедшее порог сходства, принимается, только если в нем
+        целиком есть ключ того же наименования: кандидаты те же, что при
+        прогоне автомата по каждому окну отдельно.
+
+        Args:
+            automaton: Автомат Ахо-Корасик со словарем лекарств.
+            doc: Разобранный spaCy документ.
+            lemmas: Леммы токенов документа.
+
+        Returns:
+            Потенциальные совпадения `Match`, возможно пересекающиеся.
+        """
+        token_starts = []
+        position = 0
+        for lemma in lemmas:
+            token_starts.append(position)
+            position += len(lemma) + 1
+        lemma_stream = " ".join(lemmas)
+        window = max_phrase_tokens(automaton)
 
         potential_matches = []
-
-        for start_idx in range(len(doc)):
-            if not doc[start_idx].text.isalpha():
-                continue
-            for end_idx in range(
-                start_idx + 1, min(start_idx + 8, len(doc)) + 1
-            ):
-                original_phrase = " ".join(
-                    [token.text for token in doc[start_idx:end_idx]]
-                )
-                lower_original_phrase = original_phrase.lower()
-                lemmatized_phrase = " ".join(
-                    [
-                        lemmatize(word)
-                        for word in lower_original_phrase.split(" ")
-                    ]
-                )
-                striped_phrase = lemmatized_phrase.strip()
-                for _, (value, id, word) in automaton.iter(striped_phrase):
+        checked = set()
+        window_values = {}
+        for end_position, (value, id, word) in automaton.iter(lemma_stream):
+            last_token = bisect_right(token_starts, end_position) - 1
+            max_phrase_len = len(value) / _SIMILARITY_THRESHOLD
+            first_token = max(0, last_token - window + 1)
+            for start_idx in range(first_token, last_token + 1):
+                if not doc[start_idx].text.isalpha():
+                    continue
+                for end_idx in range(
+                    last_token + 1, min(start_idx + window, len(doc)) + 1
+                ):
+                    phrase_end = token_starts[end_idx - 1] + len(
+                        lemmas[end_idx - 1]
+                    )
+                    striped_phrase = lemma_stream[
+                        token_starts[start_idx]:phrase_end
+                    ].strip()
+                    if len(striped_phrase) > max_phrase_len:
+                        break
+                    key = (start_idx, end_idx, value, id)
+                    if key in checked:
+                        continue
+                    checked.add(key)
                     damerau_levenshtein_distance = (
                         DamerauLevenshtein.normalized_similarity(
                             value, striped_phrase
                         )
                     )
-                    if not damerau_levenshtein_distance >= 0.8:
+                    if damerau_levenshtein_distance < _SIMILARITY_THRESHOLD:
+                        continue
+                    # Срабатывание могло начаться левее окна (окно - хвост
+                    # ключа); такое окно берется, только если в нем есть
+                    # другой ключ этого наименования.
+                    values = window_values.get((start_idx, end_idx))
+                    if values is None:
+                        values = {
+                            hit for _, hit in automaton.iter(striped_phrase)
+                        }
+                        window_values[(start_idx, end_idx)] = values
+                    if (value, id, word) not in values:
                         continue
                     start = doc[start_idx].idx
                     end = doc[end_idx - 1].idx + len(doc[end_idx - 1].text)
                     phrase_to_highlight = str(doc[start_idx:end_idx])
                     potential_matches.append(
-                        {
-                            "start": start,
-                            "end": end,
-                            "phrase": phrase_to_highlight,
-                            "id": id,
-                            "color": "lightgreen",
-                            "word_count": len(phrase_to_highlight.split()),
-                            "word": word,
-                        }
+                        Match(
+                            start,
+                            end,
+                            phrase_to_highlight,
+                            id,
+                            "lightgreen",
+                            word,
+                        )
                     )
+        return potential_matches
 
-        matches = []
-        processed_ranges = set()
-        for match in sorted(
-            potential_matches, key=lambda x: (-x["word_count"], x["start"])
-        ):
-            start, end = match["start"], match["end"]
-            is_overlapping = False
-            for processed_start, processed_end in processed_ranges:
-                if not (end <= processed_start or start >= processed_end):
-                    is_overlapping = True
-                    break
-            if not is_overlapping:
-                matches.append(
-                    (start, end, match["phrase"], match["id"], match["color"], match['word'])
-                )
-                processed_ranges.add((start, end))
-                founded_drugs_ids.add(match["id"])
-
-        if not fuzzy:
-            return (
-                await self._highlight_matches(text, matches),
-                founded_drugs_ids,
-                matches
-            )
+    async def highlight_medications_in_text(
+        self, executor: MatcherExecutor, text: str, fuzzy=False
+    ) -> tuple:
+        """
+        Ищет лекарства в тексте и подсвечивает их.
 
-        await self._initialize_bk_tree(all_drugs)
+        CPU-нагрузка выполняется в пуле исполнителя, чтобы не блокировать
+        цикл событий.
+        """
+        return await executor.run(self.match_medications, text, fuzzy)
 
-        bk_tree_data = []
-        for drug in all_drugs:
-            if drug.trade_name and len(drug.trade_name) > 3:
-                bk_tree_data.append((drug.trade_name.lower(), drug.id))
-            if drug.inn and len(drug.inn) > 3:
-                bk_tree_data.append((drug.inn.lower(), drug.id))
+    @staticmethod
+    def match_medications(
+        automaton: ahocorasick.Automaton,
+        fuzzy_index: FuzzyIndex,
+        text: str,
+        fuzzy: bool = False,
+    ) -> tuple:
+        return TextProcessingService._match_doc(
+            automaton, fuzzy_index, nlp(text), fuzzy
+        )
 
-        token_data = [
-            (token.text, token.idx, len(token.text)) for token in doc
+    @staticmethod
+    def match_medications_batch(
+        automaton: ahocorasick.Automaton,
+        fuzzy_index: FuzzyIndex,
+        texts: list[str],
+        fuzzy: bool = False,
+        batch_size: int = 64,
+        n_process: int = 1,
+    ) -> list[tuple]:
+        return [
+            TextProcessingService._match_doc(
+                automaton, fuzzy_index, doc, fuzzy
+            )
+            for doc in nlp.pipe(
+                texts, batch_size=batch_size, n_process=n_process
+            )
         ]
-        chunk_matches, chunk_ids = await self._process_token_chunk(token_data, bk_tree_data, matches)
 
-        matches.extend(chunk_matches)
-        founded_drugs_ids.update(chunk_ids)
-        return await self._highlight_matches(text, matches), founded_drugs_ids, matches
+    @staticmethod
+    def find_matches(
+        automaton: ahocorasick.Automaton,
+        fuzzy_index: FuzzyIndex,
+        text: str,
+        fuzzy: bool = False,
+    ) -> tuple[set, list[Match]]:
+        """Ищет лекарства в тексте без построения подсвеченного HTML."""
+        return TextProcessingService._find_doc_matches(
+            automaton, fuzzy_index, nlp(text), fuzzy
+        )
 
     @staticmethod
-    async def _highlight_matches(highlighted_text, matches):
-        sorted_matches = sorted(matches, key=lambda x: (x[0], -(x[1] - x[0])))
-        filtered_matches = []
-        last_end = -1
-        for start, end, word, drug_id, color, _ in sorted_matches:
-            if start >= last_end:
-                filtered_matches.append((start, end, word, drug_id, color))
-                last_end = end
-
-        offset = 0
-        for start, end, word, drug_id, color in filtered_matches:
+    def _match_doc(
+        automaton: ahocorasick.Automaton,
+        fuzzy_index: FuzzyIndex,
+        doc: Doc,
+        fuzzy: bool = False,
+    ) -> tuple:
+        founded_drugs_ids, matches = TextProcessingService._find_doc_matches(
+            automaton, fuzzy_index, doc, fuzzy
+        )
+        return (
+            TextProcessingService._highlight_matches(doc.text, matches),
+            founded_drugs_ids,
+            matches,
+        )
+
+    @staticmethod
+    def _find_doc_matches(
+        automaton: ahocorasick.Automaton,
+        fuzzy_index: FuzzyIndex,
+        doc: Doc,
+        fuzzy: bool = False,
+    ) -> tuple[set, list[Match]]:
+        """
+        Находит непересекающиеся совпадения в документе.
+
+        Точные кандидаты разрешаются общим `SpanIndex`: сначала более длинные
+        фразы, при равенстве - более ранние. Нечеткий поиск затем рассматривает
+        только токены вне принятых отрезков.
+
+        Returns:
+            Идентификаторы найденных лекарств и совпадения `Match` в
+            порядке начала.
+        """
+        lemmas = lemmatize_doc(doc)
+
+        potential_matches = TextProcessingService._find_exact_candidates(
+            automaton, doc, lemmas
+        )
+        spans = resolve_spans(
+            potential_matches,
+            bounds=lambda match: (match.start, match.end),
+            priority=lambda match: (-len(match.phrase.split()), match.start),
+        )
+        founded_drugs_ids = {match.drug_id for match in spans}
+
+        if fuzzy:
+            token_data = [
+                (token.text, token.idx, len(token.text), lemma)
+                for token, lemma in zip(doc, lemmas)
+            ]
+            chunk_matches, chunk_ids = (
+                TextProcessingService._process_token_chunk(
+                    token_data, fuzzy_index, spans
+                )
+            )
+            for match in chunk_matches:
+                spans.add(match.start, match.end, match)
+            founded_drugs_ids.update(chunk_ids)
+
+        return founded_drugs_ids, list(spans)
+
+    @staticmethod
+    def _highlight_matches(text, matches):
+        """
+        Подсвечивает непересекающиеся совпадения в порядке их начала.
+
+        Текст собирается из кусков за один проход и склеивается один раз.
+        """
+        pieces = []
+        position = 0
+        for start, end, word, drug_id, color, _ in matches:
             words = word.split()
             preposition = ""
             highlighted_word = word
@@ -290,10 +607,8 @@ class TextProcessingService:
                 replacement = f'{preposition}<span style="background-color: {color}; font-weight: bold;">{highlighted_part}</span>{highlighted_word[-1]}'
             else:
                 replacement = f'{preposition}<span style="background-color: {color}; font-weight: bold;">{highlighted_word}</span>'
-            highlighted_text = (
-                highlighted_text[: start + offset]
-                + replacement
-                + highlighted_text[end + offset :]
-            )
-            offset += len(replacement) - (end - start)
-        return highlighted_text
+            pieces.append(text[position:start])
+            pieces.append(replacement)
+            position = end
+        pieces.append(text[position:])
+        return "".join(pieces)
@@ -4,6 +4,20 @@
 Содержит модели данных, используемые для взаимодействия с базой данных.
 """
 
-from .public import Drug, SubmissionRule, TypeOfEvent, User
+from .public import (
+    CatalogChange,
+    Drug,
+    DrugRules,
+    SubmissionRule,
+    TypeOfEvent,
+    User,
+)
 
-__all__ = ("Drug", "User", "SubmissionRule", "TypeOfEvent")
+__all__ = (
+    "Drug",
+    "User",
+    "SubmissionRule",
+    "TypeOfEvent",
+    "CatalogChange",
+    "DrugRules",
+)
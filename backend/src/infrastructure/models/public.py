@@ -1,7 +1,19 @@
 import uuid
 
-from sqlalchemy import Boolean, Column, Date, ForeignKey, String, DateTime
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import (
+    BigInteger,
+    Boolean,
+    Column,
+    Date,
+    DateTime,
+    ForeignKey,
+    Identity,
+    Index,
+    String,
+    func,
+    text,
+)
+from sqlalchemy.dialects.postgresql import JSONB, UUID
 from sqlalchemy.orm import declarative_base, relationship
 
 Base = declarative_base()
@@ -18,7 +30,8 @@ class SubmissionRuleDrug(Base):
     drug_id = Column(
         UUID(as_uuid=True),
         ForeignKey('drugs.id'),
-        primary_key=True
+        primary_key=True,
+        index=True,
     )
 
     submission_rule = relationship("SubmissionRule")
@@ -34,8 +47,8 @@ class Drug(Base):
         default=uuid.uuid4,
         nullable=False,
     )
-    trade_name = Column(String, nullable=False)
-    inn = Column(String, nullable=True, default=None)
+    trade_name = Column(String, nullable=False, index=True)
+    inn = Column(String, nullable=True, default=None, index=True)
     obligation = Column(String, nullable=True)
     release_forms = Column(String, nullable=True)
 
@@ -70,6 +83,13 @@ class TypeOfEvent(Base):
 
 class SubmissionRule(Base):
     __tablename__ = "submission_rules"
+    __table_args__ = (
+        Index(
+            "ix_submission_rules_validity",
+            "valid_start_date",
+            "valid_end_date",
+        ),
+    )
 
     id = Column(
         UUID(as_uuid=True),
@@ -110,3 +130,47 @@ class User(Base):
     email = Column(String, unique=True, nullable=False)
     password = Column(String, nullable=False)
     is_admin = Column(Boolean, nullable=False, default=False)
+
+
+class CatalogChange(Base):
+    """
+    Журнал изменений справочника.
+
+    Строки добавляются триггерами на `drugs` (`kind='drug'`) и таблицах
+    правил подачи (`kind='rules'`), а также приложением после перестроения
+    автомата (`kind='artifact'`, `base_version` - версия журнала, по
+    которую собран артефакт). Каждый оператор вставки отправляет последний
+    номер версии в канал `catalog_changes` через NOTIFY.
+    """
+
+    __tablename__ = "catalog_changes"
+
+    version = Column(BigInteger, Identity(), primary_key=True)
+    kind = Column(String, nullable=False)
+    drug_id = Column(UUID(as_uuid=True), nullable=True)
+    base_version = Column(BigInteger, nullable=True)
+    changed_at = Column(DateTime, nullable=False, server_default=func.now())
+
+
+class DrugRules(Base):
+    """
+    Модель чтения: лекарство со всеми его правилами подачи.
+
+    Одна строка на лекарство, правила с типом события и сроками действия
+    лежат в `rules` массивом JSONB. Таблицу поддерживают триггеры на
+    `drugs`, `submission_rule_drug`, `submission_rules` и `type_of_event`
+    (функция `refresh_drug_rules`), приложение в нее не пишет. Срок действия
+    правил проверяется при чтении.
+    """
+
+    __tablename__ = "drug_rules"
+
+    drug_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey("drugs.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    trade_name = Column(String, nullable=False, index=True)
+    inn = Column(String, nullable=True, index=True)
+    obligation = Column(String, nullable=True)
+    rules = Column(JSONB, nullable=False, server_default=text("'[]'::jsonb"))
@@ -0,0 +1,107 @@
+import sqlalchemy as sa
+
+from src.infrastructure.models.public import CatalogChange, Drug
+from src.infrastructure.repositories.base import BaseRepository
+
+
+class CatalogChangesRepo(BaseRepository):
+    """Репозиторий для работы с журналом изменений справочника."""
+
+    table = CatalogChange
+
+    async def latest_version(self) -> int:
+        statement = sa.select(
+            sa.func.coalesce(sa.func.max(CatalogChange.version), 0)
+        )
+        result = await self.session.execute(statement)
+        return result.scalar_one()
+
+    async def get_since(self, version: int) -> list[sa.Row]:
+        """
+        Возвращает изменения после `version` с текущими наименованиями.
+
+        Для удаленных лекарств `trade_name` и `inn` равны None.
+        """
+        statement = (
+            sa.select(
+                CatalogChange.version,
+                CatalogChange.kind,
+                CatalogChange.drug_id,
+                CatalogChange.base_version,
+                Drug.id,
+                Drug.trade_name,
+                Drug.inn,
+            )
+            .join(Drug, Drug.id == CatalogChange.drug_id, isouter=True)
+            .where(CatalogChange.version > version)
+            .order_by(CatalogChange.version)
+        )
+        result = await self.session.execute(statement)
+        return result.all()
+
+    async def changed_drugs(self, version: int) -> list | None:
+        """
+        Идентификаторы лекарств, измененных после `version`.
+
+        Returns:
+            None, если после `version` в журнале есть запись `catalog`
+            (массовая загрузка без записей по лекарствам): изменился весь
+            справочник.
+        """
+        reloaded = await self.session.execute(
+            sa.select(
+                sa.exists().where(
+                    CatalogChange.kind == "catalog",
+                    CatalogChange.version > version,
+                )
+            )
+        )
+        if reloaded.scalar_one():
+            return None
+        statement = (
+            sa.select(CatalogChange.drug_id)
+            .where(
+                CatalogChange.kind == "drug",
+                CatalogChange.version > version,
+            )
+            .distinct()
+        )
+        result = await self.session.execute(statement)
+        return list(result.scalars())
+
+    async def artifact_version(self) -> int:
+        """Версия журнала, по которую собран последний артефакт автомата."""
+        statement = sa.select(
+            sa.func.coalesce(sa.func.max(CatalogChange.base_version), 0)
+        ).where(CatalogChange.kind == "artifact")
+        result = await self.session.execute(statement)
+        return result.scalar_one()
+
+    async def record_artifact(self, base_version: int) -> int:
+        """
+        Записывает новый артефакт автомата и удаляет покрытую им историю.
+
+        Записи до `base_version` включительно уже учтены в артефакте:
+        воркер, отставший дальше, увидит запись `artifact` и перечитает
+        артефакт и справочник целиком.
+
+        Args:
+            base_version: Версия журнала, по которую собран артефакт.
+
+        Returns:
+            Версия записи `artifact`.
+        """
+        statement = (
+            sa.insert(CatalogChange)
+            .values(kind="artifact", base_version=base_version)
+            .returning(CatalogChange.version)
+        )
+        result = await self.session.execute(statement)
+        version = result.scalar_one()
+        await self.session.execute(
+            sa.delete(CatalogChange).where(
+                CatalogChange.version <= base_version
+            )
+        )
+        await self.session.commit()
+        return version
@@ -1,11 +1,78 @@
-from datetime import datetime
+from datetime import date, datetime
+from typing import NamedTuple
+from uuid import UUID
 
 import sqlalchemy as sa
 
-from src.infrastructure.models.public import Drug, SubmissionRule, TypeOfEvent, SubmissionRuleDrug
+from src.infrastructure.models.public import Drug, DrugRules
 from src.infrastructure.repositories.base import BaseRepository
 
 
+class DrugInfoRow(NamedTuple):
+    """Лекарство с одним правилом подачи (или без правил)."""
+
+    drug_id: UUID
+    trade_name: str
+    inn: str | None
+    obligation: str | None
+    source_countries: str | None = None
+    receiver: str | None = None
+    deadline_to_submit: date | None = None
+    format: str | None = None
+    other_procedures: str | None = None
+    valid_start_date: datetime | None = None
+    valid_end_date: datetime | None = None
+    type_of_event: str | None = None
+
+
+def is_valid(row: DrugInfoRow, now: datetime) -> bool:
+    """
+    Действует ли правило строки на момент `now`.
+
+    Оба срока заданы и `now` между ними, либо оба не заданы (в том числе у
+    лекарства без правил).
+    """
+    start, end = row.valid_start_date, row.valid_end_date
+    if start is None and end is None:
+        return True
+    return start is not None and end is not None and start <= now <= end
+
+
+def _parse(value: str | None, parse) -> date | datetime | None:
+    return parse(value) if value is not None else None
+
+
+def expand_drug_rules(record: sa.Row) -> list[DrugInfoRow]:
+    """
+    Разворачивает строку `drug_rules` в строки по одному правилу.
+
+    Лекарство без правил дает одну строку с пустыми полями правила.
+    """
+    drug = (record.drug_id, record.trade_name, record.inn, record.obligation)
+    if not record.rules:
+        return [DrugInfoRow(*drug)]
+    return [
+        DrugInfoRow(
+            *drug,
+            source_countries=rule["source_countries"],
+            receiver=rule["receiver"],
+            deadline_to_submit=_parse(
+                rule["deadline_to_submit"], date.fromisoformat
+            ),
+            format=rule["format"],
+            other_procedures=rule["other_procedures"],
+            valid_start_date=_parse(
+                rule["valid_start_date"], datetime.fromisoformat
+            ),
+            valid_end_date=_parse(
+                rule["valid_end_date"], datetime.fromisoformat
+            ),
+            type_of_event=rule["type_of_event"],
+        )
+        for rule in record.rules
+    ]
+
+
 class DrugsRepo(BaseRepository):
     """Репозиторий для работы с таблицей drugs в БД."""
 
@@ -16,57 +83,69 @@ class DrugsRepo(BaseRepository):
         result = await self.session.execute(statement)
         return result.scalars().all()
 
-    async def get_drug_info(self, drug_ids: list, words: list):
+    async def get_catalog(self, ids: list | None = None) -> list[sa.Row]:
+        """
+        Возвращает id и наименования лекарств без загрузки ORM-объектов.
+
+        Args:
+            ids: Ограничить выборку этими лекарствами (одним `IN`).
+        """
+        statement = sa.select(Drug.id, Drug.trade_name, Drug.inn)
+        if ids is not None:
+            statement = statement.where(Drug.id.in_(ids))
+        result = await self.session.execute(statement)
+        return result.all()
+
+    async def get_drug_info(
+        self, drug_ids: list, words: list
+    ) -> list[DrugInfoRow]:
+        """
+        Лекарства с действующими правилами подачи, по строке на правило.
+
+        Читает модель `drug_rules`: по ключу для `id` и по индексам для
+        наименований, без соединения таблиц правил.
+
+        Args:
+            drug_ids: Идентификаторы лекарств.
+            words: Наименования лекарств (`trade_name` или `inn`).
+        """
+        if not drug_ids and not words:
+            return []
         now = datetime.now()
-        stmt = (
-            sa.select(
-                Drug.trade_name,
-                Drug.inn,
-                Drug.obligation,
-                SubmissionRule.source_countries,
-                SubmissionRule.receiver,
-                SubmissionRule.deadline_to_submit,
-                SubmissionRule.format,
-                SubmissionRule.other_procedures,
-                SubmissionRule.valid_start_date,
-                SubmissionRule.valid_end_date,
-                TypeOfEvent.name.label("type_of_event"),
-            )
-            .join(
-                SubmissionRuleDrug,
-                SubmissionRuleDrug.drug_id == Drug.id,
-                isouter=True
-            )
-            .join(
-                SubmissionRule,
-                SubmissionRule.id == SubmissionRuleDrug.submission_rule_id,
-                isouter=True
-            )
-            .join(
-                TypeOfEvent,
-                TypeOfEvent.id == SubmissionRule.type_of_event,
-                isouter=True
-            )
-            .where(
-                sa.and_(
-                    sa.or_(
-                        Drug.id.in_(drug_ids),
-                        Drug.trade_name.in_(words),
-                        Drug.inn.in_(words),
-                    ),
-                    sa.or_(
-                        sa.and_(
-                            SubmissionRule.valid_start_date <= now,
-                            SubmissionRule.valid_end_date >= now,
-                        ),
-                        sa.and_(
-                            SubmissionRule.valid_start_date.is_(None),
-                            SubmissionRule.valid_end_date.is_(None),
-                        ),
-                    )
-
-                )
-            )
-        )
+        stmt = drug_rules_statement(drug_ids, words)
+        result = await self.session.execute(stmt)
+        return [
+            row
+            for record in result
+            for row in expand_drug_rules(record)
+            if is_valid(row, now)
+        ]
+
+    async def get_all_drug_info(
+        self, drug_ids: list | None = None
+    ) -> list[DrugInfoRow]:
+        """
+        Все лекарства со всеми правилами без проверки срока действия.
+
+        Строки в том же виде, что у `get_drug_info`; срок действия правил
+        проверяет вызывающий (см. `RuleCache`).
+
+        Args:
+            drug_ids: Ограничить выборку этими лекарствами (одним `IN`).
+        """
+        stmt = sa.select(*DrugRules.__table__.columns)
+        if drug_ids is not None:
+            stmt = stmt.where(DrugRules.drug_id.in_(drug_ids))
         result = await self.session.execute(stmt)
-        return result.fetchall()
+        return [row for record in result for row in expand_drug_rules(record)]
+
+
+def drug_rules_statement(drug_ids: list, words: list):
+    """Строки `drug_rules` по `id` или по `trade_name`/`inn`."""
+    return sa.select(*DrugRules.__table__.columns).where(
+        sa.or_(
+            DrugRules.drug_id.in_(drug_ids),
+            DrugRules.trade_name.in_(words),
+            DrugRules.inn.in_(words),
+        )
+    )
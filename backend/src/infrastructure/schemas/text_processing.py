@@ -1,12 +1,21 @@
 import uuid
 from datetime import date, datetime
+from typing import Literal
 
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, Field
+
+from src.settings import settings
 
 
 class TextRequest(BaseModel):
     text: str
     fuzzy: bool = False
+    output: Literal["html", "spans"] = "html"
+
+
+class BatchTextRequest(BaseModel):
+    texts: list[str] = Field(max_length=settings.matcher.batch_max_texts)
+    fuzzy: bool = False
 
 
 class Drug(BaseModel):
@@ -30,3 +39,12 @@ class DrugTable(BaseModel):
     valid_end_date: datetime | None = None
 
     model_config = ConfigDict(from_attributes=True)
+
+
+class TextResult(BaseModel):
+    highlighted_text: str
+    drugs: list[DrugTable]
+
+
+class BatchTextResponse(BaseModel):
+    results: list[TextResult]
@@ -1,4 +1,5 @@
 import logging
+import uuid
 from datetime import timedelta
 from typing import Optional
 
@@ -12,7 +13,7 @@ from sqladmin.authentication import AuthenticationBackend, login_required
 from sqlalchemy import String, or_, cast
 from starlette.responses import Response
 
-from src.application.services.aho import AhoCorasickService
+from src.application.services.catalog import CatalogEntry
 from src.application.services.auth import (
     ACCESS_TOKEN_EXPIRE_MINUTES,
     ALGORITHM,
@@ -31,13 +32,15 @@ from src.infrastructure.models.public import (
 from src.infrastructure.repositories.drugs import DrugsRepo
 from src.infrastructure.repositories.user import UserRepo
 from src.infrastructure.session import async_session_factory
-from src.interfaces.api.dependencies.session import get_session
 from src.settings import settings
 
 from src.infrastructure.models.public import SubmissionRuleDrug
 
 logger = logging.getLogger(__name__)
 
+# Модели, из которых собирается `drug_rules`, кроме самих лекарств.
+_RULE_MODELS = (SubmissionRule, TypeOfEvent, SubmissionRuleDrug)
+
 
 class DrugsAdmin(Admin):
     @login_required
@@ -78,10 +81,9 @@ class DrugsAdmin(Admin):
             )
             try:
                 obj = await model_view.insert_model(request, form_data_dict)
-                await AhoCorasickService.add_drug_to_automation(
-                    self.app.state.automaton, obj
+                self.app.state.catalog_updates.submit(
+                    drugs=[CatalogEntry(obj.id, obj.trade_name, obj.inn)]
                 )
-                self.app.state.automaton.make_automaton()
             except Exception as e:
                 logger.exception(e)
                 context["error"] = str(e)
@@ -149,27 +151,65 @@ class DrugsAdmin(Admin):
                 model_view=model_view,
             )
             return RedirectResponse(url=url, status_code=302)
-        return await super().create(request)
+        response = await super().create(request)
+        if request.method == "POST":
+            self._invalidate_results(identity)
+        return response
+
+    @login_required
+    async def edit(self, request: Request) -> Response:
+        response = await super().edit(request)
+        if request.method != "POST":
+            return response
+        if request.path_params["identity"] == "drug":
+            async with async_session_factory() as session:
+                drugs = await DrugsRepo(session).get_catalog(
+                    ids=[request.path_params["pk"]]
+                )
+            self.app.state.catalog_updates.submit(drugs=drugs)
+        else:
+            self._invalidate_results(request.path_params["identity"])
+        return response
+
+    def _invalidate_results(self, identity: str) -> None:
+        """
+        Сбрасывает кэши результатов и фрагментов и перечитывает кэш правил
+        после изменения правил.
+
+        Изменения других моделей (например, пользователей) на результаты
+        не влияют, и кэши не трогаются.
+        """
+        if self._find_model_view(identity).model not in _RULE_MODELS:
+            return
+        result_cache = getattr(self.app.state, "result_cache", None)
+        if result_cache is not None:
+            result_cache.invalidate()
+        fragments = getattr(self.app.state, "drug_fragments", None)
+        if fragments is not None:
+            fragments.clear()
+        rule_cache = getattr(self.app.state, "rule_cache", None)
+        if rule_cache is not None:
+            rule_cache.reload()
 
     @login_required
     async def delete(self, request: Request) -> Response:
+        """
+        Удаление записей.
 
-        params = request.query_params.get("pks", "")
-        pks = params.split(",") if params else []
-        db_session = await anext(get_session())
-        repo = DrugsRepo(db_session)
-        for pk in pks:
-            obj = await repo.get(id=pk)
-            try:
-                self.app.state.automaton.pop(obj.trade_name)
-            except KeyError:
-                pass
-            try:
-                self.app.state.automaton.pop(obj.inn)
-            except KeyError:
-                pass
-        self.app.state.automaton.make_automaton()
-        return await super().delete(request)
+        Удаленные лекарства передаются в очередь обновлений автомата одним
+        пакетом и скрываются в базовом уровне автомата (`tombstones`), без
+        запросов к БД.
+        """
+        response = await super().delete(request)
+        if request.path_params["identity"] == "drug":
+            params = request.query_params.get("pks", "")
+            pks = params.split(",") if params else []
+            self.app.state.catalog_updates.submit(
+                deleted_ids=[uuid.UUID(pk) for pk in pks]
+            )
+        else:
+            self._invalidate_results(request.path_params["identity"])
+        return response
 
 
 class DrugAdmin(ModelView, model=Drug):
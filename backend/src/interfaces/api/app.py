@@ -1,14 +1,26 @@
 """Модуль инициализации приложения FastAPI."""
 
 import logging
-import pickle
 from collections.abc import AsyncGenerator
 from contextlib import asynccontextmanager
 
-import ahocorasick
 from fastapi import FastAPI
 from starlette.middleware.cors import CORSMiddleware
 
+from src.application.services.automaton import load_automaton
+from src.application.services.catalog_sync import (
+    CatalogListener,
+    CatalogUpdateQueue,
+)
+from src.application.services.drug_info_loader import DrugInfoLoader
+from src.application.services.executor import MatcherExecutor
+from src.application.services.fragments import DrugFragments
+from src.application.services.rebuild import AutomatonRebuilder
+from src.application.services.result_cache import (
+    ResultCache,
+    SharedResultStore,
+)
+from src.application.services.rule_cache import RuleCache
 from src.interfaces.api.middleware.metrics import collect_prometheus_metrics
 from src.settings import settings
 
@@ -38,13 +50,56 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
     Yields:
         None:
     """
-    automation: ahocorasick.Automaton = ahocorasick.load(
-        "./assets/aho_corasick_medications3.model", pickle.loads
+    app.state.matcher = MatcherExecutor(
+        settings.matcher.executor, settings.matcher.workers
     )
-    app.state.automaton = automation
+    app.state.result_cache = None
+    if settings.cache.enabled:
+        shared = (
+            SharedResultStore(
+                settings.cache.shared_path,
+                settings.cache.shared_max_bytes,
+                settings.cache.ttl_seconds,
+            )
+            if settings.cache.shared_path
+            else None
+        )
+        app.state.result_cache = ResultCache(
+            settings.cache.max_entries,
+            settings.cache.max_bytes,
+            settings.cache.ttl_seconds,
+            shared,
+        )
+    app.state.rule_cache = None
+    if settings.cache.rules_enabled:
+        app.state.rule_cache = RuleCache()
+    app.state.drug_fragments = None
+    if settings.cache.fragment_max_entries > 0:
+        app.state.drug_fragments = DrugFragments(
+            settings.cache.fragment_max_entries
+        )
+    app.state.drug_info_loader = None
+    if settings.db.drug_info_batch_ms > 0:
+        app.state.drug_info_loader = DrugInfoLoader(
+            settings.db.drug_info_batch_ms / 1000,
+            settings.db.drug_info_batch_max_keys,
+        )
+    app.state.catalog_updates = CatalogUpdateQueue(app.state)
+    catalog = await app.state.catalog_updates.reload(load_automaton())
+    app.state.rebuilder = AutomatonRebuilder(app.state)
+    app.state.catalog_listener = CatalogListener(app.state)
+    if settings.catalog.listen:
+        await app.state.catalog_listener.start(catalog.journal_version)
 
     yield
 
+    await app.state.catalog_listener.stop()
+    await app.state.catalog_updates.stop()
+    await app.state.rebuilder.shutdown()
+    if app.state.rule_cache is not None:
+        await app.state.rule_cache.stop()
+    app.state.matcher.shutdown()
+
 
 app = FastAPI(
     lifespan=lifespan,
@@ -1,6 +1,17 @@
 import ahocorasick
 from fastapi import Request
 
+from src.application.services.executor import MatcherExecutor
+from src.application.services.rebuild import AutomatonRebuilder
+
 
 async def get_automaton(request: Request) -> ahocorasick.Automaton:
     return request.app.state.automaton
+
+
+async def get_matcher(request: Request) -> MatcherExecutor:
+    return request.app.state.matcher
+
+
+async def get_rebuilder(request: Request) -> AutomatonRebuilder:
+    return request.app.state.rebuilder
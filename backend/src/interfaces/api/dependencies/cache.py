@@ -0,0 +1,17 @@
+from fastapi import Request
+
+from src.application.services.fragments import DrugFragments
+from src.application.services.result_cache import ResultCache
+from src.application.services.rule_cache import RuleCache
+
+
+async def get_result_cache(request: Request) -> ResultCache | None:
+    return request.app.state.result_cache
+
+
+async def get_rule_cache(request: Request) -> RuleCache | None:
+    return request.app.state.rule_cache
+
+
+async def get_drug_fragments(request: Request) -> DrugFragments | None:
+    return request.app.state.drug_fragments
@@ -0,0 +1,7 @@
+from fastapi import Request
+
+from src.application.services.catalog import DrugCatalog
+
+
+async def get_catalog(request: Request) -> DrugCatalog:
+    return request.app.state.catalog
@@ -0,0 +1,7 @@
+from fastapi import Request
+
+from src.application.services.drug_info_loader import DrugInfoLoader
+
+
+async def get_drug_info_loader(request: Request) -> DrugInfoLoader | None:
+    return request.app.state.drug_info_loader
@@ -0,0 +1,21 @@
+from fastapi import Depends
+
+from src.application.services.drug_info_loader import DrugInfoLoader
+from src.application.services.fragments import DrugFragments
+from src.application.services.rule_cache import RuleCache
+from src.application.services.text_processing import TextProcessingService
+from src.infrastructure.repositories.drugs import DrugsRepo
+from src.interfaces.api.dependencies.cache import (
+    get_drug_fragments,
+    get_rule_cache,
+)
+from src.interfaces.api.dependencies.drug_info import get_drug_info_loader
+
+
+async def get_text_processing_service(
+    repo: DrugsRepo = Depends(),
+    rules: RuleCache | None = Depends(get_rule_cache),
+    loader: DrugInfoLoader | None = Depends(get_drug_info_loader),
+    fragments: DrugFragments | None = Depends(get_drug_fragments),
+) -> TextProcessingService:
+    return TextProcessingService(repo, rules, loader, fragments)
@@ -0,0 +1,62 @@
+"""Классы ответов API."""
+
+from collections.abc import AsyncIterable, AsyncIterator, Callable
+from typing import Any
+
+import anyio
+import orjson
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.types import Receive
+
+from src.application.services.fragments import to_jsonable
+
+
+class FragmentJSONResponse(JSONResponse):
+    """
+    JSON-ответ, собираемый orjson.
+
+    `orjson.Fragment` (готовый JSON, см. `DrugFragments`) подставляется в
+    тело как есть, модели pydantic сериализуются через `model_dump`.
+    Содержимое не проходит через `jsonable_encoder`.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=to_jsonable)
+
+
+class BodyStreamingResponse(StreamingResponse):
+    """
+    Поток ответа, который дочитывает тело запроса по ходу генерации.
+
+    `StreamingResponse` параллельно с отдачей слушает `receive`, чтобы
+    заметить разрыв соединения, и забирал бы сообщения тела у генератора.
+    Здесь разрыв до конца тела замечает сам `request.stream()`
+    (`ClientDisconnect`), а слушать `receive` ответ начинает только после
+    того, как тело прочитано.
+
+    Args:
+        request: Запрос, тело которого читается потоком.
+        render: Строит поток ответа по потоку байтов тела.
+    """
+
+    def __init__(
+        self,
+        request: Request,
+        render: Callable[[AsyncIterator[bytes]], AsyncIterable[bytes]],
+        **kwargs: Any,
+    ) -> None:
+        self._body_read = anyio.Event()
+        super().__init__(render(self._read_body(request)), **kwargs)
+
+    async def _read_body(self, request: Request) -> AsyncIterator[bytes]:
+        try:
+            async for chunk in request.stream():
+                if chunk:
+                    yield chunk
+        finally:
+            self._body_read.set()
+
+    async def listen_for_disconnect(self, receive: Receive) -> None:
+        await self._body_read.wait()
+        await super().listen_for_disconnect(receive)
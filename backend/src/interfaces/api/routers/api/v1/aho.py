@@ -1,24 +1,43 @@
-import asyncio
-import pickle
-
-from fastapi import APIRouter, Depends, Request
+from fastapi import APIRouter, Depends, HTTPException
+from starlette import status
 from starlette.responses import JSONResponse
 
-from src.application.services.aho import AhoCorasickService
+from src.application.services.rebuild import (
+    AutomatonRebuilder,
+    RebuildInProgressError,
+)
 from src.interfaces.api.dependencies.auth import get_current_user
+from src.interfaces.api.dependencies.automaton import get_rebuilder
 
 router = APIRouter()
 
 
 @router.post("/aho/rebuild")
 async def aho_rebuild(
-    request: Request,
-    service: AhoCorasickService = Depends(),
+    rebuilder: AutomatonRebuilder = Depends(get_rebuilder),
     # _=Depends(get_current_user),
 ):
+    """
+    Запускает перестроение автомата в фоне.
+
+    Ход перестроения доступен через `GET /aho/rebuild`.
+    """
+    try:
+        rebuild_status = rebuilder.start()
+    except RebuildInProgressError:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Rebuild is already running",
+        )
+    return JSONResponse(
+        status_code=status.HTTP_202_ACCEPTED,
+        content=rebuild_status.as_dict(),
+    )
+
 
-    new_automation = await asyncio.to_thread(service.build_aho_corasick)
-    new_automation = await new_automation
-    new_automation.save("./assets/aho_corasick_medications3.model", pickle.dumps)
-    request.app.state.automaton = new_automation
-    return JSONResponse(status_code=200, content={"status": "success"})
+@router.get("/aho/rebuild")
+async def aho_rebuild_status(
+    rebuilder: AutomatonRebuilder = Depends(get_rebuilder),
+    # _=Depends(get_current_user),
+):
+    return rebuilder.status.as_dict()
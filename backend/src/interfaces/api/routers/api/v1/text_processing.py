@@ -1,22 +1,112 @@
 import time
+from collections.abc import AsyncIterator
 
-from ahocorasick import Automaton
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Request, UploadFile
+from starlette import status
+from starlette.background import BackgroundTask
+from starlette.responses import StreamingResponse
 
+from src.application.services.executor import MatcherExecutor
+from src.application.services.result_cache import ResultCache
 from src.application.services.text_processing import TextProcessingService
-from src.infrastructure.schemas.text_processing import TextRequest
-from src.interfaces.api.dependencies.automaton import get_automaton
+from src.infrastructure.schemas.text_processing import (
+    BatchTextRequest,
+    BatchTextResponse,
+    TextRequest,
+)
+from src.interfaces.api.dependencies.automaton import get_matcher
+from src.interfaces.api.dependencies.cache import get_result_cache
+from src.interfaces.api.dependencies.text_processing import (
+    get_text_processing_service,
+)
+from src.interfaces.api.responses import (
+    BodyStreamingResponse,
+    FragmentJSONResponse,
+)
 
 router = APIRouter()
 
+STREAM_READ_SIZE = 64 * 1024
+
+
+async def _read_upload(upload: UploadFile) -> AsyncIterator[bytes]:
+    while chunk := await upload.read(STREAM_READ_SIZE):
+        yield chunk
+
 
 @router.post("/find_medications/")
 async def find_medications(
     request: TextRequest,
-    service: TextProcessingService = Depends(),
-    automaton: Automaton = Depends(get_automaton),
-):
+    service: TextProcessingService = Depends(get_text_processing_service),
+    matcher: MatcherExecutor = Depends(get_matcher),
+    cache: ResultCache | None = Depends(get_result_cache),
+) -> FragmentJSONResponse:
+    """
+    Поиск лекарств в тексте.
+
+    Ответ кодируется orjson напрямую: готовые фрагменты JSON сведений о
+    лекарствах подставляются в тело без валидации и `jsonable_encoder`.
+    """
+    result = await service.find_medications(
+        matcher,
+        request.text,
+        fuzzy=request.fuzzy,
+        output=request.output,
+        cache=cache,
+    )
+    return FragmentJSONResponse(result)
+
+
+@router.post("/find_medications/batch")
+async def find_medications_batch(
+    request: BatchTextRequest,
+    service: TextProcessingService = Depends(get_text_processing_service),
+    matcher: MatcherExecutor = Depends(get_matcher),
+) -> BatchTextResponse:
+
+    results = await service.find_medications_batch(
+        matcher, request.texts, fuzzy=request.fuzzy
+    )
+    return BatchTextResponse(results=results)
+
+
+@router.post("/find_medications/stream")
+async def find_medications_stream(
+    request: Request,
+    fuzzy: bool = False,
+    service: TextProcessingService = Depends(get_text_processing_service),
+    matcher: MatcherExecutor = Depends(get_matcher),
+) -> StreamingResponse:
+    """
+    Потоковый анализ большого документа.
+
+    Документ передается файлом `file` в multipart/form-data или телом запроса
+    (в том числе chunked). Результаты отдаются в формате NDJSON по мере
+    обработки сегментов.
+
+    Тело запроса читается по частям по ходу ответа: первый сегмент
+    обрабатывается, пока остальной документ еще передается. Форма
+    multipart, как и любая форма, сначала разбирается целиком.
+    """
+    content_type = request.headers.get("content-type", "")
+    if not content_type.startswith("multipart/form-data"):
+        return BodyStreamingResponse(
+            request,
+            lambda chunks: service.stream_medications(
+                matcher, chunks, fuzzy
+            ),
+            media_type="application/x-ndjson",
+        )
 
-    return await service.find_medications(
-        automaton, request.text, fuzzy=request.fuzzy
+    form = await request.form()
+    upload = form.get("file")
+    if not isinstance(upload, UploadFile):
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Field 'file' is required",
+        )
+    return StreamingResponse(
+        service.stream_medications(matcher, _read_upload(upload), fuzzy),
+        media_type="application/x-ndjson",
+        background=BackgroundTask(upload.close),
     )
@@ -12,8 +12,13 @@ import ujson
 from pydantic_settings import BaseSettings
 
 from .app import AppConfig
+from .cache import CacheConfig
+from .catalog import CatalogConfig
 from .db import AsyncpgSqlaConfig
+from .fuzzy import FuzzyConfig
 from .log import LogConfig, Metrics
+from .matcher import MatcherConfig
+from .nlp import NlpConfig
 
 LEVEL = "level"
 CONSOLE = "console"
@@ -29,6 +34,11 @@ class Settings(BaseSettings):
     log: LogConfig = LogConfig()
     metrics: Metrics = Metrics()
     db: AsyncpgSqlaConfig = AsyncpgSqlaConfig()
+    nlp: NlpConfig = NlpConfig()
+    fuzzy: FuzzyConfig = FuzzyConfig()
+    matcher: MatcherConfig = MatcherConfig()
+    cache: CacheConfig = CacheConfig()
+    catalog: CatalogConfig = CatalogConfig()
 
 
 settings = Settings()
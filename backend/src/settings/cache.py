@@ -0,0 +1,35 @@
+"""Модуль для конфигурации кэша результатов поиска лекарств."""
+
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class CacheConfig(BaseSettings):
+    """
+    Класс для конфигурации кэша результатов `find_medications`.
+
+    Кэш ограничен числом записей `max_entries` и суммарным размером
+    сериализованных результатов `max_bytes`; при превышении вытесняются
+    давно не использованные записи. `ttl_seconds` ограничивает срок жизни
+    записи, так как сроки действия правил подачи зависят от текущей даты.
+
+    `shared_path` включает общий для воркеров хоста кэш в файле SQLite,
+    размер которого ограничен `shared_max_bytes`.
+
+    `rules_enabled` включает кэш сведений о лекарствах и правилах подачи в
+    памяти процесса (`RuleCache`) вместо запроса к БД на каждый поиск.
+
+    `fragment_max_entries` ограничивает кэш готового JSON сведений о
+    лекарствах (`DrugFragments`); 0 отключает его.
+    """
+
+    model_config = SettingsConfigDict(
+        env_prefix="CACHE_", env_file=".env", extra="ignore"
+    )
+    enabled: bool = True
+    max_entries: int = 10000
+    max_bytes: int = 64 * 1024 * 1024
+    ttl_seconds: int = 300
+    shared_path: str | None = None
+    shared_max_bytes: int = 256 * 1024 * 1024
+    rules_enabled: bool = True
+    fragment_max_entries: int = 100_000
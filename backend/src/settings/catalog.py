@@ -0,0 +1,31 @@
+"""Модуль для конфигурации синхронизации справочника между воркерами."""
+
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class CatalogConfig(BaseSettings):
+    """
+    Класс для конфигурации синхронизации справочника.
+
+    При `listen` каждый воркер слушает канал NOTIFY `catalog_changes` и
+    применяет изменения из журнала `catalog_changes`. Уведомления,
+    пришедшие в течение `debounce_seconds`, обрабатываются одним пакетом.
+    После обрыва соединения воркер переподключается через
+    `reconnect_seconds` и догоняет журнал.
+
+    Изменения лекарств копятся в малом уровне автомата; когда в нем
+    набирается `compact_threshold` лекарств, в фоне собирается новый базовый
+    автомат. Пакет, который не удалось применить, остается в очереди и
+    повторяется до `apply_retries` раз с задержкой от `retry_seconds`,
+    удваивающейся после каждой неудачи.
+    """
+
+    model_config = SettingsConfigDict(
+        env_prefix="CATALOG_", env_file=".env", extra="ignore"
+    )
+    listen: bool = True
+    debounce_seconds: float = 0.5
+    reconnect_seconds: float = 5.0
+    compact_threshold: int = 1000
+    apply_retries: int = 5
+    retry_seconds: float = 1.0
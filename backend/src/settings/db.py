@@ -4,7 +4,13 @@ from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
 class AsyncpgSqlaConfig(BaseSettings):
-    """Класс для конфигурации подключения к базе данных с использованием asyncpg и SQLAlchemy."""
+    """
+    Класс для конфигурации подключения к базе данных с использованием asyncpg и SQLAlchemy.
+
+    Запросы сведений о лекарствах от параллельных поисков, пришедшие в
+    течение `drug_info_batch_ms`, выполняются одним запросом (не больше
+    `drug_info_batch_max_keys` ключей в пакете); 0 отключает объединение.
+    """
 
     model_config = SettingsConfigDict(
         env_prefix="ASYNCPG_SQLA_", env_file=".env", extra="ignore"
@@ -14,3 +20,5 @@ class AsyncpgSqlaConfig(BaseSettings):
     connection_timeout: int = 20
     min_pool_size: int = 1
     max_pool_size: int = 5
+    drug_info_batch_ms: float = 2.0
+    drug_info_batch_max_keys: int = 5000
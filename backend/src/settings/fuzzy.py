@@ -0,0 +1,23 @@
+"""Модуль для конфигурации нечеткого поиска лекарств."""
+
+from typing import Literal
+
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class FuzzyConfig(BaseSettings):
+    """
+    Класс для конфигурации индекса нечеткого поиска.
+
+    `index` выбирает структуру: `rapidfuzz` (пакетный подсчет расстояний по
+    корзинам первой буквы), `bktree` (BK-дерево) или `symspell` (индекс
+    удалений). Для `symspell` расстояние поиска не может превышать
+    `max_distance`, с которым строился индекс.
+    """
+
+    model_config = SettingsConfigDict(
+        env_prefix="FUZZY_", env_file=".env", extra="ignore"
+    )
+    index: Literal["rapidfuzz", "bktree", "symspell"] = "rapidfuzz"
+    max_distance: int = 2
+    prefix_length: int = 7
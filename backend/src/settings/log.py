@@ -21,6 +21,14 @@ class Metrics:
     Атрибуты:
         - `http_requests_latency`: Гистограмма для измерения латентности
             HTTP-запросов с заранее определенными интервалами.
+        - `matcher_queue_depth`: Количество задач поиска лекарств, ожидающих
+            или выполняющихся в пуле.
+        - `result_cache_hits`, `result_cache_misses`,
+            `result_cache_evictions`: Счетчики кэша результатов поиска.
+        - `shared_cache_hits`, `shared_cache_misses`,
+            `shared_cache_evictions`: Счетчики общего для воркеров кэша.
+        - `drug_info_batches`, `drug_info_batch_size`: Число пакетных
+            запросов сведений о лекарствах и число поисков в пакете.
     """
 
     http_requests_latency = aioprometheus.Histogram(
@@ -29,6 +37,52 @@ class Metrics:
         buckets=[50, 100, 300, 500, 1000, 2000, 5000, 10000],
     )
 
+    matcher_queue_depth = aioprometheus.Gauge(
+        "matcher_queue_depth",
+        "Задачи поиска лекарств в пуле исполнителя",
+    )
+
+    result_cache_hits = aioprometheus.Counter(
+        "result_cache_hits",
+        "Попадания в кэш результатов поиска лекарств",
+    )
+
+    result_cache_misses = aioprometheus.Counter(
+        "result_cache_misses",
+        "Промахи кэша результатов поиска лекарств",
+    )
+
+    result_cache_evictions = aioprometheus.Counter(
+        "result_cache_evictions",
+        "Вытеснения из кэша результатов поиска лекарств",
+    )
+
+    shared_cache_hits = aioprometheus.Counter(
+        "shared_cache_hits",
+        "Попадания в общий кэш результатов",
+    )
+
+    shared_cache_misses = aioprometheus.Counter(
+        "shared_cache_misses",
+        "Промахи общего кэша результатов",
+    )
+
+    shared_cache_evictions = aioprometheus.Counter(
+        "shared_cache_evictions",
+        "Вытеснения из общего кэша результатов",
+    )
+
+    drug_info_batches = aioprometheus.Counter(
+        "drug_info_batches",
+        "Пакетные запросы сведений о лекарствах к БД",
+    )
+
+    drug_info_batch_size = aioprometheus.Histogram(
+        "drug_info_batch_size",
+        "Число поисков в пакетном запросе сведений о лекарствах",
+        buckets=[1, 2, 5, 10, 20, 50, 100],
+    )
+
     @staticmethod
     def render() -> tuple[bytes, dict]:  # noqa: WPS605
         """
@@ -0,0 +1,40 @@
+"""Модуль для конфигурации исполнения поиска лекарств в тексте."""
+
+from typing import Literal
+
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class MatcherConfig(BaseSettings):
+    """
+    Класс для конфигурации пула, в котором выполняется поиск лекарств.
+
+    `executor` выбирает, где выполняется CPU-нагрузка (разбор spaCy, автомат,
+    нечеткий поиск): `inline` - в цикле событий, `thread` - в пуле потоков,
+    `process` - в пуле процессов с заранее загруженными spaCy и автоматом.
+
+    `batch_size` и `batch_n_process` передаются в `nlp.pipe` пакетного
+    анализа. `batch_n_process` больше 1 не работает в режиме `process`:
+    процессы пула не могут запускать собственные процессы.
+
+    `stream_chunk_chars` - максимальная длина сегмента документа при
+    потоковом анализе.
+
+    `automaton_format` выбирает формат автомата на диске: `pickle` - модель
+    `automaton_path` с pickle-значениями, `mapped` - артефакт
+    `automaton_artifact` с целочисленными значениями и таблицей записей,
+    отображаемой в память всеми воркерами.
+    """
+
+    model_config = SettingsConfigDict(
+        env_prefix="MATCHER_", env_file=".env", extra="ignore"
+    )
+    executor: Literal["inline", "thread", "process"] = "thread"
+    workers: int = 2
+    batch_size: int = 64
+    batch_n_process: int = 1
+    batch_max_texts: int = 1000
+    stream_chunk_chars: int = 20000
+    automaton_format: Literal["pickle", "mapped"] = "mapped"
+    automaton_path: str = "./assets/aho_corasick_medications3.model"
+    automaton_artifact: str = "./assets/aho_corasick_medications3.automaton"
@@ -0,0 +1,22 @@
+"""Модуль для конфигурации лингвистической обработки текста."""
+
+from typing import Literal
+
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class NlpConfig(BaseSettings):
+    """
+    Класс для конфигурации лемматизатора из переменных окружения и .env файла.
+
+    Словарь автомата строится тем же лемматизатором, что и разбор запросов,
+    поэтому после смены `lemmatizer` автомат нужно перестроить.
+    """
+
+    model_config = SettingsConfigDict(
+        env_prefix="NLP_", env_file=".env", extra="ignore"
+    )
+    lemmatizer: Literal["spacy", "pymorphy3"] = "spacy"
+    spacy_model: str = "ru_core_news_sm"
+    spacy_exclude: list[str] = ["parser", "ner"]
+    cache_size: int = 100000
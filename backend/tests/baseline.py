@@ -0,0 +1,115 @@
+"""Эталонный поиск: перебор окон и BK-дерево на каждый токен."""
+
+from rapidfuzz.distance import DamerauLevenshtein
+
+from src.application.services.aho import max_phrase_tokens
+from src.application.services.fuzzy import build_bk_tree
+from src.application.services.spans import resolve_spans
+
+
+def exact_candidates(automaton, doc, lemmas, window=None):
+    """Автомат прогоняется по каждому окну отдельно."""
+    if window is None:
+        window = max_phrase_tokens(automaton)
+    candidates = []
+    for start_idx in range(len(doc)):
+        if not doc[start_idx].text.isalpha():
+            continue
+        for end_idx in range(
+            start_idx + 1, min(start_idx + window, len(doc)) + 1
+        ):
+            phrase = " ".join(lemmas[start_idx:end_idx]).strip()
+            for _, (value, drug_id, word) in automaton.iter(phrase):
+                similarity = DamerauLevenshtein.normalized_similarity(
+                    value, phrase
+                )
+                if similarity < 0.8:
+                    continue
+                end = doc[end_idx - 1].idx + len(doc[end_idx - 1].text)
+                candidates.append(
+                    (
+                        doc[start_idx].idx,
+                        end,
+                        str(doc[start_idx:end_idx]),
+                        drug_id,
+                        "lightgreen",
+                        word,
+                    )
+                )
+    return candidates
+
+
+def resolve(candidates):
+    return list(
+        resolve_spans(
+            dict.fromkeys(candidates),
+            bounds=lambda match: (match[0], match[1]),
+            priority=lambda match: (-len(match[2].split()), match[0]),
+        )
+    )
+
+
+def fuzzy_matches(drugs, doc, lemmas, existing):
+    """Каждый токен ищется в BK-дереве, как до пакетного поиска."""
+    bk_tree = build_bk_tree(drugs)
+    matches = []
+    found = set()
+    for token, lemma in zip(doc, lemmas):
+        if not token.text.isalpha() or len(token.text) < 3:
+            continue
+        word = lemma.strip()
+        if not word:
+            continue
+        start, end = token.idx, token.idx + len(token.text)
+        if any(m[0] <= start < m[1] or m[0] < end <= m[1] for m in existing):
+            continue
+        best = None
+        for name, drug_id, dist in bk_tree.search(word, 1):
+            if name[0] == word[0] and (best is None or dist < best[1]):
+                best = (drug_id, dist)
+        if best and best[0] not in found:
+            matches.append(
+                (start, end, token.text, best[0], "yellow", token.text)
+            )
+            found.add(best[0])
+    return matches
+
+
+def find_matches(automaton, drugs, doc, lemmas, fuzzy=False):
+    matches = resolve(exact_candidates(automaton, doc, lemmas))
+    if fuzzy:
+        matches += fuzzy_matches(drugs, doc, lemmas, matches)
+    return sorted(matches)
+
+
+def highlight(text, matches):
+    """Подсветка заменой подстрок со сдвигом, как до сборки из кусков."""
+    from src.application.services.text_processing import (
+        TextProcessingService,
+    )
+
+    offset = 0
+    for start, end, word, _, color, _ in sorted(matches):
+        words = word.split()
+        preposition = ""
+        highlighted = word
+        if (
+            words
+            and words[0].lower()
+            in TextProcessingService._prepositions_to_exclude
+        ):
+            preposition = words[0] + " "
+            highlighted = " ".join(words[1:])
+        style = f"background-color: {color}; font-weight: bold;"
+        if highlighted and highlighted[-1] in ".,-":
+            replacement = (
+                f'{preposition}<span style="{style}">{highlighted[:-1]}'
+                f"</span>{highlighted[-1]}"
+            )
+        else:
+            replacement = (
+                f'{preposition}<span style="{style}">{highlighted}</span>'
+            )
+        text = text[: start + offset] + replacement + text[end + offset :]
+        offset += len(replacement) - (end - start)
+    return text
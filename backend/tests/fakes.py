@@ -0,0 +1,76 @@
+"""Заглушки зависимостей, которым в тестах нужна БД."""
+
+from src.application.services.text_processing import TextProcessingService
+
+
+class NoInfoService(TextProcessingService):
+    """Сервис поиска без сведений о лекарствах из БД."""
+
+    def __init__(self):
+        super().__init__(repo=None)
+
+    async def _get_drug_info(self, drug_ids, words, own_session=False):
+        return []
+
+
+class FakeSession:
+    """Асинхронная сессия без соединения с БД."""
+
+    def __init__(self):
+        self.execution_options = None
+
+    async def __aenter__(self):
+        return self
+
+    def begin(self):
+        return self
+
+    async def connection(self, execution_options=None):
+        self.execution_options = execution_options
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+
+class FakeDrugsRepo:
+    """Репозиторий лекарств поверх списка строк справочника."""
+
+    drugs = []
+
+    def __init__(self, session=None):
+        pass
+
+    async def get_catalog(self, ids=None):
+        if ids is None:
+            return list(self.drugs)
+        return [drug for drug in self.drugs if drug.id in ids]
+
+
+class FakeChangesRepo:
+    """
+    Журнал изменений: последняя версия, артефакт, измененные лекарства и
+    версия записи `catalog` (0, если ее нет).
+    """
+
+    latest = 0
+    artifact = 0
+    changed = {}
+    reloaded = 0
+
+    def __init__(self, session=None):
+        pass
+
+    async def latest_version(self):
+        return self.latest
+
+    async def artifact_version(self):
+        return self.artifact
+
+    async def changed_drugs(self, version):
+        if self.reloaded > version:
+            return None
+        return [
+            drug_id
+            for drug_id, changed_at in self.changed.items()
+            if changed_at > version
+        ]
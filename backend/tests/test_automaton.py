@@ -0,0 +1,168 @@
+import pickle
+import uuid
+
+import pytest
+
+from src.application.services import automaton as artifact
+from src.application.services import layered
+from src.application.services.aho import (
+    AhoCorasickService,
+    max_phrase_tokens,
+)
+from src.application.services.automaton import (
+    MappedAutomaton,
+    artifact_version,
+    load_artifact,
+    publish_artifact,
+    save_artifact,
+)
+from src.application.services.layered import LayeredAutomaton
+from src.application.services.text_processing import TextProcessingService
+from tests.conftest import make_drug
+
+TEXT = "Принимал аспирин кардио, но-шпу и нурофен экспресс форте."
+
+
+@pytest.fixture
+def mapped(automaton, tmp_path):
+    path = str(tmp_path / "automaton.artifact")
+    save_artifact(automaton, path)
+    return load_artifact(path)
+
+
+def test_artifact_finds_same_hits(automaton, mapped):
+    text = "аспирин кардио и нурофен экспресс форте, но - шпа"
+
+    assert list(mapped.iter(text)) == list(automaton.iter(text))
+    assert dict(mapped.items()) == dict(automaton.items())
+
+
+def test_window_comes_from_header(automaton, mapped, monkeypatch):
+    def values(self):
+        raise AssertionError("the whole table must not be decoded")
+
+    monkeypatch.setattr(MappedAutomaton, "values", values)
+
+    assert mapped.phrase_tokens == 3
+    assert max_phrase_tokens(LayeredAutomaton(mapped)) == 3
+    assert TextProcessingService.find_matches(
+        LayeredAutomaton(mapped), None, TEXT
+    ) == TextProcessingService.find_matches(automaton, None, TEXT)
+
+
+def test_layered_window_is_counted_once_per_base(automaton, monkeypatch):
+    counted = []
+    count = layered.max_phrase_tokens
+
+    def counting(automaton):
+        counted.append(automaton)
+        return count(automaton)
+
+    monkeypatch.setattr(layered, "max_phrase_tokens", counting)
+    longer = make_drug("Нурофен Экспресс Форте Плюс Ультра Макс Лонг")
+
+    base = LayeredAutomaton(automaton)
+    changed = base.with_changes({longer.id: longer})
+
+    assert counted.count(automaton) == 1
+    assert base.phrase_tokens == 3
+    assert changed.phrase_tokens == 7
+    assert changed.with_changes({longer.id: None}).phrase_tokens == 3
+
+
+def test_entries_are_not_kept_in_process_memory(mapped):
+    before = dict(vars(mapped))
+
+    for _ in mapped.iter(TEXT.lower()):
+        pass
+
+    assert vars(mapped) == before
+
+
+def test_extra_entries_extend_window(mapped):
+    long_name = "один два три четыре пять шесть"
+
+    mapped.add_word(long_name, (long_name, uuid.uuid4(), long_name))
+
+    assert mapped.phrase_tokens == 6
+    assert pickle.loads(pickle.dumps(mapped)).phrase_tokens == 6
+
+
+def test_reads_first_version_artifacts(automaton, tmp_path):
+    path = tmp_path / "automaton.artifact"
+    save_artifact(automaton, str(path))
+    data = path.read_bytes()
+    _, size, count, _, _ = artifact._HEADER.unpack_from(data)
+    path.write_bytes(
+        artifact._HEADER_V1.pack(artifact._MAGIC_V1, size, count)
+        + data[artifact._HEADER.size :]
+    )
+
+    legacy = load_artifact(str(path))
+
+    assert legacy.phrase_tokens == 3
+    assert list(legacy.iter(TEXT.lower())) == list(
+        automaton.iter(TEXT.lower())
+    )
+
+
+def test_publish_keeps_newer_artifact(automaton, tmp_path, monkeypatch):
+    path = str(tmp_path / "automaton.artifact")
+    monkeypatch.setattr(
+        artifact.settings.matcher, "automaton_artifact", path
+    )
+    stale = AhoCorasickService.build_automaton([])
+
+    assert artifact_version(path) == -1
+    publish_artifact(automaton, 5)
+    published = publish_artifact(stale, 3)
+
+    assert artifact_version(path) == 5
+    assert dict(published.items()) == dict(automaton.items())
+    publish_artifact(stale, 8)
+    assert artifact_version(path) == 8
+
+
+def test_published_artifact_outlives_next_publish(
+    automaton, tmp_path, monkeypatch
+):
+    path = str(tmp_path / "automaton.artifact")
+    monkeypatch.setattr(
+        artifact.settings.matcher, "automaton_artifact", path
+    )
+    published = pickle.dumps(publish_artifact(automaton, 5))
+    stale = AhoCorasickService.build_automaton([])
+
+    for journal_version in (6, 7, 8):
+        publish_artifact(stale, journal_version)
+
+    assert sorted(p.name for p in tmp_path.glob("*.v*")) == [
+        "automaton.artifact.v7",
+        "automaton.artifact.v8",
+    ]
+    assert load_artifact(path).phrase_tokens == 1
+    with pytest.raises(FileNotFoundError):
+        pickle.loads(published)
+    current = pickle.dumps(load_artifact(path))
+    publish_artifact(automaton, 9)
+    assert dict(pickle.loads(current).items()) == {}
+
+
+def test_unpickle_rejects_replaced_file(automaton, mapped, tmp_path):
+    state = pickle.dumps(mapped)
+    save_artifact(
+        AhoCorasickService.build_automaton([]),
+        str(tmp_path / "automaton.artifact"),
+        journal_version=7,
+    )
+
+    with pytest.raises(ValueError, match="was replaced"):
+        pickle.loads(state)
+
+
+def test_rejects_foreign_files(tmp_path):
+    path = tmp_path / "automaton.artifact"
+    path.write_bytes(b"\0" * 64)
+
+    with pytest.raises(ValueError):
+        load_artifact(str(path))
@@ -0,0 +1,197 @@
+import asyncio
+
+import pytest
+from starlette.datastructures import State
+
+from src.application.services import catalog as catalog_module
+from src.application.services.aho import AhoCorasickService
+from src.application.services.catalog import (
+    CatalogEntry,
+    DrugCatalog,
+    catalog_fingerprint,
+    load_catalog,
+    publish_catalog,
+    refresh_catalog,
+)
+from tests.conftest import make_drug
+from tests.fakes import FakeChangesRepo, FakeDrugsRepo, FakeSession
+
+
+def test_fingerprint_ignores_row_order(drugs):
+    assert catalog_fingerprint(tuple(drugs)) == catalog_fingerprint(
+        tuple(reversed(drugs))
+    )
+
+
+def test_fingerprint_follows_content(drugs):
+    renamed = CatalogEntry(drugs[0].id, "Аспирин", drugs[0].inn)
+
+    assert catalog_fingerprint(tuple(drugs)) != catalog_fingerprint(
+        (renamed, *drugs[1:])
+    )
+
+
+def test_catalog_changes_update_fingerprint_incrementally(drugs):
+    catalog = DrugCatalog(
+        1, {drug.id: drug for drug in drugs}, catalog_fingerprint(drugs), 3
+    )
+    renamed = CatalogEntry(drugs[0].id, "Аспирин", drugs[0].inn)
+    added = make_drug("Кардиомагнил")
+
+    changed = catalog.with_changes(
+        {renamed.id: renamed, drugs[2].id: None, added.id: added}, 4
+    )
+
+    expected = [renamed, drugs[1], *drugs[3:], added]
+    assert (changed.version, changed.journal_version) == (2, 4)
+    assert changed.drugs == {drug.id: drug for drug in expected}
+    assert changed.fingerprint == catalog_fingerprint(expected)
+    assert catalog.drugs[drugs[2].id] == drugs[2]
+
+
+@pytest.fixture
+def journal(monkeypatch, drugs):
+    """Справочник и журнал изменений без БД."""
+
+    class Repo(FakeDrugsRepo):
+        pass
+
+    class ChangesRepo(FakeChangesRepo):
+        pass
+
+    Repo.drugs = drugs
+    monkeypatch.setattr(catalog_module, "DrugsRepo", Repo)
+    monkeypatch.setattr(catalog_module, "CatalogChangesRepo", ChangesRepo)
+    return ChangesRepo
+
+
+def test_load_catalog_reads_journal_in_one_snapshot(journal, drugs):
+    journal.latest = 7
+    journal.artifact = 4
+    journal.changed = {drugs[0].id: 3, drugs[1].id: 5}
+    session = FakeSession()
+
+    snapshot = asyncio.run(load_catalog(session, version=3))
+
+    assert session.execution_options == {"isolation_level": "REPEATABLE READ"}
+    assert snapshot.catalog.version == 3
+    assert snapshot.catalog.journal_version == 7
+    assert snapshot.catalog.drugs == {drug.id: drug for drug in drugs}
+    assert snapshot.catalog.fingerprint == catalog_fingerprint(drugs)
+    assert snapshot.base_version == 4
+    assert snapshot.changed_ids == [drugs[1].id]
+
+
+def test_bulk_load_rebuilds_base_automaton(journal, monkeypatch, drugs):
+    journal.latest = 7
+    journal.artifact = 4
+    journal.reloaded = 6
+    monkeypatch.setattr(catalog_module, "async_session_factory", FakeSession)
+    state = State()
+    stale = AhoCorasickService.build_automaton([])
+
+    catalog = asyncio.run(refresh_catalog(state, stale))
+
+    assert catalog.journal_version == 7
+    assert state.automaton.base is not stale
+    assert state.automaton.base_version == 7
+    assert state.automaton.delta_size == 0
+    assert {drug_id for _, drug_id, _ in state.automaton.values()} == {
+        drug.id for drug in drugs
+    }
+
+
+def test_load_catalog_normalizes_rows(journal, drugs):
+    class Row:
+        def __init__(self, drug):
+            self.id, self.trade_name, self.inn = drug
+
+    catalog_module.DrugsRepo.drugs = [Row(drug) for drug in drugs]
+
+    snapshot = asyncio.run(load_catalog(FakeSession(), base_version=0))
+
+    assert snapshot.catalog.drugs == {drug.id: drug for drug in drugs}
+    assert all(
+        type(drug) is CatalogEntry
+        for drug in snapshot.catalog.drugs.values()
+    )
+
+
+class FakeMatcher:
+    def __init__(self):
+        self.reloads = []
+
+    async def reload(self, automaton, fuzzy_index, catalog):
+        self.reloads.append((automaton, fuzzy_index, catalog))
+
+
+def test_publish_builds_fuzzy_index_once_per_version(drugs, automaton):
+    state = State()
+    state.matcher = FakeMatcher()
+    catalog = DrugCatalog(
+        1, {drug.id: drug for drug in drugs}, catalog_fingerprint(drugs)
+    )
+
+    asyncio.run(publish_catalog(state, catalog, automaton))
+
+    assert state.catalog is catalog
+    assert state.matcher.reloads == [
+        (state.automaton, state.fuzzy_index, catalog)
+    ]
+    assert state.automaton.base is automaton
+    assert {
+        (word, drug_id)
+        for word, drug_id, _ in state.fuzzy_index.search("дротаверин", 0)
+    } == {("дротаверин", drugs[2].id)}
+
+
+class FakeRuleCache:
+    def __init__(self):
+        self.refreshed = []
+
+    async def refresh(self, drug_ids):
+        self.refreshed.append(set(drug_ids))
+
+
+class FakeFragments:
+    def __init__(self):
+        self.discarded = []
+
+    def discard(self, drug_ids):
+        self.discarded.append(set(drug_ids))
+
+
+def test_publish_changes_patches_only_changed_drugs(
+    monkeypatch, drugs, automaton
+):
+    state = State()
+    state.matcher = FakeMatcher()
+    catalog = DrugCatalog(
+        1, {drug.id: drug for drug in drugs}, catalog_fingerprint(drugs)
+    )
+    asyncio.run(publish_catalog(state, catalog, automaton))
+    state.rule_cache = FakeRuleCache()
+    state.drug_fragments = FakeFragments()
+
+    def rebuild(drugs):
+        raise AssertionError("fuzzy index rebuilt from the whole catalog")
+
+    monkeypatch.setattr(catalog_module, "build_fuzzy_index", rebuild)
+    renamed = CatalogEntry(drugs[2].id, "Дротаверин Форте", drugs[2].inn)
+    changes = {renamed.id: renamed, drugs[1].id: None}
+    changed = catalog.with_changes(changes, 1)
+
+    asyncio.run(
+        catalog_module.publish_changes(
+            state, changed, state.automaton.with_changes(changes), changes
+        )
+    )
+
+    assert state.catalog is changed
+    assert state.rule_cache.refreshed == [changes.keys()]
+    assert state.drug_fragments.discarded == [changes.keys()]
+    assert {
+        (word, drug_id)
+        for word, drug_id, _ in state.fuzzy_index.search("дротаверин", 0)
+    } == {("дротаверин", drugs[2].id)}
+    assert state.fuzzy_index.search("парацетамол", 0) == []
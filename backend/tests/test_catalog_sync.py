@@ -0,0 +1,412 @@
+import asyncio
+from collections import namedtuple
+
+import pytest
+from starlette.datastructures import State
+
+from src.application.services import catalog_sync
+from src.application.services.catalog import (
+    CatalogEntry,
+    DrugCatalog,
+    catalog_fingerprint,
+    publish_catalog,
+)
+from src.application.services.catalog_sync import (
+    CatalogListener,
+    CatalogUpdateQueue,
+)
+from src.application.services.fragments import DrugFragments
+from src.application.services.layered import LayeredAutomaton
+from src.infrastructure.repositories.drugs import DrugInfoRow
+from tests.fakes import FakeSession
+
+JournalRow = namedtuple(
+    "JournalRow",
+    "version kind drug_id base_version id trade_name inn",
+)
+
+
+def drug_row(version, drug):
+    return JournalRow(version, "drug", drug.id, None, *drug)
+
+
+class FakeMatcher:
+    async def reload(self, automaton, fuzzy_index, catalog):
+        pass
+
+
+class FakeUpdates:
+    def __init__(self, state):
+        self._state = state
+        self.submitted = []
+        self.reloads = []
+
+    def submit(self, drugs=(), deleted_ids=(), journal_version=0):
+        self.submitted.append(
+            (list(drugs), list(deleted_ids), journal_version)
+        )
+
+    async def flush(self):
+        pass
+
+    async def reload(self, automaton, base_version):
+        self.reloads.append((automaton, base_version))
+        self._state.catalog = DrugCatalog(2, {}, journal_version=12)
+        return self._state.catalog
+
+
+@pytest.fixture
+def journal(monkeypatch):
+    """Журнал изменений без БД: `get_since` отдает `journal.rows`."""
+
+    class ChangesRepo:
+        rows = []
+
+        def __init__(self, session):
+            pass
+
+        async def get_since(self, version):
+            return [row for row in self.rows if row.version > version]
+
+    def load_automaton():
+        return "artifact"
+
+    monkeypatch.setattr(catalog_sync, "async_session_factory", FakeSession)
+    monkeypatch.setattr(catalog_sync, "CatalogChangesRepo", ChangesRepo)
+    monkeypatch.setattr(catalog_sync, "load_automaton", load_automaton)
+    return ChangesRepo
+
+
+def listener_state(automaton, journal_version, base_version=0):
+    state = State()
+    state.catalog = DrugCatalog(1, {}, journal_version=journal_version)
+    state.automaton = LayeredAutomaton(automaton, base_version=base_version)
+    state.catalog_updates = FakeUpdates(state)
+    return state
+
+
+def sync(state, version):
+    async def run():
+        listener = CatalogListener(state)
+        listener._version = version
+        await listener.sync()
+        return listener._version
+
+    return asyncio.run(run())
+
+
+def test_listener_skips_versions_in_snapshot(journal, automaton, drugs):
+    journal.rows = [drug_row(4, drugs[0]), drug_row(6, drugs[1])]
+    state = listener_state(automaton, journal_version=5)
+
+    version = sync(state, 3)
+
+    assert version == 6
+    assert state.catalog_updates.submitted == [([drugs[1]], [], 6)]
+
+
+def test_listener_submits_deletes(journal, automaton, drugs):
+    journal.rows = [JournalRow(6, "drug", drugs[0].id, None, None, None, None)]
+    state = listener_state(automaton, journal_version=5)
+
+    sync(state, 5)
+
+    assert state.catalog_updates.submitted == [([], [drugs[0].id], 6)]
+
+
+def test_listener_skips_own_artifact(journal, automaton, drugs):
+    journal.rows = [
+        JournalRow(8, "artifact", None, 7, None, None, None),
+        drug_row(9, drugs[0]),
+    ]
+    state = listener_state(automaton, journal_version=7, base_version=7)
+
+    version = sync(state, 7)
+
+    assert version == 9
+    assert state.catalog_updates.reloads == []
+    assert state.catalog_updates.submitted == [([drugs[0]], [], 9)]
+
+
+def test_listener_reloads_newer_artifact(journal, automaton, drugs):
+    journal.rows = [
+        drug_row(9, drugs[0]),
+        JournalRow(11, "artifact", None, 10, None, None, None),
+    ]
+    state = listener_state(automaton, journal_version=7, base_version=7)
+
+    version = sync(state, 7)
+
+    assert state.catalog_updates.reloads == [("artifact", 10)]
+    assert state.catalog_updates.submitted == []
+    assert version == 12
+
+
+def test_listener_keeps_version_when_flush_fails(journal, automaton, drugs):
+    journal.rows = [drug_row(6, drugs[0])]
+    state = listener_state(automaton, journal_version=5)
+
+    async def failing_flush():
+        raise ConnectionError
+
+    state.catalog_updates.flush = failing_flush
+
+    async def run():
+        listener = CatalogListener(state)
+        listener._version = 5
+        with pytest.raises(ConnectionError):
+            await listener.sync()
+        return listener._version
+
+    assert asyncio.run(run()) == 5
+
+
+def test_listener_rebuilds_after_bulk_load(journal, automaton, drugs):
+    journal.rows = [
+        drug_row(6, drugs[0]),
+        JournalRow(8, "catalog", None, None, None, None, None),
+    ]
+    state = listener_state(automaton, journal_version=5, base_version=5)
+    state.rule_cache = FakeRuleCache()
+
+    version = sync(state, 5)
+
+    assert state.catalog_updates.reloads == [(automaton, 5)]
+    assert state.catalog_updates.submitted == []
+    assert state.rule_cache.reloads == 1
+    assert version == 12
+
+
+@pytest.fixture
+def queue_state(monkeypatch, automaton, drugs):
+    monkeypatch.setattr(catalog_sync.settings.catalog, "debounce_seconds", 0)
+    monkeypatch.setattr(
+        catalog_sync.settings.matcher, "automaton_format", "pickle"
+    )
+    state = State()
+    state.matcher = FakeMatcher()
+    catalog = DrugCatalog(
+        1, {drug.id: drug for drug in drugs}, catalog_fingerprint(drugs), 5
+    )
+    asyncio.run(publish_catalog(state, catalog, automaton))
+    return state
+
+
+def test_queue_skips_changes_already_in_snapshot(queue_state, drugs):
+    async def run():
+        updates = CatalogUpdateQueue(queue_state)
+        updates.submit(drugs=[drug_row(6, drugs[0])], journal_version=6)
+        await updates.flush()
+
+    asyncio.run(run())
+
+    assert queue_state.catalog.version == 1
+    assert queue_state.catalog.journal_version == 6
+    assert queue_state.automaton.delta_size == 0
+
+
+def test_queue_publishes_normalized_rows(queue_state, drugs):
+    renamed = CatalogEntry(drugs[0].id, "Аспирин", drugs[0].inn)
+
+    async def run():
+        updates = CatalogUpdateQueue(queue_state)
+        updates.submit(drugs=[drug_row(6, renamed)], journal_version=6)
+        await updates.flush()
+
+    asyncio.run(run())
+
+    catalog = queue_state.catalog
+    assert (catalog.version, catalog.journal_version) == (2, 6)
+    assert catalog.drugs[renamed.id] == renamed
+    assert catalog.fingerprint == catalog_fingerprint(
+        catalog.drugs.values()
+    )
+    assert all(type(drug) is CatalogEntry for drug in catalog.drugs.values())
+    assert queue_state.automaton.delta_drugs == {renamed.id: renamed}
+
+
+def test_compaction_keeps_no_changes_in_delta(queue_state, drugs):
+    renamed = CatalogEntry(drugs[0].id, "Аспирин", drugs[0].inn)
+
+    async def run():
+        updates = CatalogUpdateQueue(queue_state)
+        updates.submit(drugs=[drug_row(6, renamed)], journal_version=6)
+        await updates.flush()
+        await updates._compact()
+
+    asyncio.run(run())
+
+    automaton = queue_state.automaton
+    assert automaton.delta_size == 0
+    assert automaton.base_version == 6
+    assert ("аспирин", renamed.id, "Аспирин") in set(automaton.values())
+
+
+def test_queue_coalesces_changes_into_one_publish(
+    queue_state, monkeypatch, drugs
+):
+    published = []
+    publish = catalog_sync.publish_changes
+
+    async def counting_publish(state, catalog, automaton, changes):
+        published.append(catalog.version)
+        return await publish(state, catalog, automaton, changes)
+
+    monkeypatch.setattr(catalog_sync, "publish_changes", counting_publish)
+    first = CatalogEntry(drugs[0].id, "Аспирин", drugs[0].inn)
+    last = CatalogEntry(drugs[0].id, "Кардиомагнил", drugs[0].inn)
+
+    async def run():
+        updates = CatalogUpdateQueue(queue_state)
+        updates.submit(drugs=[first])
+        updates.submit(deleted_ids=[drugs[2].id])
+        updates.submit(drugs=[last])
+        await updates.flush()
+
+    asyncio.run(run())
+
+    assert published == [2]
+    assert queue_state.catalog.drugs[last.id] == last
+    assert drugs[2].id not in queue_state.catalog.drugs
+
+
+def test_failed_batch_is_retried_with_later_changes(
+    queue_state, monkeypatch, drugs
+):
+    monkeypatch.setattr(catalog_sync.settings.catalog, "retry_seconds", 0)
+    publish = catalog_sync.publish_changes
+    first = CatalogEntry(drugs[0].id, "Аспирин", drugs[0].inn)
+    last = CatalogEntry(drugs[0].id, "Кардиомагнил", drugs[0].inn)
+    updates = CatalogUpdateQueue(queue_state)
+    published = []
+
+    async def failing_publish(state, catalog, automaton, changes):
+        published.append(dict(changes))
+        if len(published) == 1:
+            updates.submit(drugs=[last], journal_version=7)
+            raise ConnectionError
+        return await publish(state, catalog, automaton, changes)
+
+    monkeypatch.setattr(catalog_sync, "publish_changes", failing_publish)
+
+    async def run():
+        updates.submit(
+            drugs=[first], deleted_ids=[drugs[2].id], journal_version=6
+        )
+        await updates.flush()
+
+    asyncio.run(run())
+
+    assert published[1] == {first.id: last, drugs[2].id: None}
+    catalog = queue_state.catalog
+    assert (catalog.version, catalog.journal_version) == (2, 7)
+    assert catalog.drugs[last.id] == last
+    assert drugs[2].id not in catalog.drugs
+
+
+def test_flush_reports_batch_that_was_not_applied(
+    queue_state, monkeypatch, drugs
+):
+    monkeypatch.setattr(catalog_sync.settings.catalog, "retry_seconds", 0)
+    monkeypatch.setattr(catalog_sync.settings.catalog, "apply_retries", 1)
+    publish = catalog_sync.publish_changes
+    attempts = []
+
+    async def failing_publish(state, catalog, automaton, changes):
+        attempts.append(len(attempts))
+        if len(attempts) <= 2:
+            raise ConnectionError
+        return await publish(state, catalog, automaton, changes)
+
+    monkeypatch.setattr(catalog_sync, "publish_changes", failing_publish)
+    renamed = CatalogEntry(drugs[0].id, "Аспирин", drugs[0].inn)
+
+    async def run():
+        updates = CatalogUpdateQueue(queue_state)
+        updates.submit(drugs=[renamed], journal_version=6)
+        with pytest.raises(ConnectionError):
+            await updates.flush()
+        assert queue_state.catalog.drugs[renamed.id] != renamed
+        await updates.flush()
+
+    asyncio.run(run())
+
+    assert len(attempts) == 3
+    assert queue_state.catalog.drugs[renamed.id] == renamed
+    assert queue_state.catalog.journal_version == 6
+
+
+def test_deleted_drug_loses_lemmatized_keys(queue_state, automaton, drugs):
+    text = "но-шпа и дротаверин"
+    assert any(
+        value[1] == drugs[2].id for _, value in automaton.iter(text)
+    )
+
+    async def run():
+        updates = CatalogUpdateQueue(queue_state)
+        updates.submit(deleted_ids=[drugs[2].id])
+        await updates.flush()
+
+    asyncio.run(run())
+
+    hits = list(queue_state.automaton.iter(text))
+    assert all(value[1] != drugs[2].id for _, value in hits)
+
+
+class FakeRuleCache:
+    def __init__(self):
+        self.refreshed = []
+        self.reloads = 0
+
+    async def refresh(self, drug_ids):
+        self.refreshed.append(set(drug_ids))
+
+    def reload(self):
+        self.reloads += 1
+
+
+class FakeResultCache:
+    def __init__(self):
+        self.calls = []
+
+    def clear(self):
+        self.calls.append("clear")
+
+    def invalidate(self):
+        self.calls.append("invalidate")
+
+
+def test_listener_refreshes_rules_of_changed_drugs(journal, automaton, drugs):
+    journal.rows = [
+        JournalRow(6, "rules", drugs[0].id, None, None, None, None),
+        JournalRow(7, "rules", drugs[1].id, None, None, None, None),
+    ]
+    state = listener_state(automaton, journal_version=5)
+    state.rule_cache = FakeRuleCache()
+    state.result_cache = FakeResultCache()
+    state.drug_fragments = DrugFragments(10)
+    state.drug_fragments.get(
+        DrugInfoRow(*drug, obligation=None) for drug in drugs
+    )
+
+    sync(state, 5)
+
+    assert state.rule_cache.refreshed == [{drugs[0].id, drugs[1].id}]
+    assert state.rule_cache.reloads == 0
+    # Общий уровень кэша результатов сбрасывается вместе с локальным.
+    assert state.result_cache.calls == ["invalidate"]
+    assert len(state.drug_fragments) == len(drugs) - 2
+
+
+def test_listener_reloads_rules_after_truncate(journal, automaton, drugs):
+    journal.rows = [
+        JournalRow(6, "rules", drugs[0].id, None, None, None, None),
+        JournalRow(7, "rules", None, None, None, None, None),
+    ]
+    state = listener_state(automaton, journal_version=5)
+    state.rule_cache = FakeRuleCache()
+
+    sync(state, 5)
+
+    assert state.rule_cache.refreshed == []
+    assert state.rule_cache.reloads == 1
@@ -0,0 +1,79 @@
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+
+from sqlalchemy.dialects import postgresql
+
+from src.infrastructure.repositories.drugs import (
+    DrugInfoRow,
+    drug_rules_statement,
+    expand_drug_rules,
+    is_valid,
+)
+from tests.conftest import make_drug
+
+DrugRulesRecord = namedtuple(
+    "DrugRulesRecord", "drug_id trade_name inn obligation rules"
+)
+
+NOW = datetime(2025, 10, 18, 12, 0)
+
+
+def rule_row(start, end):
+    drug = make_drug("Парацетамол", "парацетамол")
+    return DrugInfoRow(
+        *drug,
+        obligation=None,
+        valid_start_date=start,
+        valid_end_date=end,
+    )
+
+
+def test_rules_are_valid_between_their_dates():
+    day = timedelta(days=1)
+
+    assert is_valid(rule_row(NOW - day, NOW + day), NOW)
+    assert is_valid(rule_row(NOW, NOW), NOW)
+    assert not is_valid(rule_row(NOW + day, NOW + 2 * day), NOW)
+    assert not is_valid(rule_row(NOW - 2 * day, NOW - day), NOW)
+
+
+def test_open_ended_rules_are_not_valid():
+    assert is_valid(rule_row(None, None), NOW)
+    assert not is_valid(rule_row(NOW, None), NOW)
+    assert not is_valid(rule_row(None, NOW), NOW)
+
+
+def test_drug_info_lookup_uses_indexed_columns_without_joins():
+    drug = make_drug("Парацетамол", "парацетамол")
+    statement = drug_rules_statement([drug.id], ["парацетамол"])
+
+    sql = str(statement.compile(dialect=postgresql.dialect()))
+
+    assert "JOIN" not in sql
+    assert "drug_rules.drug_id IN" in sql
+    assert "drug_rules.trade_name IN" in sql
+    assert "drug_rules.inn IN" in sql
+
+
+def test_drug_rules_record_expands_to_one_row_per_rule():
+    drug = make_drug("Парацетамол", "парацетамол")
+    rule = {
+        "source_countries": "РФ",
+        "receiver": "Росздравнадзор",
+        "deadline_to_submit": "2025-10-20",
+        "format": None,
+        "other_procedures": None,
+        "valid_start_date": "2025-01-01T00:00:00",
+        "valid_end_date": None,
+        "type_of_event": "Серьезная НР",
+    }
+    record = DrugRulesRecord(*drug, obligation="да", rules=[rule, rule])
+    empty = DrugRulesRecord(*drug, obligation=None, rules=[])
+
+    rows = expand_drug_rules(record)
+
+    assert len(rows) == 2
+    assert rows[0].deadline_to_submit == date(2025, 10, 20)
+    assert rows[0].valid_start_date == datetime(2025, 1, 1)
+    assert rows[0].type_of_event == "Серьезная НР"
+    assert expand_drug_rules(empty) == [DrugInfoRow(*drug, obligation=None)]
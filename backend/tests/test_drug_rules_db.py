@@ -0,0 +1,143 @@
+"""
+Триггеры `drug_rules` на живой БД.
+
+Выполняются, только если задан `TEST_DATABASE_URL` - строка подключения к
+пустой БД, которую тесты мигрируют и очищают.
+"""
+
+import asyncio
+import os
+import pathlib
+import uuid
+
+import asyncpg
+import pytest
+from alembic import command
+from alembic.config import Config
+
+from src.settings import settings
+
+TEST_DATABASE_URL = os.environ.get("TEST_DATABASE_URL")
+
+pytestmark = pytest.mark.skipif(
+    not TEST_DATABASE_URL, reason="TEST_DATABASE_URL не задан"
+)
+
+ALEMBIC_INI = pathlib.Path(__file__).parent.parent / "alembic.ini"
+RULE_IDS = (uuid.uuid4(), uuid.uuid4())
+
+
+@pytest.fixture(scope="module")
+def dsn():
+    dsn = TEST_DATABASE_URL.replace("+asyncpg", "")
+    connection_string = settings.db.connection_string
+    settings.db.connection_string = dsn.replace(
+        "postgresql://", "postgresql+asyncpg://", 1
+    )
+    try:
+        command.upgrade(Config(str(ALEMBIC_INI)), "head")
+    finally:
+        settings.db.connection_string = connection_string
+    return dsn
+
+
+@pytest.fixture
+def drug_id(dsn):
+    """Лекарство с двумя правилами без связей на очищенных таблицах."""
+
+    async def setup():
+        connection = await asyncpg.connect(dsn)
+        try:
+            await connection.execute(
+                "TRUNCATE submission_rule_drug, submission_rules, "
+                "type_of_event, drugs CASCADE"
+            )
+            drug_id = uuid.uuid4()
+            await connection.execute(
+                "INSERT INTO drugs (id, trade_name) VALUES ($1, $2)",
+                drug_id,
+                "Парацетамол",
+            )
+            for rule_id in RULE_IDS:
+                await connection.execute(
+                    "INSERT INTO submission_rules (id) VALUES ($1)", rule_id
+                )
+            return drug_id
+        finally:
+            await connection.close()
+
+    return asyncio.run(setup())
+
+
+async def drug_rules(connection, drug_id):
+    return await connection.fetchval(
+        "SELECT jsonb_array_length(rules) FROM drug_rules WHERE drug_id = $1",
+        drug_id,
+    )
+
+
+async def link(connection, rule_id, drug_id):
+    await connection.execute(
+        "INSERT INTO submission_rule_drug (submission_rule_id, drug_id) "
+        "VALUES ($1, $2)",
+        rule_id,
+        drug_id,
+    )
+
+
+def test_concurrent_rule_links_are_not_lost(dsn, drug_id):
+    async def run():
+        first = await asyncpg.connect(dsn)
+        second = await asyncpg.connect(dsn)
+        try:
+            first_tx = first.transaction()
+            second_tx = second.transaction()
+            await first_tx.start()
+            await second_tx.start()
+            await link(first, RULE_IDS[0], drug_id)
+            # Ждет блокировки лекарства до фиксации первой транзакции.
+            pending = asyncio.create_task(link(second, RULE_IDS[1], drug_id))
+            await asyncio.sleep(0.2)
+            assert not pending.done()
+            await first_tx.commit()
+            await pending
+            await second_tx.commit()
+            return await drug_rules(first, drug_id)
+        finally:
+            await first.close()
+            await second.close()
+
+    assert asyncio.run(run()) == 2
+
+
+def test_truncate_clears_rules(dsn, drug_id):
+    async def run():
+        connection = await asyncpg.connect(dsn)
+        try:
+            for rule_id in RULE_IDS:
+                await link(connection, rule_id, drug_id)
+            before = await drug_rules(connection, drug_id)
+            await connection.execute(
+                "TRUNCATE submission_rule_drug, submission_rules"
+            )
+            return before, await drug_rules(connection, drug_id)
+        finally:
+            await connection.close()
+
+    assert asyncio.run(run()) == (2, 0)
+
+
+def test_deleted_drug_loses_its_row(dsn, drug_id):
+    async def run():
+        connection = await asyncpg.connect(dsn)
+        try:
+            await connection.execute(
+                "DELETE FROM drugs WHERE id = $1", drug_id
+            )
+            return await connection.fetchval(
+                "SELECT count(*) FROM drug_rules WHERE drug_id = $1", drug_id
+            )
+        finally:
+            await connection.close()
+
+    assert asyncio.run(run()) == 0
@@ -0,0 +1,48 @@
+import pytest
+
+from src.application.services.nlp import lemmatize_doc, nlp
+from src.application.services.text_processing import TextProcessingService
+from tests import baseline
+
+TEXTS = [
+    "Пациент принимал аспирин кардио и парацетамол без эффекта.",
+    "После приема Но-шпы и ацетилсалициловой кислоты боль прошла.",
+    "Назначен нурофен экспресс форте, затем ибупрофен.",
+    "ab cdefghij klmnopqrst",
+    "cdefghij klmnopqrst",
+    "Кардио аспирин, парацетамол, парацетамол.",
+]
+
+
+@pytest.mark.parametrize("text", TEXTS)
+def test_candidates_match_baseline(automaton, text):
+    doc = nlp(text)
+    lemmas = lemmatize_doc(doc)
+    expected = baseline.exact_candidates(automaton, doc, lemmas)
+
+    found = TextProcessingService._find_exact_candidates(
+        automaton, doc, lemmas
+    )
+
+    assert sorted(found) == sorted(set(expected))
+
+
+def test_key_suffix_window_is_not_a_candidate(automaton):
+    doc = nlp("ab cdefghij klmnopqrst")
+    lemmas = lemmatize_doc(doc)
+
+    found = TextProcessingService._find_exact_candidates(
+        automaton, doc, lemmas
+    )
+
+    assert [match[2] for match in found] == ["ab cdefghij klmnopqrst"]
+
+
+@pytest.mark.parametrize("text", TEXTS)
+def test_resolved_matches_match_baseline(automaton, drugs, text):
+    doc = nlp(text)
+    expected = baseline.find_matches(automaton, drugs, doc, lemmatize_doc(doc))
+
+    _, found = TextProcessingService.find_matches(automaton, None, text)
+
+    assert found == expected
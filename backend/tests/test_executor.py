@@ -0,0 +1,131 @@
+import asyncio
+import pickle
+from concurrent.futures import Executor, Future
+
+import pytest
+
+from src.application.services import executor
+from src.application.services.catalog import (
+    CatalogEntry,
+    DrugCatalog,
+    catalog_fingerprint,
+)
+from src.application.services.executor import MatcherExecutor
+from src.application.services.fuzzy import (
+    build_bk_tree,
+    build_bucketed_index,
+    build_fuzzy_index,
+    build_symspell_index,
+)
+from src.application.services.layered import (
+    LayeredAutomaton,
+    LayeredFuzzyIndex,
+)
+
+
+class FakePool(Executor):
+    """Пул процессов, выполняющий задачи в текущем процессе."""
+
+    created = []
+
+    def __init__(self, max_workers, mp_context, initializer, initargs):
+        self.shut_down = False
+        FakePool.created.append(self)
+        initializer(*initargs)
+
+    def submit(self, func, *args):
+        future = Future()
+        future.set_result(func(*args))
+        return future
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        self.shut_down = True
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    FakePool.created = []
+    monkeypatch.setattr(executor, "ProcessPoolExecutor", FakePool)
+    monkeypatch.setattr(executor, "_worker_state", {})
+    return FakePool.created
+
+
+def drug_ids(automaton, fuzzy_index, text):
+    hits = {value[1] for _, value in automaton.iter(text)}
+    fuzzy = {
+        drug_id
+        for candidates in fuzzy_index.search_many(text.split(), 0).values()
+        for _, drug_id, _ in candidates
+    }
+    return hits, fuzzy
+
+
+def catalog_of(drugs, version):
+    by_id = {drug.id: drug for drug in drugs}
+    return DrugCatalog(version, by_id, catalog_fingerprint(drugs))
+
+
+def test_catalog_edits_reuse_the_pool(pool, automaton, drugs):
+    layered = LayeredAutomaton(automaton)
+    fuzzy_index = LayeredFuzzyIndex(build_fuzzy_index(drugs))
+    renamed = CatalogEntry(drugs[2].id, "Спазмалгон", "спазмалгон")
+    changes = {renamed.id: renamed, drugs[1].id: None}
+    matcher = MatcherExecutor("process", 1)
+
+    async def run():
+        await matcher.reload(layered, fuzzy_index, catalog_of(drugs, 1))
+        before = await matcher.run(drug_ids, "парацетамол спазмалгон")
+        await matcher.reload(
+            layered.with_changes(changes),
+            fuzzy_index.with_changes(changes),
+            catalog_of([renamed, drugs[0], *drugs[3:]], 2),
+        )
+        after = await matcher.run(drug_ids, "парацетамол спазмалгон")
+        return before, after
+
+    before, after = asyncio.run(run())
+
+    assert len(pool) == 1
+    assert before == ({drugs[1].id}, {drugs[1].id})
+    assert after == ({drugs[2].id}, {drugs[2].id})
+    assert executor._worker_state["version"] == 2
+
+
+def test_new_base_replaces_the_pool(pool, automaton, drugs):
+    fuzzy_index = build_fuzzy_index(drugs)
+    matcher = MatcherExecutor("process", 1)
+    rebuilt = build_fuzzy_index(drugs)
+
+    async def run():
+        await matcher.reload(automaton, fuzzy_index, catalog_of(drugs, 1))
+        await matcher.reload(
+            LayeredAutomaton(automaton), fuzzy_index, catalog_of(drugs, 2)
+        )
+        await matcher.reload(automaton, rebuilt, catalog_of(drugs, 3))
+
+    asyncio.run(run())
+
+    assert len(pool) == 2
+    assert pool[0].shut_down and not pool[1].shut_down
+    assert matcher._delta == (3, ({}, frozenset()), ({}, frozenset()))
+
+
+@pytest.mark.parametrize(
+    "build", [build_bk_tree, build_symspell_index, build_bucketed_index]
+)
+def test_fuzzy_bases_can_be_sent_to_workers(build, drugs):
+    index = build(drugs)
+
+    copy = pickle.loads(pickle.dumps(index))
+
+    assert copy.search("дротаверин", 1) == index.search("дротаверин", 1)
+
+
+def test_pool_starts_every_process_before_use(automaton, drugs):
+    pool = executor._spawn_pool(2, automaton, build_fuzzy_index(drugs))
+    try:
+        processes = list(pool._processes.values())
+        assert len(processes) == 2
+        assert all(process.is_alive() for process in processes)
+    finally:
+        pool.shutdown()
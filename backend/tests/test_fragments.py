@@ -0,0 +1,52 @@
+import orjson
+
+from src.application.services.fragments import DrugFragments, to_jsonable
+from src.infrastructure.repositories.drugs import DrugInfoRow
+from src.infrastructure.schemas.text_processing import DrugTable
+from tests.conftest import make_drug
+
+
+def info_row(trade_name, receiver=None):
+    return DrugInfoRow(
+        *make_drug(trade_name), obligation=None, receiver=receiver
+    )
+
+
+def test_least_recently_used_fragment_is_evicted():
+    fragments = DrugFragments(2)
+    first, second, third = (
+        info_row(name) for name in ("Аспирин", "Нурофен", "Парацетамол")
+    )
+
+    (kept,) = fragments.get([first])
+    fragments.get([second])
+    fragments.get([first])
+    fragments.get([third])
+
+    assert len(fragments) == 2
+    assert fragments.get([first]) == [kept]
+    fragments.discard([second.drug_id])
+    assert len(fragments) == 2
+
+
+def test_discard_drops_rows_of_changed_drug():
+    fragments = DrugFragments(10)
+    row = info_row("Аспирин", "Росздравнадзор")
+    other = info_row("Нурофен")
+    fragments.get([row, row._replace(receiver="ФМБА"), other])
+
+    fragments.discard([row.drug_id])
+
+    assert len(fragments) == 1
+    fragments.clear()
+    assert len(fragments) == 0
+
+
+def test_fragment_matches_model_dump():
+    row = info_row("Аспирин", "Росздравнадзор")
+    (fragment,) = DrugFragments(0).get([row])
+    expected = orjson.dumps(
+        {"drugs": [DrugTable.model_validate(row)]}, default=to_jsonable
+    )
+
+    assert orjson.dumps({"drugs": [fragment]}) == expected
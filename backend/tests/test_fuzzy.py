@@ -0,0 +1,115 @@
+import pytest
+from rapidfuzz.distance import DamerauLevenshtein
+
+from src.application.services.fuzzy import (
+    SymSpellIndex,
+    _add_drugs,
+    build_bk_tree,
+    build_bucketed_index,
+    build_fuzzy_index,
+    build_symspell_index,
+)
+from src.application.services.layered import LayeredFuzzyIndex
+from src.application.services.nlp import lemmatize_doc, nlp
+from src.application.services.text_processing import TextProcessingService
+from tests import baseline
+from tests.conftest import make_drug
+
+QUERIES = [
+    "парацетамол",
+    "парацетомол",
+    "пароцетамолл",
+    "дратаверин",
+    "дротавери",
+    "ибупрфоен",
+    "аспирин",
+    "аспирн",
+    "кислота",
+    "но",
+]
+
+
+def brute_force(drugs, query, max_dist):
+    found = set()
+    for drug in drugs:
+        for name in (drug.trade_name, drug.inn):
+            if not name or len(name) <= 3:
+                continue
+            name = name.lower()
+            dist = DamerauLevenshtein.distance(query, name)
+            if dist <= max_dist:
+                found.add((name, drug.id, dist))
+    return found
+
+
+@pytest.mark.parametrize("max_dist", [0, 1, 2])
+@pytest.mark.parametrize("query", QUERIES)
+def test_symspell_matches_brute_force(drugs, query, max_dist):
+    index = _add_drugs(SymSpellIndex(max_distance=2), drugs)
+
+    assert set(index.search(query, max_dist)) == brute_force(
+        drugs, query, max_dist
+    )
+
+
+def test_symspell_rejects_distance_above_precomputed(drugs):
+    index = _add_drugs(SymSpellIndex(max_distance=1), drugs)
+
+    with pytest.raises(ValueError):
+        index.search("парацетамол", 2)
+
+
+FUZZY_TEXTS = [
+    "Принимал парацетомол и дратаверин, затем ибупрафен.",
+    "Аспирн кардио, аспирн и снова парацетомол.",
+    "Парацетамол и парацетомол в одном тексте.",
+    "Кислота, кислоты и но-шпа.",
+]
+
+
+@pytest.mark.parametrize(
+    "build_index",
+    [build_bucketed_index, build_bk_tree, build_symspell_index],
+)
+@pytest.mark.parametrize("text", FUZZY_TEXTS)
+def test_fuzzy_matches_match_baseline(automaton, drugs, build_index, text):
+    doc = nlp(text)
+    expected = baseline.find_matches(
+        automaton, drugs, doc, lemmatize_doc(doc), fuzzy=True
+    )
+
+    ids, found = TextProcessingService.find_matches(
+        automaton, build_index(drugs), text, fuzzy=True
+    )
+
+    assert found == expected
+    assert ids == {match[3] for match in expected}
+
+
+def test_typos_are_matched_fuzzily(automaton, drugs):
+    _, found = TextProcessingService.find_matches(
+        automaton, build_bucketed_index(drugs), FUZZY_TEXTS[0], fuzzy=True
+    )
+
+    assert [(match[2], match[4]) for match in found] == [
+        ("парацетомол", "yellow"),
+        ("дратаверин", "yellow"),
+    ]
+
+
+def test_layered_index_matches_rebuilt_index(drugs):
+    renamed = make_drug("Дротаверин Форте", "дротаверин")
+    renamed = renamed._replace(id=drugs[2].id)
+    added = make_drug("Парацетамол Экстра", "парацетамол")
+    changes = {renamed.id: renamed, drugs[0].id: None, added.id: added}
+    current = {drug.id: drug for drug in drugs}
+    current.update(changes)
+    current = [drug for drug in current.values() if drug is not None]
+
+    layered = LayeredFuzzyIndex(build_fuzzy_index(drugs)).with_changes(changes)
+    rebuilt = build_fuzzy_index(current)
+
+    words = [*QUERIES, "дротаверин форте", "парацетамол экстра"]
+    expected = rebuilt.search_many(words, 1)
+    for word, candidates in layered.search_many(words, 1).items():
+        assert set(candidates) == set(expected[word]), word
@@ -0,0 +1,39 @@
+import pytest
+
+from src.application.services.nlp import (
+    Pymorphy3Lemmatizer,
+    create_lemmatizer,
+    lemmatize,
+    lemmatize_doc,
+    nlp,
+)
+
+
+def test_doc_lemmas_match_word_lemmas():
+    doc = nlp("Пациентке назначили Аспирин и парацетамол, 500 мг.")
+
+    lemmas = lemmatize_doc(doc)
+
+    assert len(lemmas) == len(doc)
+    assert lemmas == [lemmatize(token.text.lower()) for token in doc]
+    assert lemmas[1] == "назначить"
+
+
+def test_doc_lemmas_are_lowercase():
+    lemmas = lemmatize_doc(nlp("АСПИРИН Кардио"))
+
+    assert lemmas == ["аспирин", "кардио"]
+
+
+def test_pymorphy3_backend_uses_blank_pipeline():
+    lemmatizer = create_lemmatizer("pymorphy3")
+
+    assert isinstance(lemmatizer, Pymorphy3Lemmatizer)
+    assert lemmatizer.nlp.pipe_names == []
+    assert lemmatizer.lemmatize("таблетками") == "таблетка"
+    assert lemmatizer.lemmatize("5-htp") == "5-htp"
+
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError, match="stanza"):
+        create_lemmatizer("stanza")
@@ -0,0 +1,115 @@
+import asyncio
+
+import pytest
+from starlette.datastructures import State
+
+from src.application.services import rebuild
+from src.application.services.catalog import CatalogSnapshot, DrugCatalog
+from src.application.services.rebuild import (
+    AutomatonRebuilder,
+    RebuildInProgressError,
+)
+from tests.fakes import FakeSession
+
+
+class FakeUpdates:
+    """Очередь обновлений: подмена автомата ждет разрешения теста."""
+
+    def __init__(self, state, log):
+        self._state = state
+        self._log = log
+        self.gate = asyncio.Event()
+        self.gate.set()
+
+    async def reload(self, automaton, base_version):
+        await self.gate.wait()
+        self._state.automaton = automaton
+        self._log.append(("reload", automaton, base_version))
+
+
+@pytest.fixture
+def rebuilt(monkeypatch, drugs):
+    """Перестроение без БД и файлов: фиксируются подмены и журнал."""
+    log = []
+
+    class ChangesRepo:
+        def __init__(self, session):
+            pass
+
+        async def record_artifact(self, base_version):
+            log.append(("record", base_version))
+            return base_version + 1
+
+    async def load_catalog(session):
+        catalog = DrugCatalog(
+            1, {drug.id: drug for drug in drugs}, journal_version=7
+        )
+        return CatalogSnapshot(catalog, 0, [])
+
+    def save_and_load(automaton, journal_version):
+        log.append(("save", journal_version))
+        return "loaded"
+
+    monkeypatch.setattr(rebuild, "async_session_factory", FakeSession)
+    monkeypatch.setattr(rebuild, "load_catalog", load_catalog)
+    monkeypatch.setattr(rebuild, "CatalogChangesRepo", ChangesRepo)
+    monkeypatch.setattr(rebuild, "save_and_load", save_and_load)
+    return log
+
+
+def make_state(log):
+    state = State()
+    state.catalog_updates = FakeUpdates(state, log)
+    return state
+
+
+def test_rebuild_runs_once_and_swaps(rebuilt, drugs):
+    async def run():
+        state = make_state(rebuilt)
+        state.catalog_updates.gate.clear()
+        rebuilder = AutomatonRebuilder(state)
+        status = rebuilder.start()
+        with pytest.raises(RebuildInProgressError):
+            rebuilder.start()
+        await asyncio.sleep(0.05)
+        assert status.stage == "swapping"
+        assert rebuilder.running
+        state.catalog_updates.gate.set()
+        await rebuilder._task
+        return state, status
+
+    state, status = asyncio.run(run())
+
+    assert status.state == "succeeded"
+    assert status.processed == status.total == len(drugs)
+    assert state.automaton == "loaded"
+    assert rebuilt == [
+        ("save", 7),
+        ("reload", "loaded", 7),
+        ("record", 7),
+    ]
+
+
+def test_failed_rebuild_keeps_automaton(rebuilt, monkeypatch):
+    def fail(automaton, journal_version):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(rebuild, "save_and_load", fail)
+
+    async def run():
+        state = make_state(rebuilt)
+        state.automaton = "old"
+        rebuilder = AutomatonRebuilder(state)
+        status = rebuilder.start()
+        await rebuilder._task
+        return state, status
+
+    state, status = asyncio.run(run())
+
+    assert (status.state, status.stage, status.error) == (
+        "failed",
+        "saving",
+        "disk full",
+    )
+    assert state.automaton == "old"
+    assert rebuilt == []
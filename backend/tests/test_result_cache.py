@@ -0,0 +1,174 @@
+import asyncio
+
+import orjson
+import pytest
+
+from src.application.services import result_cache
+from src.application.services.result_cache import (
+    ResultCache,
+    SharedResultStore,
+    result_key,
+)
+from src.application.services.text_processing import TextProcessingService
+
+# Результат в JSON размером 10 байт.
+VALUE = b'"' + b"x" * 8 + b'"'
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(result_cache.time, "monotonic", clock)
+    monkeypatch.setattr(result_cache.time, "time", clock)
+    return clock
+
+
+def test_key_depends_on_text_modes_and_fingerprint():
+    key = result_key("текст", True, "html", "a")
+
+    assert key == result_key("текст", True, "html", "a")
+    assert key != result_key("текст ", True, "html", "a")
+    assert key != result_key("текст", False, "html", "a")
+    assert key != result_key("текст", True, "spans", "a")
+    assert key != result_key("текст", True, "html", "b")
+
+
+def test_evicts_least_recently_used_entry():
+    cache = ResultCache(max_entries=2, max_bytes=10_000, ttl_seconds=60)
+    cache.put("a", {"v": 1})
+    cache.put("b", {"v": 2})
+
+    assert cache.get("a") == {"v": 1}
+    cache.put("c", {"v": 3})
+
+    assert cache.get("b") is None
+    assert cache.get("a") == {"v": 1}
+    assert cache.get("c") == {"v": 3}
+
+
+def test_evicts_by_total_size():
+    cache = ResultCache(max_entries=100, max_bytes=25, ttl_seconds=60)
+    cache.put("a", "x" * 8)
+    cache.put("b", "y" * 8)
+    cache.put("c", "z" * 8)
+
+    assert len(cache) == 2
+    assert cache.get("a") is None
+    cache.put("big", "w" * 30)
+    assert cache.get("big") is None
+    assert len(cache) == 2
+
+
+def test_expired_entries_are_dropped(clock):
+    cache = ResultCache(max_entries=10, max_bytes=10_000, ttl_seconds=5)
+    cache.put("a", 1)
+
+    clock.now += 4
+    assert cache.get("a") == 1
+    clock.now += 1
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_find_medications_reuses_cached_result():
+    calls = []
+
+    class Service:
+        async def _find_medications(self, executor, text, fuzzy, output):
+            calls.append(text)
+            return {"highlighted_text": text, "drugs": []}
+
+    class Executor:
+        fingerprint = "v1"
+
+    cache = ResultCache(max_entries=10, max_bytes=10_000, ttl_seconds=60)
+    service = Service()
+
+    async def run():
+        results = []
+        for text in ("a", "a", "b", "a"):
+            results.append(
+                await TextProcessingService.find_medications(
+                    service, Executor(), text, False, cache=cache
+                )
+            )
+        return results
+
+    results = asyncio.run(run())
+
+    assert calls == ["a", "b"]
+    assert results[0] is results[1]
+
+
+@pytest.fixture
+def shared(tmp_path, clock):
+    def make(max_bytes=10_000, ttl_seconds=60):
+        return SharedResultStore(
+            str(tmp_path / "results.sqlite"), max_bytes, ttl_seconds
+        )
+
+    return make
+
+
+def test_shared_store_is_seen_by_other_workers(shared):
+    first, second = shared(), shared()
+
+    first.put("a", orjson.dumps({"v": 1}))
+
+    assert second.get("a") == {"v": 1}
+    assert second.get("b") is None
+
+
+def test_shared_store_evicts_least_recently_read(shared, clock):
+    store = shared(max_bytes=30)
+    for key in ("a", "b", "c"):
+        clock.now += 1
+        store.put(key, VALUE)
+    clock.now += 1
+    assert store.get("a") is not None
+
+    clock.now += 1
+    store.put("d", VALUE)
+
+    assert store.get("b") is None
+    assert [store.get(key) is not None for key in "acd"] == [True] * 3
+    (used,) = store._connection().execute("SELECT bytes FROM usage").fetchone()
+    assert used == 30
+
+
+def test_shared_store_drops_expired_first(shared, clock):
+    store = shared(max_bytes=30, ttl_seconds=5)
+    store.put("old", VALUE)
+    clock.now += 10
+    store.put("a", VALUE)
+    store.put("b", VALUE)
+    store.put("c", VALUE)
+
+    assert store.get("old") is None
+    assert [store.get(key) is not None for key in "abc"] == [True] * 3
+
+
+def test_fetch_fills_process_cache_from_shared(shared):
+    store = shared()
+    writer = ResultCache(10, 10_000, 60, shared=store)
+    reader = ResultCache(10, 10_000, 60, shared=shared())
+
+    asyncio.run(writer.store("k", {"highlighted_text": "t", "drugs": []}))
+
+    assert reader.get("k") is None
+    assert asyncio.run(reader.fetch("k")) == {
+        "highlighted_text": "t",
+        "drugs": [],
+    }
+    assert len(reader) == 1
+
+    reader.invalidate()
+    assert store.get("k") is None
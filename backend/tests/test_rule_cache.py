@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+
+from src.application.services import rule_cache
+from src.application.services.rule_cache import RuleCache
+from src.infrastructure.repositories.drugs import DrugInfoRow
+from tests.conftest import make_drug
+from tests.fakes import FakeSession
+
+
+def info_row(drug, obligation=None):
+    return DrugInfoRow(*drug, obligation=obligation)
+
+
+@pytest.fixture
+def rules_repo(monkeypatch):
+    """Строки `drug_rules` без БД: `rules_repo.rows` и список запросов."""
+
+    class RulesRepo:
+        rows = []
+        queries = []
+        gate = None
+
+        def __init__(self, session):
+            pass
+
+        async def get_all_drug_info(self, drug_ids=None):
+            self.queries.append(drug_ids)
+            if self.gate is not None:
+                await self.gate.wait()
+            if drug_ids is None:
+                return list(self.rows)
+            return [row for row in self.rows if row.drug_id in drug_ids]
+
+    monkeypatch.setattr(rule_cache, "async_session_factory", FakeSession)
+    monkeypatch.setattr(rule_cache, "DrugsRepo", RulesRepo)
+    return RulesRepo
+
+
+def test_refresh_rereads_only_given_drugs(rules_repo):
+    first = make_drug("Парацетамол", "парацетамол")
+    second = make_drug("Нурофен", "ибупрофен")
+    rules_repo.rows = [info_row(first), info_row(second)]
+
+    async def run():
+        cache = RuleCache()
+        await cache.get_drug_info([first.id], [])
+        rules_repo.rows = [info_row(first, "да"), info_row(second, "да")]
+        await cache.refresh([first.id])
+        return await cache.get_drug_info([first.id, second.id], [])
+
+    rows = asyncio.run(run())
+
+    assert rules_repo.queries == [None, [first.id]]
+    assert {row.drug_id: row.obligation for row in rows} == {
+        first.id: "да",
+        second.id: None,
+    }
+
+
+def test_reload_serves_old_rows_until_swap(rules_repo):
+    drug = make_drug("Парацетамол", "парацетамол")
+    rules_repo.rows = [info_row(drug)]
+
+    async def run():
+        cache = RuleCache()
+        await cache.get_drug_info([drug.id], [])
+        rules_repo.rows = [info_row(drug, "да")]
+        rules_repo.gate = asyncio.Event()
+        cache.reload()
+        await asyncio.sleep(0)
+        during = await cache.get_drug_info([drug.id], [])
+        # Правила изменились еще раз, пока шло чтение.
+        cache.reload()
+        rules_repo.gate.set()
+        await cache._reload
+        after = await cache.get_drug_info([drug.id], [])
+        await cache.stop()
+        return during, after
+
+    during, after = asyncio.run(run())
+
+    assert [row.obligation for row in during] == [None]
+    assert [row.obligation for row in after] == ["да"]
+    assert rules_repo.queries == [None, None, None]
@@ -0,0 +1,70 @@
+from benchmarks import lemmatizers
+from src.application.services.fuzzy import build_bucketed_index
+from src.application.services.nlp import lemmatize_doc, nlp
+from src.application.services.spans import SpanIndex, resolve_spans
+from src.application.services.text_processing import (
+    Match,
+    TextProcessingService,
+)
+
+
+def test_span_index_rejects_overlaps():
+    spans = SpanIndex()
+
+    assert spans.add(10, 20, "a")
+    assert not spans.add(15, 25, "b")
+    assert not spans.add(5, 11, "c")
+    assert not spans.add(12, 14, "d")
+    assert spans.add(20, 30, "e")
+    assert spans.add(0, 10, "f")
+    assert list(spans) == ["f", "a", "e"]
+
+
+def test_resolve_prefers_longer_then_earlier():
+    candidates = [(0, 5, 1), (3, 12, 2), (10, 15, 2), (14, 20, 1)]
+
+    spans = resolve_spans(
+        candidates,
+        bounds=lambda item: (item[0], item[1]),
+        priority=lambda item: (-item[2], item[0]),
+    )
+
+    assert list(spans) == [(3, 12, 2), (14, 20, 1)]
+
+
+def test_candidates_are_match_records(automaton, drugs):
+    doc = nlp("Принимал аспирин кардио.")
+
+    candidates = TextProcessingService._find_exact_candidates(
+        automaton, doc, lemmatize_doc(doc)
+    )
+
+    assert all(isinstance(match, Match) for match in candidates)
+    assert (
+        Match(
+            9,
+            23,
+            "аспирин кардио",
+            drugs[0].id,
+            "lightgreen",
+            "Аспирин Кардио",
+        )
+        in candidates
+    )
+
+
+def test_fuzzy_matches_are_match_records(automaton, drugs):
+    _, (match,) = TextProcessingService.find_matches(
+        automaton, build_bucketed_index(drugs), "Дратаверин", fuzzy=True
+    )
+
+    assert match == Match(
+        0, 10, "Дратаверин", drugs[2].id, "yellow", "Дратаверин"
+    )
+
+
+def test_lemmatizer_benchmark_runs():
+    result = lemmatizers.run("pymorphy3", repeat=1)
+
+    assert result["backend"] == "pymorphy3"
+    assert 0 < result["recall"] <= 1
@@ -0,0 +1,167 @@
+import asyncio
+
+import anyio
+import orjson
+import pytest
+from fastapi import FastAPI
+
+from src.application.services.catalog import DrugCatalog
+from src.application.services.executor import MatcherExecutor
+from src.application.services.fuzzy import build_bucketed_index
+from src.application.services.streaming import iter_segments
+from src.interfaces.api.dependencies.automaton import get_matcher
+from src.interfaces.api.dependencies.text_processing import (
+    get_text_processing_service,
+)
+from src.interfaces.api.routers.api.v1.text_processing import router
+from src.settings import settings
+from tests.fakes import NoInfoService
+
+
+async def _chunks(*chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+def _parts(text, size):
+    data = text.encode()
+    return [data[i : i + size] for i in range(0, len(data), size)]
+
+
+async def _segments(text, max_chars, size, overlap_words=0):
+    return [
+        item
+        async for item in iter_segments(
+            _chunks(*_parts(text, size)),
+            max_chars,
+            overlap_words=overlap_words,
+        )
+    ]
+
+
+@pytest.mark.parametrize("overlap_words", [0, 3])
+@pytest.mark.parametrize("size", [1, 7, 1000])
+def test_segments_cover_document(size, overlap_words):
+    text = "Первый абзац.\n\nВторая строка\nтретья. Конец " * 20
+    text += "слово " * 40
+
+    segments = asyncio.run(_segments(text, 64, size, overlap_words))
+
+    assert "".join(segment[:owned] for _, segment, owned in segments) == text
+    assert all(len(segment) <= 64 for _, segment, _ in segments)
+    for (offset, segment, owned), (next_offset, next_segment, _) in zip(
+        segments, segments[1:]
+    ):
+        assert offset + owned == next_offset
+        assert segment[owned:] == next_segment[: len(segment) - owned]
+
+
+def test_name_on_whitespace_cut_is_found_once(automaton, drugs, monkeypatch):
+    """Наименование на разрезе без границы предложения не теряется."""
+    matcher = MatcherExecutor("inline", 1)
+    asyncio.run(
+        matcher.reload(
+            automaton,
+            build_bucketed_index(drugs),
+            DrugCatalog(1, {drug.id: drug for drug in drugs}, "test"),
+        )
+    )
+    text = "без жалоб " * 5 + "принимал Нурофен Экспресс Форте " * 3
+
+    expected = [i for i in range(len(text)) if text.startswith("Нурофен", i)]
+
+    async def run():
+        chunks = _chunks(*_parts(text, 16))
+        return [
+            orjson.loads(line)
+            async for line in NoInfoService().stream_medications(
+                matcher, chunks, False
+            )
+        ]
+
+    for max_chars in range(40, 70):
+        monkeypatch.setattr(settings.matcher, "stream_chunk_chars", max_chars)
+        lines = asyncio.run(run())
+        starts = [line["start"] for line in lines if line["type"] == "match"]
+        assert starts == expected, max_chars
+
+
+@pytest.fixture
+def app(automaton, drugs):
+    matcher = MatcherExecutor("inline", 1)
+    asyncio.run(
+        matcher.reload(
+            automaton,
+            build_bucketed_index(drugs),
+            DrugCatalog(1, {drug.id: drug for drug in drugs}, "test"),
+        )
+    )
+    app = FastAPI()
+    app.include_router(router)
+    app.dependency_overrides[get_text_processing_service] = NoInfoService
+    app.dependency_overrides[get_matcher] = lambda: matcher
+    return app
+
+
+def test_stream_answers_before_body_is_read(app, monkeypatch):
+    """Совпадения первой части уходят клиенту до конца тела запроса."""
+    monkeypatch.setattr(settings.matcher, "stream_chunk_chars", 64)
+    head = "Пациент принимал парацетамол.\n\n" + "Без жалоб. " * 5
+    tail = "Затем аспирин кардио.\n"
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0", "spec_version": "2.3"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": "/find_medications/stream",
+        "raw_path": b"/find_medications/stream",
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"content-type", b"text/plain")],
+        "client": ("test", 1),
+        "server": ("test", 80),
+    }
+    first_match_sent = anyio.Event()
+    body = []
+
+    async def receive():
+        if not body:
+            body.append(head)
+            return {
+                "type": "http.request",
+                "body": head.encode(),
+                "more_body": True,
+            }
+        if len(body) == 1:
+            await first_match_sent.wait()
+            body.append(tail)
+            return {
+                "type": "http.request",
+                "body": tail.encode(),
+                "more_body": False,
+            }
+        await anyio.sleep_forever()
+
+    lines = []
+
+    async def send(message):
+        if message["type"] != "http.response.body":
+            return
+        for line in message.get("body", b"").splitlines():
+            lines.append((len(body), orjson.loads(line)))
+            if lines[-1][1]["type"] == "match":
+                first_match_sent.set()
+
+    async def run():
+        with anyio.fail_after(5):
+            await app(scope, receive, send)
+
+    asyncio.run(run())
+
+    matches = [
+        (read, line["text"]) for read, line in lines if "text" in line
+    ]
+    assert matches[0] == (1, "парацетамол")
+    assert (2, "аспирин кардио") in matches
+    assert lines[-1][1]["type"] == "done"
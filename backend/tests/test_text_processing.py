@@ -0,0 +1,69 @@
+import asyncio
+
+from src.application.services.catalog import DrugCatalog
+from src.application.services.executor import MatcherExecutor
+from src.application.services.fuzzy import build_bucketed_index
+from src.application.services.text_processing import TextProcessingService
+from tests import baseline
+from tests.fakes import NoInfoService
+
+TEXTS = [
+    "Пациент принимал аспирин кардио и парацетамол.",
+    "",
+    "Принимал парацетомол и дратаверин.",
+    "Назначен нурофен экспресс форте, затем ибупрофен.",
+]
+
+
+def test_batch_matches_single_texts(automaton, drugs):
+    fuzzy_index = build_bucketed_index(drugs)
+
+    batch = TextProcessingService.match_medications_batch(
+        automaton, fuzzy_index, TEXTS, fuzzy=True, batch_size=2
+    )
+
+    assert batch == [
+        TextProcessingService.match_medications(
+            automaton, fuzzy_index, text, fuzzy=True
+        )
+        for text in TEXTS
+    ]
+
+
+def test_highlight_matches_baseline(automaton, drugs):
+    fuzzy_index = build_bucketed_index(drugs)
+    texts = [*TEXTS, "Давали с аспирин кардио, но-шпа- и парацетомол."]
+    for text in texts:
+        _, matches = TextProcessingService.find_matches(
+            automaton, fuzzy_index, text, fuzzy=True
+        )
+
+        assert TextProcessingService._highlight_matches(
+            text, matches
+        ) == baseline.highlight(text, matches)
+
+
+def test_spans_output_has_offsets_only(automaton, drugs):
+    matcher = MatcherExecutor("inline", 1)
+    asyncio.run(
+        matcher.reload(
+            automaton,
+            build_bucketed_index(drugs),
+            DrugCatalog(1, {drug.id: drug for drug in drugs}, "test"),
+        )
+    )
+    text = TEXTS[2]
+
+    result = asyncio.run(
+        NoInfoService().find_medications(
+            matcher, text, fuzzy=True, output="spans"
+        )
+    )
+
+    assert result == {
+        "spans": [
+            (9, 20, drugs[1].id, "fuzzy"),
+            (23, 33, drugs[2].id, "fuzzy"),
+        ],
+        "drugs": [],
+    }